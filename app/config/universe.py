@@ -7,3 +7,9 @@ UNIVERSE = {
                "qty_step": 0.1, "sl_buffer": 10.0,
                "session": {"tz": "America/New_York", "open": "09:30", "or_minutes": 15, "trade_end": "11:30"}},
 }
+
+# Phases de session d'une bougie (heure locale du symbole)
+PHASE_PRE_OPEN = "pre_open"            # avant l'ouverture
+PHASE_OPENING_RANGE = "opening_range"  # open <= t <= open + or_minutes
+PHASE_TRADING = "trading"              # fin du range < t <= trade_end
+PHASE_CLOSED = "closed"                # après trade_end
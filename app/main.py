@@ -4,6 +4,16 @@ from app.routers import balance, positions, strategy, market_data, logs, trades,
 from app.services.polygon_ws import start_polygon_ws
 from app.services import trade_tracker
 from app.services import news_scheduler
+from app.services import config_service
+from app.services import log_index
+from app.services import archive_service
+from app.services import price_stream
+from app.services import transaction_stream
+from app.services import account_mirror
+from app.services import exit_scheduler
+from app.config.instrument_map import INSTRUMENT_MAP
+from app.services.batch_writer import candle_writer
+from app.services.log_service import flush_logs
 import threading
 
 
@@ -23,6 +33,7 @@ app.add_middleware(
    allow_credentials=True,
    allow_methods=["*"],
    allow_headers=["*"],
+   expose_headers=["X-Next-Cursor"],  # pagination /api/logs
 )
 
 app.include_router(balance.router)
@@ -41,9 +52,67 @@ def ws_status():
     return get_ws_status()
 
 
+@app.get("/api/latency")
+def latency_stats():
+    """Latence bar close → fill par stratégie et par étape (p50/p95/p99, ms)."""
+    from app.services import latency
+    return latency.get_stats()
+
+
+@app.get("/api/http-stats")
+def http_stats():
+    """Appels HTTP broker par endpoint (latence, erreurs, retries)."""
+    from app.services import http_session
+    return http_session.get_stats()
+
+
+@app.get("/api/price-stream")
+def price_stream_stats():
+    """État du flux de pricing OANDA (connexion, fraîcheur, carnet bid/ask)."""
+    return price_stream.get_stats()
+
+
+@app.get("/api/transaction-stream")
+def transaction_stream_stats():
+    """Flux de transactions OANDA (clôtures finalisées en temps réel)."""
+    return transaction_stream.get_stats()
+
+
+@app.get("/api/trade-tracker")
+def trade_tracker_stats():
+    """Cycles du tracker par broker (latence, dépassements du budget, intervalle courant)."""
+    return trade_tracker.get_stats()
+
+
+@app.get("/api/exit-scheduler")
+def exit_scheduler_stats():
+    """Clôtures à heure fixe planifiées (fin de session, week-end, max hold)."""
+    return exit_scheduler.get_stats()
+
+
 @app.on_event("startup")
 def startup_event():
+    config_service.start()
+    log_index.start()
+    price_stream.start(cfg["oanda"] for cfg in INSTRUMENT_MAP.values() if "oanda" in cfg)
+    transaction_stream.start()
     thread = threading.Thread(target=start_polygon_ws, daemon=True)
     thread.start()
     trade_tracker.start()
+    exit_scheduler.start(news_scheduler.get_scheduler())
     news_scheduler.start()
+    archive_service.start(news_scheduler.get_scheduler())
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Vide les bougies encore en attente avant l'arrêt du process
+    candle_writer.stop()
+    config_service.stop()
+    price_stream.stop()
+    transaction_stream.stop()
+    account_mirror.flush()
+    exit_scheduler.stop()
+    news_scheduler.stop()
+    # en dernier : les étapes d'arrêt ci-dessus peuvent encore loguer
+    flush_logs()
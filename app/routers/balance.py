@@ -1,13 +1,14 @@
 # app/routers/balance.py
 
 from fastapi import APIRouter
-from app.services.oanda_service import get_account_balance
+from app.services import account_mirror
 
 router = APIRouter()
 
 @router.get("/check-balance")
-async def check_balance():
-    balance = get_account_balance()
+def check_balance():
+    account_mirror.refresh()
+    balance = account_mirror.balance()
     return {
         "message": "✅ Solde récupéré avec succès",
         "balance": balance
@@ -1,17 +1,40 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Response
 from app.services.firebase import get_firestore
+from app.services import log_index, archive_service
 
 router = APIRouter()
 
 @router.get("/logs")
 def get_logs(
+    response: Response,
     limit: int = 50,
     level: str = Query(None),
     contains: str = Query(None),
     tag: str = Query(None),
     trade_id: str = Query(None),
     date: str = Query(None),
+    cursor: str = Query(None),
 ):
+    # Jour compacté : archive complète du jour ; curseur de la page suivante dans X-Next-Cursor
+    if date and archive_service.has_logs(date):
+        results, next_cursor = _get_logs_archive(limit, level, contains, tag, trade_id, date, cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return results
+    # Index local (SQLite/FTS)
+    if log_index.is_ready():
+        results, next_cursor = log_index.query(
+            limit=limit, level=level, contains=contains, tag=tag,
+            trade_id=trade_id, date=date, cursor=cursor,
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return results
+    return _get_logs_firestore(limit, level, contains, tag, trade_id, date)
+
+
+def _get_logs_firestore(limit, level, contains, tag, trade_id, date):
+    """Chemin historique, tant que l'index local n'est pas chargé."""
     db = get_firestore()
 
     # Extend search volume when filtering client-side
@@ -34,28 +57,9 @@ def get_logs(
 
     for doc in docs:
         data = doc.to_dict()
-
-        # Filter by strategy/service tag
-        if tag and data.get("tag", "").lower() != tag.lower():
-            continue
-
-        # Filter by oanda trade ID (search in message text)
-        if trade_id and trade_id not in data.get("message", ""):
+        if not _matches(data, tag, trade_id, contains):
             continue
 
-        # Multi-keyword text search
-        if contains:
-            keywords = contains.lower().split()
-            message = data.get("message", "").lower()
-            timestamp = data.get("timestamp", "").lower()
-            lvl = data.get("level", "").lower()
-
-            if not all(
-                any(kw in field for field in [message, timestamp, lvl])
-                for kw in keywords
-            ):
-                continue
-
         results.append(data)
 
         if len(results) >= limit:
@@ -64,9 +68,48 @@ def get_logs(
     return results
 
 
+def _get_logs_archive(limit, level, contains, tag, trade_id, date, cursor):
+    """Jour archivé par la compaction : filtre en mémoire, curseur = position dans le jour."""
+    offset = int(cursor.rpartition(":")[2]) if cursor and cursor.startswith("archive:") else 0
+    entries = [
+        e for e in archive_service.read_logs(date)
+        if (not level or e.get("level") == level.upper()) and _matches(e, tag, trade_id, contains)
+    ]
+    page = [{k: v for k, v in e.items() if k != "_id"} for e in entries[offset:offset + limit]]
+    next_cursor = f"archive:{offset + limit}" if offset + limit < len(entries) else None
+    return page, next_cursor
+
+
+def _matches(data: dict, tag, trade_id, contains) -> bool:
+    # Filter by strategy/service tag
+    if tag and data.get("tag", "").lower() != tag.lower():
+        return False
+
+    # Filter by oanda trade ID (search in message text)
+    if trade_id and trade_id not in data.get("message", ""):
+        return False
+
+    # Multi-keyword text search
+    if contains:
+        keywords = contains.lower().split()
+        message = data.get("message", "").lower()
+        timestamp = data.get("timestamp", "").lower()
+        lvl = data.get("level", "").lower()
+
+        if not all(
+            any(kw in field for field in [message, timestamp, lvl])
+            for kw in keywords
+        ):
+            return False
+
+    return True
+
+
 @router.get("/logs/tags")
 def get_log_tags():
-    """Return distinct tags from recent logs."""
+    """Return distinct tags (registre de l'index, sinon logs récents)."""
+    if log_index.is_ready():
+        return log_index.get_tags()
     db = get_firestore()
     docs = db.collection("execution_logs").order_by("timestamp", direction="DESCENDING").limit(500).stream()
     tags = set()
@@ -1,20 +1,28 @@
 from fastapi import APIRouter, Query
 from pydantic import BaseModel
 from app.services.firebase import get_firestore
-from app.services import oanda_service
+from app.services import oanda_service, bar_store, archive_service
 from datetime import datetime, timedelta, timezone
 from typing import List
 
 router = APIRouter()
 
+def _candles_for_day(day: str) -> list:
+    """Bougies d'une journée : bar store en mémoire, archive pour les jours compactés, sinon Firestore."""
+    if bar_store.has_day(day):
+        docs = [bar_store.to_doc(sym, bar) for sym in bar_store.symbols() for bar in bar_store.day_bars(sym, day)]
+        return sorted(docs, key=lambda d: d["s"])
+    if archive_service.has_candles(day):
+        return archive_service.read_candles(day)
+    db = get_firestore()
+    return [doc.to_dict() for doc in db.collection("ohlc_1m").where("day", "==", day).order_by("s").stream()]
+
+
 # ✅ Endpoint pour consulter les dernières bougies stockées
 @router.get("/candles", response_model=List[dict])
 async def get_candles(day: str):
-    db = get_firestore()
     prev_day = (datetime.strptime(day, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
-    docs_prev = db.collection("ohlc_1m").where("day", "==", prev_day).order_by("s").stream()
-    docs_day = db.collection("ohlc_1m").where("day", "==", day).order_by("s").stream()
-    return [doc.to_dict() for doc in docs_prev] + [doc.to_dict() for doc in docs_day]
+    return _candles_for_day(prev_day) + _candles_for_day(day)
 
 
 # ✅ Endpoint pour récupérer le range d'ouverture d'un jour donné
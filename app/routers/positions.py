@@ -1,15 +1,15 @@
 # app/routers/positions.py
 
 from fastapi import APIRouter
-from app.services import oanda_service
+from app.services import account_mirror
 
 router = APIRouter()
 
 @router.get("/positions")
 def get_positions():
     try:
-        positions = oanda_service.get_open_positions()
-        trades = oanda_service.get_open_trades()
-        return {"positions": positions, "trades": trades}
+        # miroir du compte (une requête /changes au plus toutes les MAX_AGE_S secondes)
+        account_mirror.refresh()
+        return {"positions": account_mirror.open_positions(), "trades": account_mirror.open_trades()}
     except Exception as e:
         return {"error": str(e)}
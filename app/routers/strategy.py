@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request
 from app.services.firebase import get_firestore
+from app.services import config_service, exit_plan
 
 router = APIRouter()
 
@@ -7,9 +8,7 @@ KNOWN_STRATEGIES = ["mean_revert", "trend_follow", "ichimoku", "news_trading"]
 
 @router.get("/strategy/all")
 def get_all_strategies():
-    db = get_firestore()
-    doc = db.collection("config").document("strategies").get()
-    data = doc.to_dict() or {}
+    data = config_service.get_snapshot().strategies
     return {name: data.get(name, False) for name in KNOWN_STRATEGIES}
 
 @router.post("/strategy/toggle")
@@ -24,13 +23,12 @@ async def toggle_strategy(request: Request):
 
     current = data.get(strategy_name, False)
     ref.set({strategy_name: not current}, merge=True)
+    config_service.apply_local("strategies", {strategy_name: not current})
     return {strategy_name: not current}
 
 @router.get("/config/risk")
 def get_risk_config():
-    db = get_firestore()
-    doc = db.collection("config").document("settings").get()
-    data = doc.to_dict() or {}
+    data = config_service.get_snapshot().settings
     return {
         "risk_chf": data.get("risk_chf", 50),
         "risk_usd_crypto": data.get("risk_usd_crypto", 50),
@@ -54,4 +52,66 @@ async def update_risk_config(request: Request):
         return {"error": "Aucune valeur fournie"}
     db = get_firestore()
     db.collection("config").document("settings").set(update, merge=True)
+    config_service.apply_local("settings", update)
+    return update
+
+@router.get("/config/scaling")
+def get_scaling_config():
+    return {"scaling_mode": config_service.get_snapshot().settings.get("scaling_mode", "tracker")}
+
+@router.put("/config/scaling")
+async def update_scaling_config(request: Request):
+    body = await request.json()
+    mode = body.get("scaling_mode")
+    if mode not in ("tracker", "broker"):
+        return {"error": "scaling_mode doit etre 'tracker' ou 'broker'"}
+    update = {"scaling_mode": mode}
+    db = get_firestore()
+    db.collection("config").document("settings").set(update, merge=True)
+    config_service.apply_local("settings", update)
+    return update
+
+@router.get("/config/exit-plans")
+def get_exit_plans():
+    settings = config_service.get_snapshot().settings
+    return {
+        "plans": {**exit_plan.DEFAULT_PLANS, **(settings.get("exit_plans") or {})},
+        "by_strategy": settings.get("exit_plan_by_strategy") or {},
+    }
+
+@router.put("/config/exit-plans")
+async def update_exit_plans(request: Request):
+    body = await request.json()
+    update = {}
+    plans = body.get("plans")
+    if plans is not None:
+        if not isinstance(plans, dict):
+            return {"error": "plans doit etre un objet {nom: plan}"}
+        for name, spec in plans.items():
+            rungs = spec.get("rungs") if isinstance(spec, dict) else None
+            if not isinstance(rungs, list) or not rungs or not all(isinstance(r, dict) for r in rungs):
+                return {"error": f"plan {name}: rungs doit etre une liste de paliers"}
+            if any(not isinstance(r.get("r"), (int, float)) or r["r"] <= 0 for r in rungs):
+                return {"error": f"plan {name}: paliers invalides (r > 0 requis)"}
+            if any(not isinstance(r.get("fraction", 0), (int, float)) or r.get("fraction", 0) < 0 for r in rungs):
+                return {"error": f"plan {name}: fraction invalide (nombre >= 0)"}
+            if sum(r.get("fraction", 0) for r in rungs) >= 1:
+                return {"error": f"plan {name}: la somme des fractions doit rester < 1 (reste au TP)"}
+        update["exit_plans"] = plans
+    by_strategy = body.get("by_strategy")
+    if by_strategy is not None:
+        if not isinstance(by_strategy, dict):
+            return {"error": "by_strategy doit etre un objet {strategie: plan}"}
+        known = {**exit_plan.DEFAULT_PLANS, **(plans or config_service.get_snapshot().settings.get("exit_plans") or {})}
+        unknown = [p for p in by_strategy.values() if p not in known]
+        if unknown:
+            return {"error": f"plans inconnus: {unknown}"}
+        update["exit_plan_by_strategy"] = by_strategy
+    if not update:
+        return {"error": "Aucune valeur fournie"}
+    db = get_firestore()
+    # merge limite aux champs ecrits : chacun est remplace en entier (merge=True fusionnerait les maps
+    # imbriquees : un plan supprime resterait dans Firestore) ; le document est cree s'il manque
+    db.collection("config").document("settings").set(update, merge=list(update))
+    config_service.apply_local("settings", update)
     return update
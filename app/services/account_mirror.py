@@ -0,0 +1,292 @@
+# app/services/account_mirror.py
+"""
+Miroir local du compte OANDA : trades, ordres, positions et solde.
+
+Chargé une fois par un snapshot complet (GET /accounts/{id}), puis tenu à
+jour par l'endpoint v20 /changes?sinceTransactionID=<curseur> : une requête
+par synchronisation, quel que soit le nombre de trades ouverts. Chaque
+réponse donne les trades ouverts / réduits / clos, les ordres créés /
+annulés / exécutés, les positions modifiées et l'état calculé (PnL latent,
+NAV...), ainsi que le nouveau lastTransactionID.
+
+Le miroir, son curseur et les trades clos / ordres sortis déjà vus sont
+persistés ensemble dans Firestore (state/oanda_account_mirror) : après un
+redémarrage ou un redéploiement la synchronisation reprend de façon
+incrémentale, sans rejouer les clôtures déjà appliquées. Les écritures sont
+coalescées (au plus une par SAVE_INTERVAL_S, plus flush() à l'arrêt). Un curseur
+refusé par OANDA (trop ancien, autre compte) déclenche un nouveau snapshot.
+
+Les trades clos sont gardés (CLOSED_KEEP derniers) au format de
+oanda_service.get_trade_details, SL/TP détectés par les ordres exécutés.
+Les ordres sortis du carnet (exécutés, avec leur prix, ou annulés) aussi :
+le tracker y réconcilie les paliers de take-profit posés chez le broker.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+import requests
+from app.services import oanda_service
+from app.services.firebase import get_firestore
+from app.services.log_service import log_to_firestore
+
+STATE_DOC = ("state", "oanda_account_mirror")
+MAX_AGE_S = 5.0          # lecteurs (API) : resynchronisation si le miroir est plus vieux
+SAVE_INTERVAL_S = 30.0   # au plus une écriture du miroir par intervalle
+CLOSED_KEEP = 200
+RESNAPSHOT_STATUSES = {400, 404, 416}   # curseur invalide ou trop ancien
+
+_state = {"account_id": None, "last_txid": None, "account": {}, "trades": {}, "orders": {}, "positions": {}}
+_closed = OrderedDict()  # trade id -> détails (format get_trade_details)
+_done_orders = OrderedDict()  # order id -> ("FILLED", prix) | ("CANCELLED", None)
+_lock = threading.RLock()
+_loaded = False
+_synced_at = 0.0         # monotonic de la dernière synchronisation réussie
+_saved_at = 0.0          # monotonic de la dernière écriture Firestore
+_dirty = False           # curseur avancé depuis la dernière écriture
+_stats = {"snapshots": 0, "syncs": 0, "closures": 0, "errors": 0, "last_error": None}
+
+
+# ---------- persistance ----------
+def _state_ref():
+    return get_firestore().collection(STATE_DOC[0]).document(STATE_DOC[1])
+
+
+def _load():
+    global _loaded
+    _loaded = True
+    try:
+        doc = _state_ref().get().to_dict() or {}
+        saved = json.loads(doc.get("mirror") or "{}")
+    except Exception as e:
+        _stats["last_error"] = f"load: {e}"
+        return
+    if saved.get("account_id") == oanda_service.OANDA_ACCOUNT_ID and saved.get("last_txid"):
+        _state.update(saved)
+        _closed.update((tid, details) for tid, details in json.loads(doc.get("closed") or "[]"))
+        _done_orders.update((oid, tuple(done)) for oid, done in json.loads(doc.get("done_orders") or "[]"))
+
+
+def _save():
+    # JSON dans des champs uniques : ids de trades/ordres en clés, objets OANDA imbriqués ;
+    # clos / ordres sortis en listes pour garder l'ordre d'éviction
+    global _saved_at, _dirty
+    try:
+        _state_ref().set({
+            "account_id": _state["account_id"],
+            "last_txid": _state["last_txid"],
+            "mirror": json.dumps(_state),
+            "closed": json.dumps(list(_closed.items())),
+            "done_orders": json.dumps(list(_done_orders.items())),
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+        })
+        _dirty = False
+    except Exception as e:
+        _stats["last_error"] = f"save: {e}"
+    _saved_at = time.monotonic()  # échec : nouvel essai à l'intervalle suivant
+
+
+def flush():
+    """Écrit le miroir s'il a avancé depuis la dernière écriture (arrêt du process)."""
+    with _lock:
+        if _dirty:
+            _save()
+
+
+# ---------- application des changements ----------
+def _is_open_position(p: dict) -> bool:
+    return any(float(p.get(side, {}).get("units", 0) or 0) != 0 for side in ("long", "short"))
+
+
+def _set_position(p: dict):
+    if _is_open_position(p):
+        _state["positions"][p["instrument"]] = p
+    else:
+        _state["positions"].pop(p["instrument"], None)
+
+
+def _closed_details(trade: dict, filled_type: str = None) -> dict:
+    return {
+        "id": trade["id"],
+        "instrument": trade.get("instrument"),
+        "state": "CLOSED",
+        "realizedPL": trade.get("realizedPL", "0"),
+        "unrealizedPL": "0",
+        "price": trade.get("price", "0"),
+        "currentUnits": trade.get("currentUnits", "0"),
+        "averageClosePrice": trade.get("averageClosePrice"),
+        "sl_filled": filled_type == "STOP_LOSS",
+        "tp_filled": filled_type == "TAKE_PROFIT",
+    }
+
+
+def _snapshot():
+    data = oanda_service.get_account()
+    account = dict(data["account"])
+    trades = account.pop("trades", [])
+    orders = account.pop("orders", [])
+    positions = account.pop("positions", [])
+    _state.update({
+        "account_id": oanda_service.OANDA_ACCOUNT_ID,
+        "last_txid": data["lastTransactionID"],
+        "account": account,
+        "trades": {t["id"]: t for t in trades},
+        "orders": {o["id"]: o for o in orders},
+        "positions": {},
+    })
+    for p in positions:
+        _set_position(p)
+    _stats["snapshots"] += 1
+
+
+def _apply_changes(data: dict):
+    changes = data.get("changes", {})
+    trades, orders, account = _state["trades"], _state["orders"], _state["account"]
+
+    for o in changes.get("ordersCreated", []):
+        orders[o["id"]] = o
+    filled_by_trade = {}
+    for key in ("ordersCancelled", "ordersFilled", "ordersTriggered"):
+        for o in changes.get(key, []):
+            orders.pop(o["id"], None)
+            if key == "ordersFilled" and o.get("tradeID"):
+                filled_by_trade[o["tradeID"]] = o.get("type")
+            if key == "ordersCancelled":
+                _done_orders[o["id"]] = ("CANCELLED", None)
+            elif key == "ordersFilled":
+                _done_orders.setdefault(o["id"], ("FILLED", None))
+
+    for t in changes.get("tradesOpened", []):
+        trades[t["id"]] = t
+    for t in changes.get("tradesReduced", []):
+        trades[t["id"]] = {**trades.get(t["id"], {}), **t}
+    for t in changes.get("tradesClosed", []):
+        trades.pop(t["id"], None)
+        _closed[t["id"]] = _closed_details(t, filled_by_trade.get(t["id"]))
+        _stats["closures"] += 1
+    while len(_closed) > CLOSED_KEEP:
+        _closed.popitem(last=False)
+
+    for p in changes.get("positions", []):
+        _set_position(p)
+    for tx in changes.get("transactions", []):
+        if "accountBalance" in tx:
+            account["balance"] = tx["accountBalance"]
+        if tx.get("type") == "ORDER_FILL" and tx.get("orderID"):
+            _done_orders[tx["orderID"]] = ("FILLED", tx.get("price"))
+    while len(_done_orders) > CLOSED_KEEP:
+        _done_orders.popitem(last=False)
+
+    # état calculé : PnL latent des trades/positions, NAV, marge...
+    state = data.get("state", {})
+    for k, v in state.items():
+        if k not in ("trades", "orders", "positions"):
+            account[k] = v
+    for ts in state.get("trades", []):
+        if ts["id"] in trades:
+            trades[ts["id"]].update({k: v for k, v in ts.items() if k != "id"})
+    for ps in state.get("positions", []):
+        p = _state["positions"].get(ps["instrument"])
+        if p is not None:
+            p["unrealizedPL"] = ps.get("netUnrealizedPL", p.get("unrealizedPL"))
+            for side in ("long", "short"):
+                if f"{side}UnrealizedPL" in ps and side in p:
+                    p[side]["unrealizedPL"] = ps[f"{side}UnrealizedPL"]
+
+    _state["last_txid"] = data["lastTransactionID"]
+
+
+# ---------- synchronisation ----------
+def sync():
+    """Une requête /changes (ou un snapshot complet au premier appel / curseur refusé)."""
+    global _synced_at, _dirty
+    with _lock:
+        if not _loaded:
+            _load()
+        before = _state["last_txid"]
+        try:
+            if before is None:
+                _snapshot()
+            else:
+                try:
+                    _apply_changes(oanda_service.get_account_changes(before))
+                except requests.exceptions.HTTPError as e:
+                    if e.response is None or e.response.status_code not in RESNAPSHOT_STATUSES:
+                        raise
+                    log_to_firestore(f"[AccountMirror] Curseur {before} refuse, snapshot complet", level="INFO")
+                    _snapshot()
+        except Exception as e:
+            _stats["errors"] += 1
+            _stats["last_error"] = str(e)[:200]
+            raise
+        _stats["syncs"] += 1
+        _synced_at = time.monotonic()
+        if _state["last_txid"] != before:
+            _dirty = True
+        if _dirty and time.monotonic() - _saved_at >= SAVE_INTERVAL_S:
+            _save()
+
+
+def refresh(max_age: float = MAX_AGE_S):
+    """Synchronise si le miroir a plus de `max_age` secondes."""
+    if time.monotonic() - _synced_at > max_age:
+        sync()
+
+
+def is_synced() -> bool:
+    return _synced_at > 0
+
+
+# ---------- lecture ----------
+def trade_ids() -> set:
+    with _lock:
+        return set(_state["trades"])
+
+
+def open_trades() -> list:
+    with _lock:
+        return [dict(t) for t in _state["trades"].values()]
+
+
+def open_positions() -> list:
+    with _lock:
+        return [dict(p) for p in _state["positions"].values()]
+
+
+def balance() -> float:
+    with _lock:
+        return float(_state["account"].get("balance", 0))
+
+
+def closed_trade(trade_id: str):
+    """Détails d'un trade clos vu dans les changements, ou None."""
+    with _lock:
+        return _closed.get(str(trade_id))
+
+
+def order_state(order_id: str) -> tuple:
+    """("PENDING", None), ("FILLED", prix ou None), ("CANCELLED", None) ; (None, None) si jamais vu."""
+    with _lock:
+        order_id = str(order_id)
+        if order_id in _state["orders"]:
+            return "PENDING", None
+        return _done_orders.get(order_id, (None, None))
+
+
+def trade_units(trade_id: str):
+    """Units restantes d'un trade ouvert (signées), ou None."""
+    with _lock:
+        trade = _state["trades"].get(str(trade_id))
+        return float(trade.get("currentUnits", 0)) if trade else None
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "last_txid": _state["last_txid"],
+            "open_trades": len(_state["trades"]),
+            "open_orders": len(_state["orders"]),
+            "age_s": round(time.monotonic() - _synced_at, 1) if _synced_at else None,
+        }
@@ -0,0 +1,223 @@
+# app/services/archive_service.py
+"""
+Rétention et compaction de `execution_logs` et `ohlc_1m`.
+
+Un job planifié (nuit UTC) prend chaque jour clos plus vieux que la fenêtre
+chaude et :
+1. l'écrit dans une archive sur disque (ARCHIVE_DIR)
+   - logs    : logs/YYYY-MM-DD.jsonl.gz (une entrée JSON par ligne)
+   - bougies : fichiers colonne par symbole/jour (cf. candle_archive)
+2. relit l'archive pour vérifier le nombre d'entrées
+3. supprime les documents Firestore par WriteBatch
+
+Les endpoints (/api/logs?date=..., /api/candles) relisent les archives pour
+les jours compactés. Un jour déjà archivé puis complété (docs arrivés en
+retard) est fusionné avec l'archive existante.
+"""
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from app.services.firebase import get_firestore
+from app.services.log_service import log_to_firestore
+from app.services import candle_archive
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+LOG_HOT_DAYS = 14        # jours de logs gardés dans Firestore
+CANDLE_HOT_DAYS = 7      # jours de bougies gardés dans Firestore (le bar store couvre J-1/J)
+MAX_DAYS_PER_RUN = 30    # borne le travail d'un run (rattrapage progressif de l'historique)
+DELETE_BATCH = 400       # Firestore limite un WriteBatch à 500 opérations
+
+_run_lock = threading.Lock()
+_stats = {
+    "last_run": None,
+    "log_days_archived": 0,
+    "candle_days_archived": 0,
+    "docs_deleted": 0,
+    "errors": 0,
+}
+
+
+# ---------- chemins / écriture ----------
+def _log_path(day: str) -> str:
+    return os.path.join(ARCHIVE_DIR, "logs", f"{day}.jsonl.gz")
+
+
+def _write_atomic(path: str, payload: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _delete_refs(refs: list) -> int:
+    db = get_firestore()
+    for start in range(0, len(refs), DELETE_BATCH):
+        batch = db.batch()
+        for ref in refs[start:start + DELETE_BATCH]:
+            batch.delete(ref)
+        batch.commit()
+    _stats["docs_deleted"] += len(refs)
+    return len(refs)
+
+
+# ---------- logs ----------
+def has_logs(day: str) -> bool:
+    return os.path.exists(_log_path(day))
+
+
+def read_logs(day: str) -> list:
+    """Entrées archivées d'un jour, de la plus récente à la plus ancienne."""
+    if not has_logs(day):
+        return []
+    with gzip.open(_log_path(day), "rt", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda e: e.get("timestamp", ""), reverse=True)
+    return entries
+
+
+def archive_logs_day(day: str) -> int:
+    db = get_firestore()
+    docs = list(
+        db.collection("execution_logs")
+        .where("timestamp", ">=", day)
+        .where("timestamp", "<=", day + "T23:59:59\uffff")
+        .stream()
+    )
+    if not docs:
+        return 0
+    entries = {e["_id"]: e for e in read_logs(day) if "_id" in e}
+    for d in docs:
+        entries[d.id] = {**(d.to_dict() or {}), "_id": d.id}
+    rows = sorted(entries.values(), key=lambda e: e.get("timestamp", ""))
+    payload = "".join(json.dumps(e, default=str, ensure_ascii=False) + "\n" for e in rows)
+    _write_atomic(_log_path(day), gzip.compress(payload.encode("utf-8")))
+
+    if len(read_logs(day)) != len(rows):
+        raise RuntimeError(f"archive logs {day} incomplete")
+    _delete_refs([d.reference for d in docs])
+    _stats["log_days_archived"] += 1
+    return len(docs)
+
+
+# ---------- bougies ----------
+def has_candles(day: str) -> bool:
+    return candle_archive.has_day(day)
+
+
+def read_candles(day: str) -> list:
+    """Bougies archivées d'un jour au format ohlc_1m, triées par `s`."""
+    return candle_archive.day_docs(day)
+
+
+def archive_candles_day(day: str) -> int:
+    db = get_firestore()
+    docs = list(db.collection("ohlc_1m").where("day", "==", day).stream())
+    if not docs:
+        return 0
+    by_sym = {}
+    for d in docs:
+        data = d.to_dict() or {}
+        if "sym" in data and "e" in data:
+            by_sym.setdefault(data["sym"], []).append(data)
+    for sym, rows in by_sym.items():
+        decisions = candle_archive.read_decisions(sym, day)
+        merged = {r[1]: r for r in candle_archive.read_rows(sym, day)}
+        for r in rows:
+            merged[int(r["e"])] = (r["s"], r["e"], r["o"], r["h"], r["l"], r["c"], r.get("op"),
+                                   bool(r.get("in_opening_range")), bool(r.get("backfilled")))
+            if r.get("strategy_decisions"):
+                decisions[int(r["e"])] = r["strategy_decisions"]
+        written = candle_archive.write_day(sym, day, list(merged.values()), decisions)
+        if len(candle_archive.open_day(sym, day)) != written or written != len(merged):
+            raise RuntimeError(f"archive ohlc_1m {sym} {day} incomplete")
+    _delete_refs([d.reference for d in docs])
+    _stats["candle_days_archived"] += 1
+    return len(docs)
+
+
+# ---------- job ----------
+def _oldest_day(collection: str, field: str):
+    db = get_firestore()
+    docs = list(db.collection(collection).order_by(field).limit(1).stream())
+    if not docs:
+        return None
+    value = (docs[0].to_dict() or {}).get(field)
+    return str(value)[:10] if value else None
+
+
+def _closed_days(collection: str, field: str, hot_days: int, today) -> list:
+    oldest = _oldest_day(collection, field)
+    if not oldest:
+        return []
+    day = datetime.strptime(oldest, "%Y-%m-%d").date()
+    cutoff = today - timedelta(days=hot_days)
+    days = []
+    while day < cutoff and len(days) < MAX_DAYS_PER_RUN:
+        days.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=1)
+    return days
+
+
+def run_compaction(today=None) -> dict:
+    """Archive puis supprime les jours clos hors fenêtre chaude. Retourne {collection: {day: n}}."""
+    if not _run_lock.acquire(blocking=False):
+        return {}
+    try:
+        today = today or datetime.now(timezone.utc).date()
+        done = {"execution_logs": {}, "ohlc_1m": {}}
+        jobs = (
+            ("execution_logs", "timestamp", LOG_HOT_DAYS, archive_logs_day),
+            ("ohlc_1m", "day", CANDLE_HOT_DAYS, archive_candles_day),
+        )
+        for collection, field, hot_days, archive_day in jobs:
+            for day in _closed_days(collection, field, hot_days, today):
+                try:
+                    n = archive_day(day)
+                    if n:
+                        done[collection][day] = n
+                except Exception as e:
+                    _stats["errors"] += 1
+                    log_to_firestore(f"[Archive] {collection} {day} echec: {e}", level="ERROR")
+        _stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        total = sum(sum(v.values()) for v in done.values())
+        if total:
+            log_to_firestore(
+                f"[Archive] {len(done['execution_logs'])} jour(s) de logs, "
+                f"{len(done['ohlc_1m'])} jour(s) de bougies archives ({total} docs supprimes)",
+                level="INFO"
+            )
+        return done
+    finally:
+        _run_lock.release()
+
+
+def get_stats() -> dict:
+    return dict(_stats)
+
+
+def archive_session():
+    """Fin de séance US : fige les bougies du jour (bar store) dans l'archive colonne."""
+    try:
+        written = candle_archive.archive_session()
+        if written:
+            log_to_firestore(f"[Archive] Bougies du jour archivees: {written}", level="INFO")
+    except Exception as e:
+        _stats["errors"] += 1
+        log_to_firestore(f"[Archive] Archivage fin de seance echoue: {e}", level="ERROR")
+
+
+def start(scheduler):
+    """
+    Planifie sur le scheduler de l'app (news_scheduler) la compaction quotidienne
+    (03:15 UTC, hors séance) et l'archive de fin de séance.
+    """
+    scheduler.add_job(run_compaction, "cron", hour=3, minute=15, id="archive_compaction", replace_existing=True,
+                      coalesce=True, max_instances=1, misfire_grace_time=3600)
+    # 21:30 UTC : après la clôture US (16:05 ET) été comme hiver
+    scheduler.add_job(archive_session, "cron", day_of_week="mon-fri", hour=21, minute=30, id="archive_session",
+                      replace_existing=True, coalesce=True, max_instances=1, misfire_grace_time=3600)
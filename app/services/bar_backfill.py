@@ -0,0 +1,117 @@
+# app/services/bar_backfill.py
+"""
+Détection des trous dans le flux AM (1 bougie / minute / symbole) et
+rattrapage via l'API REST aggregates.
+
+handle_msg compare l'end_timestamp reçu au dernier connu du bar store : au-delà
+d'une minute d'écart dans la même journée de session, le trou est mis en queue.
+Un worker récupère toutes les minutes manquantes en UNE requête aggregates par
+trou puis les repasse dans le chemin d'ingestion normal (bar store, ohlc_1m,
+range d'ouverture), marquées `backfilled` : les stratégies ne les reçoivent pas.
+"""
+import os
+import queue
+import threading
+from massive import RESTClient
+from app.services import bar_store, range_manager
+from app.services.bar_store import Candle
+from app.services.log_service import log_to_firestore
+
+POLYGON_REST_URL = os.getenv("POLYGON_REST_URL", "https://api.massive.com")
+BAR_MS = 60_000
+MAX_GAP_MS = 8 * 3600 * 1000   # au-delà : pas un trou de reconnexion, on ne rattrape pas
+AGGS_LIMIT = 50_000
+
+_queue = queue.Queue()
+_ingest = None
+_thread = None
+_client = None
+_stats = {
+    "gaps_detected": 0,
+    "gaps_filled": 0,
+    "bars_backfilled": 0,
+    "errors": 0,
+    "last_gap": None,
+}
+
+
+def _rest() -> RESTClient:
+    global _client
+    if _client is None:
+        _client = RESTClient(api_key=os.getenv("POLYGON_API_KEY"), base=POLYGON_REST_URL)
+    return _client
+
+
+def check_gap(sym: str, prev_e, e: int, session) -> bool:
+    """Met en queue le trou entre prev_e et e (exclus) s'il y a des minutes manquantes."""
+    if prev_e is None or prev_e < session.day_start_ms:
+        return False
+    gap_ms = e - prev_e
+    if gap_ms <= BAR_MS or gap_ms > MAX_GAP_MS:
+        return False
+    _stats["gaps_detected"] += 1
+    _stats["last_gap"] = {"sym": sym, "from_e": prev_e + BAR_MS, "to_e": e - BAR_MS}
+    _queue.put((sym, prev_e + BAR_MS, e - BAR_MS, session))
+    return True
+
+
+def fetch_bars(sym: str, first_e: int, last_e: int, session) -> list:
+    """Bougies manquantes de [first_e, last_e] (end timestamps) en une requête aggregates."""
+    first_s, last_s = first_e - BAR_MS, last_e - BAR_MS
+    candles = []
+    for agg in _rest().list_aggs(sym, 1, "minute", first_s, last_s, sort="asc", limit=AGGS_LIMIT):
+        if agg.timestamp is None or not first_s <= agg.timestamp <= last_s:
+            continue
+        e = agg.timestamp + BAR_MS
+        if bar_store.slice_bars(sym, e, e):
+            continue  # arrivée entre-temps par le WS
+        c = Candle(sym, agg.timestamp, e, float(agg.open), float(agg.high), float(agg.low), float(agg.close),
+                   None, session.open_ms <= e <= session.or_end_ms, backfilled=True)
+        candles.append(c)
+    return candles
+
+
+def fill_gap(sym: str, first_e: int, last_e: int, session) -> int:
+    candles = fetch_bars(sym, first_e, last_e, session)
+    for c in candles:
+        _ingest(c, session)
+    _stats["gaps_filled"] += 1
+    _stats["bars_backfilled"] += len(candles)
+
+    # trou dans la fenêtre du range déjà publié : recalcul exact (pas de double comptage)
+    if any(c.in_opening_range for c in candles) and range_manager.is_published(session.day, sym):
+        rdoc = range_manager.calculate_and_store_opening_range(session.day, sym)
+        log_to_firestore(
+            f"[Backfill] {sym} range d'ouverture {session.day} recalcule ({rdoc.get('status')})",
+            level="INFO"
+        )
+    log_to_firestore(
+        f"[Backfill] {sym} trou {first_e}..{last_e} : {len(candles)} bougie(s) rattrapee(s)",
+        level="INFO"
+    )
+    return len(candles)
+
+
+def _run():
+    while True:
+        sym, first_e, last_e, session = _queue.get()
+        try:
+            fill_gap(sym, first_e, last_e, session)
+        except Exception as e:
+            _stats["errors"] += 1
+            log_to_firestore(f"[Backfill] {sym} trou {first_e}..{last_e} echec: {e}", level="ERROR")
+        finally:
+            _queue.task_done()
+
+
+def start(ingest):
+    """`ingest(candle, session)` : chemin d'ingestion de polygon_ws (sans dispatch stratégies)."""
+    global _ingest, _thread
+    _ingest = ingest
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name="bar-backfill", daemon=True)
+        _thread.start()
+
+
+def get_stats() -> dict:
+    return {**_stats, "pending": _queue.qsize()}
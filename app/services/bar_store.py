@@ -0,0 +1,318 @@
+# app/services/bar_store.py
+"""
+Bougies 1m intraday en mémoire, partagées entre l'ingestion (polygon_ws) et
+les consommateurs (stratégies, range_manager, /api/candles).
+
+Un ring buffer par symbole, en colonnes `array` (float64 pour o/h/l/c/op,
+int64 pour les timestamps), trié par end_timestamp :
+- dernière bougie en O(1)
+- slice par intervalle de temps en O(log n) + taille du résultat
+Firestore ne sert plus que pour les jours que le process n'a pas vus.
+"""
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from app.services.firebase import get_firestore
+
+CAPACITY = 3 * 1440  # 3 jours de bougies 1m par symbole (couvre /api/candles = J-1 + J)
+DAY_MS = 86_400_000
+
+
+class Bar(NamedTuple):
+    s: int
+    e: int
+    o: float
+    h: float
+    l: float
+    c: float
+    op: Optional[float]
+    in_opening_range: bool
+
+
+class Candle:
+    """
+    Bougie 1m du chemin ingestion → stratégies : champs numériques, sans dict.
+    `day` / `utc_time` ne sont formatés qu'à la demande ; le dict ohlc_1m est
+    produit une seule fois par `to_doc()`, dans le batch writer.
+    """
+    __slots__ = ("ev", "sym", "s", "e", "o", "h", "l", "c", "op", "in_opening_range", "backfilled", "recv_ms", "_day")
+
+    def __init__(self, sym: str, s: int, e: int, o: float, h: float, l: float, c: float,
+                 op: Optional[float] = None, in_opening_range: bool = False, ev: str = "AM",
+                 day: Optional[str] = None, backfilled: bool = False,
+                 recv_ms: Optional[int] = None):
+        self.ev = ev
+        self.sym = sym
+        self.s = s
+        self.e = e
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.op = op
+        self.in_opening_range = in_opening_range
+        self.backfilled = backfilled   # rattrapée via REST après un trou du flux WS
+        self.recv_ms = recv_ms         # réception WS (epoch ms), point de départ des traces de latence
+        self._day = day
+
+    @property
+    def day(self) -> str:
+        """Jour UTC de la clôture (clé `day` de ohlc_1m), calculé au 1er accès."""
+        if self._day is None:
+            self._day = _utc(self.e).strftime("%Y-%m-%d")
+        return self._day
+
+    @property
+    def utc_time(self) -> str:
+        return _utc(self.e).strftime("%Y-%m-%d %H:%M:%S")
+
+    @property
+    def doc_id(self) -> str:
+        return f"{self.sym}_{self.e}"
+
+    def to_doc(self) -> dict:
+        """Format d'un document ohlc_1m."""
+        doc = {
+            "ev": self.ev, "sym": self.sym,
+            "op": self.op,
+            "o": self.o, "c": self.c, "h": self.h, "l": self.l,
+            "s": self.s, "e": self.e,
+            "utc_time": self.utc_time,
+            "day": self.day,
+            "in_opening_range": self.in_opening_range,
+        }
+        if self.backfilled:
+            doc["backfilled"] = True
+        return doc
+
+    def __repr__(self):
+        return f"Candle({self.sym} e={self.e} o={self.o} h={self.h} l={self.l} c={self.c})"
+
+
+def _utc(ts_ms: int) -> datetime:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+
+
+class BarRing:
+    """Ring buffer colonne pour un symbole, maintenu trié par `e`."""
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.s = array("q", [0]) * capacity
+        self.e = array("q", [0]) * capacity
+        self.o = array("d", [0.0]) * capacity
+        self.h = array("d", [0.0]) * capacity
+        self.l = array("d", [0.0]) * capacity
+        self.c = array("d", [0.0]) * capacity
+        self.op = array("d", [0.0]) * capacity
+        self.flag = array("b", [0]) * capacity
+        self.decisions = {}        # e -> {strategy_key: decision} (sous _lock, comme les colonnes)
+        self.evicted_until = 0     # e de la dernière bougie sortie du buffer
+        self._start = 0
+        self._len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._len
+
+    def _p(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    def _bisect(self, t: int, right: bool = False) -> int:
+        """Premier index logique dont e >= t (ou > t si right)."""
+        lo, hi = 0, self._len
+        e, start, cap = self.e, self._start, self.capacity
+        while lo < hi:
+            mid = (lo + hi) // 2
+            v = e[(start + mid) % cap]
+            if v < t or (right and v == t):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _write(self, p: int, s, e, o, h, l, c, op, flag):
+        self.s[p] = s
+        self.e[p] = e
+        self.o[p] = o
+        self.h[p] = h
+        self.l[p] = l
+        self.c[p] = c
+        self.op[p] = float("nan") if op is None else op
+        self.flag[p] = 1 if flag else 0
+
+    def _evict_oldest(self):
+        old_e = self.e[self._start]
+        self.evicted_until = max(self.evicted_until, old_e)
+        self.decisions.pop(old_e, None)
+        self._start = (self._start + 1) % self.capacity
+        self._len -= 1
+
+    def _bar(self, p: int) -> Bar:
+        op = self.op[p]
+        return Bar(self.s[p], self.e[p], self.o[p], self.h[p], self.l[p], self.c[p],
+                   None if op != op else op, bool(self.flag[p]))
+
+    def append(self, s, e, o, h, l, c, op=None, in_opening_range=False):
+        with self._lock:
+            n = self._len
+            if n and e <= self.e[self._p(n - 1)]:
+                self._insert(s, e, o, h, l, c, op, in_opening_range)
+                return
+            if n == self.capacity:
+                self._evict_oldest()
+            self._write(self._p(self._len), s, e, o, h, l, c, op, in_opening_range)
+            self._len += 1
+
+    def _insert(self, s, e, o, h, l, c, op, flag):
+        """Bougie en retard (backfill, doublon) : remplace ou décale en O(n)."""
+        pos = self._bisect(e)
+        if pos < self._len and self.e[self._p(pos)] == e:
+            self._write(self._p(pos), s, e, o, h, l, c, op, flag)
+            return
+        if self._len == self.capacity:
+            if pos == 0:
+                # plus vieille que toute la fenêtre : hors buffer
+                self.evicted_until = max(self.evicted_until, e)
+                return
+            self._evict_oldest()
+            pos -= 1
+        for i in range(self._len, pos, -1):
+            src, dst = self._p(i - 1), self._p(i)
+            for col in (self.s, self.e, self.o, self.h, self.l, self.c, self.op, self.flag):
+                col[dst] = col[src]
+        self._write(self._p(pos), s, e, o, h, l, c, op, flag)
+        self._len += 1
+
+    def annotate(self, e: int, strategy_key: str, decision: str):
+        with self._lock:
+            self.decisions.setdefault(e, {})[strategy_key] = decision
+
+    def decisions_at(self, e: int) -> dict:
+        with self._lock:
+            return dict(self.decisions.get(e) or {})
+
+    def decisions_between(self, start_ms: int, end_ms: int) -> dict:
+        with self._lock:
+            return {e: dict(d) for e, d in self.decisions.items() if start_ms <= e <= end_ms}
+
+    def latest(self) -> Optional[Bar]:
+        with self._lock:
+            if not self._len:
+                return None
+            return self._bar(self._p(self._len - 1))
+
+    def slice(self, start_ms: int, end_ms: int) -> list:
+        """Bougies avec start_ms <= e <= end_ms, dans l'ordre chronologique."""
+        with self._lock:
+            i = self._bisect(start_ms)
+            j = self._bisect(end_ms, right=True)
+            return [self._bar(self._p(k)) for k in range(i, j)]
+
+
+_rings = {}
+_rings_lock = threading.Lock()
+_started_ms = int(time.time() * 1000)
+_warmed_days = set()
+
+
+def _ring(sym: str) -> BarRing:
+    ring = _rings.get(sym)
+    if ring is None:
+        with _rings_lock:
+            ring = _rings.setdefault(sym, BarRing())
+    return ring
+
+
+def _day_bounds(day: str):
+    d0 = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    start = int(d0.timestamp() * 1000)
+    return start, start + DAY_MS - 1
+
+
+def append(sym: str, s: int, e: int, o, h, l, c, op=None, in_opening_range=False):
+    _ring(sym).append(int(s), int(e), float(o), float(h), float(l), float(c),
+                      None if op is None else float(op), in_opening_range)
+
+
+def append_candle(candle: Candle):
+    _ring(candle.sym).append(candle.s, candle.e, candle.o, candle.h, candle.l, candle.c,
+                             candle.op, candle.in_opening_range)
+
+
+def annotate(sym: str, e: int, strategy_key: str, decision: str):
+    """Décision de stratégie sur une bougie (miroir de ohlc_1m.strategy_decisions)."""
+    _ring(sym).annotate(int(e), strategy_key, decision)
+
+
+def latest(sym: str) -> Optional[Bar]:
+    ring = _rings.get(sym)
+    return ring.latest() if ring else None
+
+
+def slice_bars(sym: str, start_ms: int, end_ms: int) -> list:
+    ring = _rings.get(sym)
+    return ring.slice(start_ms, end_ms) if ring else []
+
+
+def atr(sym: str, end_ms: int, period: int = 14) -> Optional[float]:
+    """ATR (moyenne simple des true ranges) des `period` bougies 1m finissant à end_ms, None si trop peu."""
+    bars = slice_bars(sym, end_ms - 3 * (period + 1) * 60_000, end_ms)[-(period + 1):]
+    if len(bars) < period + 1:
+        return None
+    ranges = [max(b.h, prev.c) - min(b.l, prev.c) for prev, b in zip(bars, bars[1:])]
+    return sum(ranges) / period
+
+
+def day_bars(sym: str, day: str) -> list:
+    """Bougies dont le `day` (UTC, comme dans ohlc_1m) est `day`."""
+    return slice_bars(sym, *_day_bounds(day))
+
+
+def day_decisions(sym: str, day: str) -> dict:
+    """{e: {strategy_key: decision}} des bougies de `day` encore en mémoire."""
+    ring = _rings.get(sym)
+    if ring is None:
+        return {}
+    return ring.decisions_between(*_day_bounds(day))
+
+
+def symbols() -> list:
+    return list(_rings.keys())
+
+
+def has_day(day: str) -> bool:
+    """True si toutes les bougies de `day` reçues par l'ingestion sont en mémoire."""
+    start, _ = _day_bounds(day)
+    if start < _started_ms and day not in _warmed_days:
+        return False
+    return all(r.evicted_until < start for r in list(_rings.values()))
+
+
+def to_doc(sym: str, bar: Bar) -> dict:
+    """Format d'un document ohlc_1m."""
+    doc = Candle(sym, bar.s, bar.e, bar.o, bar.h, bar.l, bar.c, bar.op, bar.in_opening_range).to_doc()
+    ring = _rings.get(sym)
+    decisions = ring.decisions_at(bar.e) if ring else None
+    if decisions:
+        doc["strategy_decisions"] = decisions
+    return doc
+
+
+def warm_day(day: str):
+    """Charge une journée depuis Firestore (au démarrage en cours de session)."""
+    if has_day(day):
+        return
+    db = get_firestore()
+    for doc in db.collection("ohlc_1m").where("day", "==", day).stream():
+        d = doc.to_dict() or {}
+        try:
+            append(d["sym"], d["s"], d["e"], d["o"], d["h"], d["l"], d["c"],
+                   d.get("op"), d.get("in_opening_range", False))
+        except (KeyError, TypeError, ValueError):
+            continue
+        for key, decision in (d.get("strategy_decisions") or {}).items():
+            annotate(d["sym"], d["e"], key, decision)
+    _warmed_days.add(day)
@@ -0,0 +1,230 @@
+# app/services/batch_writer.py
+import copy
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from app.services.firebase import get_firestore
+
+MAX_QUEUE = 5000
+BATCH_SIZE = 200           # Firestore limite un WriteBatch à 500 écritures
+FLUSH_INTERVAL = 1.0       # secondes max entre la 1re écriture en attente et le commit
+MAX_COMMIT_RETRIES = 3
+
+_FLUSH = object()
+_STOP = object()
+
+
+def _deep_merge(dst: dict, src: dict) -> dict:
+    """Fusionne `src` dans `dst` comme un set(merge=True) Firestore (maps imbriquées)."""
+    for k, v in src.items():
+        if isinstance(v, dict) and isinstance(dst.get(k), dict):
+            _deep_merge(dst[k], v)
+        else:
+            dst[k] = v
+    return dst
+
+
+class BatchWriter:
+    """
+    Écritures Firestore hors du chemin critique.
+
+    Les appels à `enqueue` ne font qu'un put dans une queue bornée ; un thread
+    de fond regroupe les écritures en WriteBatch (seuil de taille ou de temps)
+    et les commit. Plusieurs écritures sur le même document dans un batch sont
+    fusionnées en une seule.
+    """
+
+    def __init__(self, name: str, max_queue: int = MAX_QUEUE,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 drop_when_full: bool = False, on_commit=None):
+        self.name = name
+        self.drop_when_full = drop_when_full
+        self.on_commit = on_commit   # callback(writes) après chaque batch commité (thread du writer)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "docs_written": 0,
+            "last_batch_size": 0,
+            "last_commit_ms": None,
+            "avg_commit_ms": None,
+            "max_commit_ms": 0.0,
+            "last_commit_at": None,
+            "errors": 0,
+            "dropped": 0,
+            "sync_fallbacks": 0,
+        }
+
+    # ---------- API ----------
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"batch-writer-{self.name}", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, collection: str, doc_id, data, merge: bool = False):
+        """Planifie un set() (ou set(merge=True)). doc_id=None → id auto (équivalent add())."""
+        if not self._thread:
+            self.start()
+        item = (collection, doc_id, data, merge)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.drop_when_full:
+                # données non critiques (logs) : on ne bloque jamais l'appelant
+                self._stats["dropped"] += 1
+                return
+            # Firestore ne suit plus : on retombe sur une écriture synchrone plutôt que de perdre la donnée
+            self._stats["sync_fallbacks"] += 1
+            self._commit([item])
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Force le commit de tout ce qui est en attente. Retourne False si le timeout est atteint."""
+        if not self._thread or not self._thread.is_alive():
+            return self._queue.unfinished_tasks == 0
+        self._queue.put(_FLUSH)
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Vide la queue puis arrête le thread (à appeler au shutdown)."""
+        if not self._thread or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def get_stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["running"] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    # ---------- internals ----------
+    def _run(self):
+        while True:
+            items, stop = self._drain()
+            if items:
+                self._commit(items)
+            for _ in range(len(items) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _drain(self):
+        """Bloque jusqu'à la 1re écriture puis accumule jusqu'à batch_size ou flush_interval."""
+        items = []
+        first = self._queue.get()
+        if first is _STOP:
+            return self._drain_remaining(items), True
+        if first is _FLUSH:
+            self._queue.task_done()
+            return self._drain_remaining(items), False
+        items.append(first)
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return self._drain_remaining(items), True
+            if item is _FLUSH:
+                self._queue.task_done()
+                return self._drain_remaining(items), False
+            items.append(item)
+        return items, False
+
+    def _drain_remaining(self, items: list) -> list:
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is _FLUSH or item is _STOP:
+                # marqueurs redondants : rien à écrire
+                self._queue.task_done()
+                continue
+            items.append(item)
+
+    def _coalesce(self, items: list) -> list:
+        """Une seule écriture par document : un set suivi de merges devient un set fusionné."""
+        out, index = [], {}
+        for collection, doc_id, data, merge in items:
+            data = data.to_doc() if hasattr(data, "to_doc") else data
+            key = (collection, doc_id)
+            pos = index.get(key) if doc_id is not None else None
+            if pos is None or not merge:
+                if pos is not None:
+                    out[pos] = None
+                index[key] = len(out)
+                out.append([collection, doc_id, data, merge, False])
+                continue
+            entry = out[pos]
+            if not entry[4]:
+                entry[2] = copy.deepcopy(entry[2])  # ne jamais muter le dict de l'appelant
+                entry[4] = True
+            _deep_merge(entry[2], data)
+        return [tuple(e[:4]) for e in out if e is not None]
+
+    def _commit(self, items: list):
+        writes = self._coalesce(items)
+        db = get_firestore()
+        for start in range(0, len(writes), self.batch_size):
+            chunk = writes[start:start + self.batch_size]
+            for attempt in range(MAX_COMMIT_RETRIES):
+                t0 = time.perf_counter()
+                try:
+                    batch = db.batch()
+                    for collection, doc_id, data, merge in chunk:
+                        coll = db.collection(collection)
+                        ref = coll.document(doc_id) if doc_id is not None else coll.document()
+                        if merge:
+                            batch.set(ref, data, merge=True)
+                        else:
+                            batch.set(ref, data)
+                    batch.commit()
+                except Exception as e:
+                    self._stats["errors"] += 1
+                    # pas de log_to_firestore ici : le logger passe lui-même par un BatchWriter
+                    print(f"[BatchWriter:{self.name}] Commit failed ({len(chunk)} docs, try {attempt + 1}): {e}")
+                    time.sleep(0.5 * 2 ** attempt)
+                    continue
+                self._record_commit(len(chunk), (time.perf_counter() - t0) * 1000)
+                if self.on_commit:
+                    try:
+                        self.on_commit(chunk)
+                    except Exception as e:
+                        print(f"[BatchWriter:{self.name}] on_commit failed: {e}")
+                break
+            else:
+                self._stats["dropped"] += len(chunk)
+
+    def _record_commit(self, size: int, elapsed_ms: float):
+        s = self._stats
+        s["batches"] += 1
+        s["docs_written"] += size
+        s["last_batch_size"] = size
+        s["last_commit_ms"] = round(elapsed_ms, 1)
+        s["avg_commit_ms"] = round(elapsed_ms if s["avg_commit_ms"] is None
+                                   else 0.9 * s["avg_commit_ms"] + 0.1 * elapsed_ms, 1)
+        s["max_commit_ms"] = round(max(s["max_commit_ms"], elapsed_ms), 1)
+        s["last_commit_at"] = datetime.now(timezone.utc).isoformat()
+
+
+# Writer partagé pour les bougies 1m (et les décisions de stratégie sur ces bougies)
+candle_writer = BatchWriter("ohlc_1m")
@@ -0,0 +1,257 @@
+# app/services/candle_archive.py
+"""
+Archive colonne des bougies 1m : un fichier par symbole et par jour (UTC).
+
+    {ARCHIVE_DIR}/candles/{SYM}/{YYYY-MM-DD}.bin     (SYM = "I_SPX" pour "I:SPX")
+
+Format (little-endian) :
+    en-tête 16 octets : magic b"OHLC1M", version u16, nombre de bougies u32, réservé u32
+    colonnes contiguës de n valeurs chacune, dans cet ordre :
+        s, e                 int64  (epoch ms)
+        o, h, l, c, op       float64 (op = NaN si absent)
+        flags                uint8  (bit 0 : in_opening_range, bit 1 : backfilled)
+
+La lecture passe par mmap + memoryview.cast : aucune copie ni désérialisation,
+seules les pages touchées sont lues. `iter_bars` parcourt une plage de temps
+sur plusieurs jours en ne mappant que les fichiers concernés (cache LRU).
+Un fichier sorti du cache (réécriture, éviction) n'est jamais fermé de force :
+un lecteur qui le tient encore garde ses colonnes, le GC le démappe ensuite.
+Les décisions de stratégie (texte) vont dans un fichier annexe
+{YYYY-MM-DD}.decisions.json, seulement s'il y en a.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from app.services.bar_store import Bar
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+MAGIC = b"OHLC1M"
+VERSION = 1
+HEADER = struct.Struct("<6sHII")
+FLAG_OPENING_RANGE = 1
+FLAG_BACKFILLED = 2
+MAX_OPEN_FILES = 64
+
+_INT_COLS = ("s", "e")
+_FLOAT_COLS = ("o", "h", "l", "c", "op")
+
+_open = OrderedDict()   # chemin -> DayColumns (LRU des mmap ouverts)
+_open_lock = threading.Lock()
+
+if sys.byteorder != "little":  # memoryview.cast lit l'ordre natif
+    raise ImportError("candle_archive suppose une machine little-endian")
+
+
+def _sym_dir(sym: str) -> str:
+    return os.path.join(ARCHIVE_DIR, "candles", sym.replace(":", "_"))
+
+
+def path_for(sym: str, day: str) -> str:
+    return os.path.join(_sym_dir(sym), f"{day}.bin")
+
+
+def _decisions_path(sym: str, day: str) -> str:
+    return os.path.join(_sym_dir(sym), f"{day}.decisions.json")
+
+
+class DayColumns:
+    """Vue zéro-copie sur un fichier jour : colonnes exposées en memoryview."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:  # le mmap garde son propre descripteur
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or len(self._mm) < HEADER.size + 49 * n:
+            self.close()
+            raise ValueError(f"{path}: format inconnu")
+        self.n = n
+        buf = memoryview(self._mm)
+        off = HEADER.size
+        for name in _INT_COLS:
+            setattr(self, name, buf[off:off + 8 * n].cast("q"))
+            off += 8 * n
+        for name in _FLOAT_COLS:
+            setattr(self, name, buf[off:off + 8 * n].cast("d"))
+            off += 8 * n
+        self.flags = buf[off:off + n].cast("B")
+
+    def __len__(self):
+        return self.n
+
+    def bar(self, i: int) -> Bar:
+        op = self.op[i]
+        return Bar(self.s[i], self.e[i], self.o[i], self.h[i], self.l[i], self.c[i],
+                   None if op != op else op, bool(self.flags[i] & FLAG_OPENING_RANGE))
+
+    def index_range(self, start_ms: int, end_ms: int):
+        """Indices [i, j) des bougies avec start_ms <= e <= end_ms (recherche binaire sur la colonne e)."""
+        return bisect.bisect_left(self.e, start_ms), bisect.bisect_right(self.e, end_ms)
+
+    def close(self):
+        """Libère le mapping tout de suite : seulement si aucun autre lecteur ne tient ces colonnes."""
+        for name in _INT_COLS + _FLOAT_COLS + ("flags",):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._mm.close()
+
+
+def open_day(sym: str, day: str):
+    """Lecteur mmap du jour (mis en cache), ou None si le fichier n'existe pas."""
+    path = path_for(sym, day)
+    with _open_lock:
+        cols = _open.get(path)
+        if cols is not None:
+            _open.move_to_end(path)
+            return cols
+        if not os.path.exists(path):
+            return None
+        cols = _open[path] = DayColumns(path)
+        while len(_open) > MAX_OPEN_FILES:
+            _open.popitem(last=False)  # démappé par le GC quand son dernier lecteur le lâche
+        return cols
+
+
+def _invalidate(path: str):
+    with _open_lock:
+        _open.pop(path, None)
+
+
+def write_day(sym: str, day: str, rows: list, decisions: dict = None):
+    """
+    Écrit (remplace) le fichier d'un symbole/jour. `rows` : Bar ou tuples
+    (s, e, o, h, l, c, op, in_opening_range[, backfilled]) ; triés et dédoublonnés sur e.
+    """
+    by_e = {}
+    for r in rows:
+        by_e[int(r[1])] = r
+    ordered = [by_e[e] for e in sorted(by_e)]
+    n = len(ordered)
+
+    payload = bytearray(HEADER.pack(MAGIC, VERSION, n, 0))
+    for k in range(2):
+        payload += struct.pack(f"<{n}q", *(int(r[k]) for r in ordered))
+    for k in range(2, 7):
+        payload += struct.pack(f"<{n}d", *(float("nan") if r[k] is None else float(r[k]) for r in ordered))
+    payload += bytes(
+        (FLAG_OPENING_RANGE if r[7] else 0) | (FLAG_BACKFILLED if len(r) > 8 and r[8] else 0)
+        for r in ordered
+    )
+
+    path = path_for(sym, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    _invalidate(path)
+    os.replace(tmp, path)
+
+    if decisions:
+        with open(_decisions_path(sym, day), "w", encoding="utf-8") as f:
+            json.dump({str(e): d for e, d in decisions.items() if int(e) in by_e}, f)
+    return n
+
+
+def read_decisions(sym: str, day: str) -> dict:
+    path = _decisions_path(sym, day)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {int(e): d for e, d in json.load(f).items()}
+
+
+def read_rows(sym: str, day: str) -> list:
+    """Lignes (s, e, o, h, l, c, op, in_opening_range, backfilled) d'un jour (pour fusion/réécriture)."""
+    cols = open_day(sym, day)
+    if cols is None:
+        return []
+    return [tuple(cols.bar(i)) + (bool(cols.flags[i] & FLAG_BACKFILLED),) for i in range(len(cols))]
+
+
+def symbols() -> list:
+    root = os.path.join(ARCHIVE_DIR, "candles")
+    if not os.path.isdir(root):
+        return []
+    return sorted(d.replace("_", ":", 1) for d in os.listdir(root))
+
+
+def has_day(day: str) -> bool:
+    return any(os.path.exists(path_for(sym, day)) for sym in symbols())
+
+
+def _utc_days(start_ms: int, end_ms: int):
+    d = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).date()
+    last = datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc).date()
+    while d <= last:
+        yield d.strftime("%Y-%m-%d")
+        d += timedelta(days=1)
+
+
+def iter_bars(sym: str, start_ms: int, end_ms: int):
+    """Bougies avec start_ms <= e <= end_ms, jour par jour, sans charger la plage en mémoire."""
+    for day in _utc_days(start_ms, end_ms):
+        cols = open_day(sym, day)
+        if cols is None:
+            continue
+        i, j = cols.index_range(start_ms, end_ms)
+        for k in range(i, j):
+            yield cols.bar(k)
+
+
+def load_range(sym: str, start_ms: int, end_ms: int) -> list:
+    return list(iter_bars(sym, start_ms, end_ms))
+
+
+def to_doc(sym: str, day: str, cols: DayColumns, i: int, decisions: dict) -> dict:
+    """Format d'un document ohlc_1m (lecture /api/candles)."""
+    bar = cols.bar(i)
+    e = bar.e
+    doc = {
+        "ev": "AM", "sym": sym,
+        "op": bar.op,
+        "o": bar.o, "c": bar.c, "h": bar.h, "l": bar.l,
+        "s": bar.s, "e": e,
+        "utc_time": datetime.fromtimestamp(e / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "day": day,
+        "in_opening_range": bar.in_opening_range,
+    }
+    if e in decisions:
+        doc["strategy_decisions"] = decisions[e]
+    if cols.flags[i] & FLAG_BACKFILLED:
+        doc["backfilled"] = True
+    return doc
+
+
+def day_docs(day: str) -> list:
+    """Toutes les bougies archivées d'un jour, au format ohlc_1m, triées par `s`."""
+    docs = []
+    for sym in symbols():
+        cols = open_day(sym, day)
+        if cols is None:
+            continue
+        decisions = read_decisions(sym, day)
+        docs += [to_doc(sym, day, cols, i, decisions) for i in range(len(cols))]
+    return sorted(docs, key=lambda d: d["s"])
+
+
+def archive_session(day: str = None) -> dict:
+    """Fin de séance : écrit les bougies du jour depuis le bar store (fusion avec un fichier existant)."""
+    from app.services import bar_store
+    day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    written = {}
+    for sym in bar_store.symbols():
+        bars = bar_store.day_bars(sym, day)
+        if not bars:
+            continue
+        decisions = {**read_decisions(sym, day), **bar_store.day_decisions(sym, day)}
+        written[sym] = write_day(sym, day, read_rows(sym, day) + [tuple(b) for b in bars], decisions)
+    return written
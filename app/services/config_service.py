@@ -0,0 +1,92 @@
+# app/services/config_service.py
+"""
+Cache en mémoire des documents `config/strategies` et `config/settings`.
+
+Les documents sont tenus à jour par des listeners Firestore `on_snapshot` ;
+chaque exécution de pipeline (bougie, webhook, news) prend un
+`ConfigSnapshot` versionné et immuable au lieu de relire Firestore.
+"""
+import threading
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+from app.services.firebase import get_firestore
+from app.services.log_service import log_to_firestore
+
+CONFIG_DOCS = ("strategies", "settings")
+
+
+class ConfigSnapshot(NamedTuple):
+    version: int
+    strategies: Mapping
+    settings: Mapping
+
+    def is_enabled(self, strategy_key: str) -> bool:
+        return bool(self.strategies.get(strategy_key, False))
+
+
+_docs = {name: {} for name in CONFIG_DOCS}
+_snapshot = ConfigSnapshot(0, MappingProxyType({}), MappingProxyType({}))
+_lock = threading.Lock()
+_loaded = False
+_watches = []
+
+
+def _set(name: str, data: dict, merge: bool = False):
+    global _snapshot
+    with _lock:
+        _docs[name] = {**_docs[name], **data} if merge else dict(data)
+        _snapshot = ConfigSnapshot(
+            _snapshot.version + 1,
+            MappingProxyType(dict(_docs["strategies"])),
+            MappingProxyType(dict(_docs["settings"])),
+        )
+
+
+def _on_snapshot(name: str):
+    def callback(doc_snapshots, changes, read_time):
+        doc = doc_snapshots[0] if doc_snapshots else None
+        _set(name, (doc.to_dict() or {}) if doc is not None and doc.exists else {})
+    return callback
+
+
+def refresh():
+    """Relecture synchrone des documents config (démarrage, scripts sans listener)."""
+    global _loaded
+    db = get_firestore()
+    for name in CONFIG_DOCS:
+        _set(name, db.collection("config").document(name).get().to_dict() or {})
+    _loaded = True
+
+
+def start():
+    """Charge la config puis branche les listeners (appelé au startup FastAPI)."""
+    if _watches:
+        return
+    refresh()
+    db = get_firestore()
+    for name in CONFIG_DOCS:
+        try:
+            _watches.append(db.collection("config").document(name).on_snapshot(_on_snapshot(name)))
+        except Exception as e:
+            log_to_firestore(f"[ConfigService] Listener config/{name} indisponible: {e}", level="ERROR")
+    log_to_firestore(f"[ConfigService] Config chargee (v{_snapshot.version}), listeners actifs", level="INFO")
+
+
+def stop():
+    while _watches:
+        try:
+            _watches.pop().unsubscribe()
+        except Exception:
+            pass
+
+
+def get_snapshot() -> ConfigSnapshot:
+    """Config courante, sans I/O une fois chargée."""
+    if not _loaded:
+        refresh()
+    return _snapshot
+
+
+def apply_local(name: str, update: dict):
+    """Reflète immédiatement une écriture faite par l'API (le listener confirmera)."""
+    _set(name, update, merge=True)
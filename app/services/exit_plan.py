@@ -0,0 +1,161 @@
+# app/services/exit_plan.py
+"""
+Plans de sortie par trade : paliers (niveau en R, part des units initiales à
+clôturer, nouveau stop) et trailing stop optionnel (ATR ou pourcentage).
+
+Les plans viennent de la config (settings.exit_plans, choisis par stratégie
+via settings.exit_plan_by_strategy) et sont compilés à l'entrée en niveaux de
+prix, sur le document du trade (champ exit_plan) :
+
+    {"name", "fill", "risk", "sign", "done",
+     "rungs": [{"r", "fraction", "stop", "level", "units", "stop_price", "state",
+                "order_id"?, "fill_price"?, "slippage"?}],
+     "trailing": {"type", "dist", "after", "anchor", "moves"} | None}
+
+`done` est l'index du prochain palier : next_trigger ne regarde que ce palier
+et le prochain cran du trailing, quel que soit le nombre de paliers.
+
+stop d'un palier : "be" (fill + petit offset), un multiple de R (fill + k*R),
+ou None (stop inchangé). fraction 0 = palier qui ne déplace que le stop.
+"""
+import math
+
+TRAIL_RATCHET = 0.25   # le stop suiveur ne bouge que si le prix a progressé de 25 % de sa distance
+
+DEFAULT_PLANS = {
+    "breakeven": {"rungs": [{"r": 0.5, "fraction": 0, "stop": "be"}]},
+    "scaling_3": {"rungs": [{"r": 1, "fraction": 0.5, "stop": "be"},
+                            {"r": 2, "fraction": 0.25, "stop": 1}]},
+}
+DEFAULT_PLAN = "breakeven"
+
+
+def be_offset(decimals: int) -> float:
+    """Petit offset de prix du stop au breakeven (profit minime verrouillé)."""
+    # CFDs (1-2 decimals): 0.1, JPY pairs (3 decimals): 0.01, other forex (5 decimals): 0.0001
+    offsets = {1: 0.1, 2: 0.1, 3: 0.01, 5: 0.0001}
+    return offsets.get(decimals, 10 ** -(decimals))
+
+
+def plan_for(strategy_key: str, settings: dict = None, default: str = DEFAULT_PLAN) -> tuple:
+    """(nom, spec) du plan de la stratégie : settings.exit_plan_by_strategy, sinon `default`."""
+    settings = settings or {}
+    plans = {**DEFAULT_PLANS, **(settings.get("exit_plans") or {})}
+    name = (settings.get("exit_plan_by_strategy") or {}).get(strategy_key, default)
+    if name not in plans:
+        name = default
+    return name, plans[name]
+
+
+def _rung_units(initial_units: float, fraction: float, step: float) -> float:
+    if not fraction:
+        return 0.0
+    return round(max(math.floor(initial_units * fraction / step) * step, step), 4)
+
+
+def _compile_trailing(spec: dict, fill: float, atr: float = None):
+    if not spec:
+        return None
+    if spec.get("type") == "atr":
+        if not atr:
+            return None  # pas de volatilité connue à l'entrée : pas de trailing
+        dist = float(atr) * float(spec.get("mult", 2.0))
+    else:
+        dist = fill * float(spec.get("pct", 0.5)) / 100
+    return {"type": spec.get("type", "pct"), "dist": dist, "after": int(spec.get("after", 1)),
+            "anchor": None, "moves": 0}
+
+
+def compile_plan(name: str, spec: dict, fill: float, direction: str, risk: float, initial_units: float,
+                 step: float, offset: float, atr: float = None) -> dict:
+    """Plan `spec` en niveaux de prix pour un trade rempli à `fill`, R = `risk` (distance de prix)."""
+    sign = 1 if direction == "LONG" else -1
+    initial_units = abs(float(initial_units))
+    left = initial_units
+    rungs = []
+    for rung in sorted(spec.get("rungs", []), key=lambda r: r["r"]):
+        units = min(_rung_units(initial_units, rung.get("fraction", 0), step), left)
+        left = round(left - units, 4)
+        stop = rung.get("stop")
+        if stop is None:
+            stop_price = None
+        elif stop == "be":
+            stop_price = fill + sign * offset
+        else:
+            stop_price = fill + sign * float(stop) * risk
+        rungs.append({
+            "r": rung["r"],
+            "fraction": rung.get("fraction", 0),
+            "stop": stop,
+            "level": fill + sign * float(rung["r"]) * risk,
+            "units": units,
+            "stop_price": stop_price,
+            "state": "pending",
+        })
+    return {
+        "name": name,
+        "fill": fill,
+        "risk": risk,
+        "sign": sign,
+        "done": 0,
+        "rungs": rungs,
+        "trailing": _compile_trailing(spec.get("trailing"), fill, atr),
+    }
+
+
+def legacy_plan(trade_data: dict, offset: float):
+    """Plan équivalent d'un trade ouvert avant les plans (scaling_step / breakeven_applied)."""
+    try:
+        fill = float(trade_data.get("fill_price") or 0)
+        direction = trade_data.get("direction")
+        if trade_data.get("scaling_step") is not None:
+            name, risk, done = "scaling_3", float(trade_data.get("risk_r") or 0), int(trade_data["scaling_step"])
+            units, step = float(trade_data.get("initial_units") or 0), float(trade_data.get("step") or 1)
+        else:
+            name, risk = "breakeven", abs(fill - float(trade_data.get("sl") or fill))
+            done, units, step = (1 if trade_data.get("breakeven_applied") else 0), 0.0, 1.0
+    except (TypeError, ValueError):
+        return None
+    if not fill or not direction or not risk:
+        return None
+    plan = compile_plan(name, DEFAULT_PLANS[name], fill, direction, risk, units, step, offset)
+    for rung in plan["rungs"][:done]:
+        rung["state"] = "filled"
+    plan["done"] = min(done, len(plan["rungs"]))
+    return plan
+
+
+def _trail_anchor(plan: dict, trailing: dict) -> float:
+    if trailing["anchor"] is not None:
+        return trailing["anchor"]
+    after = trailing["after"]
+    return plan["fill"] if after == 0 else plan["rungs"][after - 1]["level"]
+
+
+def next_trigger(plan: dict):
+    """(règle, niveau) du prochain seuil surveillé au prix, ou None. Règles : "rung<i>", "trail<n>"."""
+    if not plan:
+        return None
+    sign, done = plan["sign"], plan["done"]
+    candidates = []
+    if done < len(plan["rungs"]) and not plan["rungs"][done].get("order_id"):
+        candidates.append((f"rung{done}", plan["rungs"][done]["level"]))  # palier posé chez le broker : fill réconcilié
+    trailing = plan.get("trailing")
+    if trailing and done >= trailing["after"]:
+        level = _trail_anchor(plan, trailing) + sign * trailing["dist"] * TRAIL_RATCHET
+        candidates.append((f"trail{trailing['moves']}", level))
+    if not candidates:
+        return None
+    return min(candidates, key=lambda c: sign * c[1])
+
+
+def trail_stop(plan: dict, price: float) -> float:
+    """Nouveau stop suiveur pour un prix atteint."""
+    return price - plan["sign"] * plan["trailing"]["dist"]
+
+
+def closed_rungs(plan: dict) -> list:
+    """Paliers exécutés qui ont fermé des units."""
+    if not plan:
+        return []
+    return [r for r in plan["rungs"] if r["state"] == "filled" and r["units"]]
@@ -0,0 +1,165 @@
+# app/services/exit_scheduler.py
+"""
+Clôtures à heure exacte des trades ouverts, par jobs APScheduler "date" :
+    - session_end : trade_end - AUTO_CLOSE_BEFORE_END_MS (instruments à session, OANDA)
+    - weekend     : vendredi 20:55 UTC (forex OANDA)
+    - max_hold    : max_hold_until (news trading)
+
+Les jobs d'un trade sont enregistrés à son ouverture (register, appelé par la
+stratégie), annulés à sa clôture quelle qu'en soit la source (cancel, depuis
+la finalisation du tracker) et restaurés au démarrage depuis les trades
+ouverts de Firestore. Le cycle du tracker rattrape aussi les trades ouverts
+par un autre process, et garde ses contrôles d'heure comme filet de sécurité.
+
+Les jobs tournent sur le scheduler APScheduler de l'app (news_scheduler),
+passé à start() ; stop() ne retire que les jobs de clôture.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from apscheduler.jobstores.base import JobLookupError
+from app.services import trade_tracker
+from app.services.log_service import log_to_firestore
+from app.services.session_calendar import calendar
+
+MISFIRE_GRACE_S = 300   # process suspendu : le job s'exécute encore s'il a moins de 5 min de retard
+
+_scheduler = None       # scheduler partagé de l'app
+_jobs = {}              # (broker, trade_id) -> [job ids]
+_lock = threading.Lock()
+_stats = {"registered": 0, "restored": 0, "fired": 0, "closed": 0, "cancelled": 0, "errors": 0}
+
+
+def close_times(instrument: str, broker: str, max_hold_until: str = None, now: datetime = None) -> dict:
+    """{raison: datetime UTC} des clôtures à heure fixe d'un trade ouvert à `now`."""
+    now = now or datetime.now(timezone.utc)
+    times = {}
+    if broker != "kraken" and instrument:
+        sym = calendar.symbol_for_instrument(instrument)
+        if sym:
+            end_ms = calendar.bounds(sym, int(now.timestamp() * 1000)).trade_end_ms
+            times["session_end"] = datetime.fromtimestamp(
+                (end_ms - trade_tracker.AUTO_CLOSE_BEFORE_END_MS) / 1000, tz=timezone.utc)
+        if instrument in trade_tracker.FOREX_INSTRUMENTS:
+            weekday, hour, minute = trade_tracker.WEEKEND_CLOSE_UTC
+            day = now + timedelta(days=(weekday - now.weekday()) % 7)
+            times["weekend"] = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if max_hold_until:
+        max_hold = datetime.fromisoformat(max_hold_until)
+        times["max_hold"] = max_hold if max_hold.tzinfo else max_hold.replace(tzinfo=timezone.utc)
+    return times
+
+
+def _run_close(broker: str, trade_id_val: str, reason: str):
+    _stats["fired"] += 1
+    try:
+        doc_ref, trade_data = trade_tracker.find_open_trade(trade_id_val, broker)
+        if doc_ref is None:
+            cancel(trade_id_val, broker)  # déjà clos : jobs restants inutiles
+            return
+        if reason == "max_hold":
+            closed = trade_tracker.force_close_trade(doc_ref, trade_id_val, trade_data, "max_hold_expired", broker)
+        else:
+            closed = trade_tracker.auto_close_now(doc_ref, trade_id_val, trade_data, broker)
+        if closed:
+            _stats["closed"] += 1
+    except Exception as e:
+        _stats["errors"] += 1
+        log_to_firestore(f"[ExitScheduler] Cloture {reason} du trade {trade_id_val} echouee "
+                         f"(reprise par le polling): {e}", level="ERROR")
+
+
+def register(trade_id_val, broker: str, instrument: str, max_hold_until: str = None) -> list:
+    """Planifie les clôtures à heure fixe d'un trade ouvert (sans effet s'il l'est déjà). Retourne les raisons."""
+    if not trade_id_val:
+        return []
+    key = (broker, str(trade_id_val))
+    now = datetime.now(timezone.utc)
+    with _lock:
+        if _scheduler is None or key in _jobs:
+            return []
+        times = close_times(instrument, broker, max_hold_until, now)
+        if not times:
+            return []   # crypto : aucune clôture à heure fixe
+        ids = []
+        for reason, run_at in times.items():
+            job_id = f"close_{broker}_{trade_id_val}_{reason}"
+            _scheduler.add_job(
+                _run_close, "date", run_date=max(run_at, now), args=[broker, str(trade_id_val), reason],
+                id=job_id, replace_existing=True, coalesce=True, misfire_grace_time=MISFIRE_GRACE_S,
+            )
+            ids.append(job_id)
+        _jobs[key] = ids
+        _stats["registered"] += 1
+    return list(times)
+
+
+def ensure(trades):
+    """Trades ouverts du cycle du tracker [(doc_ref, trade_id, broker, data)] : planifie ceux qui ne le sont pas."""
+    for _doc_ref, tid, broker, data in trades:
+        if (broker, str(tid)) not in _jobs:
+            register(tid, broker, data.get("instrument"), data.get("max_hold_until"))
+
+
+def cancel(trade_id_val, broker: str):
+    """Trade clos : annule ses jobs restants."""
+    with _lock:
+        ids = _jobs.pop((broker, str(trade_id_val)), [])
+        if _scheduler is None:
+            return
+        for job_id in ids:
+            try:
+                _scheduler.remove_job(job_id)
+                _stats["cancelled"] += 1
+            except JobLookupError:
+                pass  # déjà exécuté
+
+
+def restore():
+    """Redémarrage : replanifie les trades encore ouverts dans Firestore."""
+    trades = trade_tracker.load_open_trades()
+    before = _stats["registered"]
+    ensure(trades)
+    _stats["restored"] += _stats["registered"] - before
+    return _stats["registered"] - before
+
+
+def start(scheduler):
+    """Enregistre les clôtures sur le scheduler de l'app et replanifie les trades ouverts."""
+    global _scheduler
+    with _lock:
+        if _scheduler is not None:
+            return
+        _scheduler = scheduler
+    try:
+        restored = restore()
+        log_to_firestore(f"[ExitScheduler] Started, {restored} open trade(s) scheduled", level="INFO")
+    except Exception as e:
+        log_to_firestore(f"[ExitScheduler] Restore failed (le cycle du tracker replanifie): {e}", level="ERROR")
+
+
+def stop():
+    """Retire les jobs de clôture du scheduler partagé (sans l'arrêter)."""
+    global _scheduler
+    with _lock:
+        if _scheduler is not None:
+            for ids in _jobs.values():
+                for job_id in ids:
+                    try:
+                        _scheduler.remove_job(job_id)
+                    except JobLookupError:
+                        pass
+            _scheduler = None
+        _jobs.clear()
+
+
+def get_stats() -> dict:
+    with _lock:
+        ids = {job_id for job_ids in _jobs.values() for job_id in job_ids}
+        jobs = [j for j in _scheduler.get_jobs() if j.id in ids] if _scheduler is not None else []
+        next_run = min((j.next_run_time for j in jobs if j.next_run_time), default=None)
+        return {
+            **_stats,
+            "trades": len(_jobs),
+            "jobs": len(jobs),
+            "next_close": next_run.isoformat() if next_run else None,
+        }
@@ -0,0 +1,219 @@
+# app/services/http_session.py
+"""
+Sessions HTTP partagées par broker (OANDA, Kraken).
+
+- keep-alive : un requests.Session par broker, pool de connexions réutilisées
+  (plus de handshake TCP+TLS à chaque appel)
+- timeouts explicites (connexion, lecture) sur chaque requête : un socket
+  bloqué ne peut plus figer le tracker
+- retries uniquement pour les appels idempotents (GET par défaut, ou
+  idempotent=True), backoff exponentiel avec jitter ; un appel non
+  idempotent (ordre, clôture partielle) n'est rejoué que si la connexion
+  n'a jamais été établie (ConnectTimeout)
+- compteurs par endpoint : appels, erreurs, retries, latence (moyenne, max)
+- plafond de débit global par broker (seau à jetons, RATE_LIMITS) sur les
+  lectures (polling : prix, états, QueryOrders) ; chaque tentative attend un
+  jeton. Les ordres (création, clôture, modification, annulation) n'attendent
+  jamais derrière le polling : ils sont exemptés
+"""
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.25     # secondes
+BACKOFF_MAX = 4.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# (requêtes/s, rafale) des lectures par session broker ; OANDA : 100 req/s par compte, Kraken public : ~1 req/s
+RATE_LIMITS = {"oanda": (20.0, 40), "kraken": (1.0, 5)}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    """Full jitter : uniforme dans [0, base * 2^attempt], borné ; Retry-After respecté si fourni."""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class RateLimiter:
+    """Seau à jetons : `rate` requêtes/s en moyenne, rafales jusqu'à `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.waited_s = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def available(self) -> float:
+        """Jetons disponibles, sans en consommer (travail optionnel : différé s'il n'y en a pas)."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self):
+        """Prend un jeton, en attendant s'il le faut."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if waited:
+                        self.waits += 1
+                        self.waited_s += waited
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {"rate": self.rate, "burst": self.burst, "tokens": round(self._tokens, 2),
+                    "waits": self.waits, "waited_s": round(self.waited_s, 3)}
+
+
+class BrokerSession:
+    def __init__(self, name: str, headers: dict = None, pool_size: int = 10,
+                 connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 rate_limit: tuple = None):
+        self.name = name
+        self.limiter = RateLimiter(*rate_limit) if rate_limit else None
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, endpoint: str = None, idempotent: bool = None,
+                retries: int = MAX_RETRIES, timeout=None, throttle: bool = None, **kwargs) -> requests.Response:
+        """
+        requests.Session.request avec timeout, retries sûrs et mesures. Ne lève pas sur un statut HTTP.
+        throttle : soumis au plafond de débit (défaut : lectures GET/HEAD/OPTIONS ; ordres exemptés).
+        """
+        method = method.upper()
+        endpoint = endpoint or method + " " + url
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if throttle is None:
+            throttle = method in IDEMPOTENT_METHODS
+        limiter = self.limiter if throttle else None
+        kwargs.setdefault("timeout", timeout or self.timeout)
+
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            t0 = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self._record(endpoint, t0, None, e)
+                safe = isinstance(e, requests.exceptions.ConnectTimeout) or (
+                    idempotent and isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                )
+                if not safe or attempt >= retries:
+                    raise
+                self.note_retry(endpoint)
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            self._record(endpoint, t0, response.status_code, None if response.ok else response.status_code)
+            if idempotent and response.status_code in RETRY_STATUSES and attempt < retries:
+                self.note_retry(endpoint)
+                time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    # ---------- mesures ----------
+    def _entry(self, endpoint: str) -> dict:
+        s = self._stats.get(endpoint)
+        if s is None:
+            s = self._stats[endpoint] = {
+                "calls": 0, "errors": 0, "retries": 0,
+                "avg_ms": None, "max_ms": 0.0, "last_ms": None,
+                "last_status": None, "last_error": None,
+            }
+        return s
+
+    def note_retry(self, endpoint: str):
+        """Compte un retry (y compris ceux gérés par l'appelant, ex. Kraken privé)."""
+        with self._lock:
+            self._entry(endpoint)["retries"] += 1
+
+    def _record(self, endpoint: str, t0: float, status, error):
+        elapsed = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            s = self._entry(endpoint)
+            s["calls"] += 1
+            s["last_ms"] = round(elapsed, 1)
+            s["avg_ms"] = round(elapsed if s["avg_ms"] is None else 0.9 * s["avg_ms"] + 0.1 * elapsed, 1)
+            s["max_ms"] = round(max(s["max_ms"], elapsed), 1)
+            s["last_status"] = status
+            if error is not None:
+                s["errors"] += 1
+                s["last_error"] = str(error)[:200]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {k: dict(v) for k, v in self._stats.items()}
+
+
+def get_session(name: str, **kwargs) -> BrokerSession:
+    """Session partagée d'un broker (créée au 1er appel)."""
+    s = _sessions.get(name)
+    if s is None:
+        with _sessions_lock:
+            s = _sessions.get(name)
+            if s is None:
+                kwargs.setdefault("rate_limit", RATE_LIMITS.get(name))
+                s = _sessions[name] = BrokerSession(name, **kwargs)
+    return s
+
+
+def has_headroom(name: str) -> bool:
+    """Un jeton est disponible pour le broker `name` (sans le consommer)."""
+    s = _sessions.get(name)
+    return s is None or s.limiter is None or s.limiter.available() >= 1
+
+
+def get_rate_stats() -> dict:
+    return {name: s.limiter.get_stats() for name, s in list(_sessions.items()) if s.limiter is not None}
+
+
+def get_stats() -> dict:
+    return {name: s.get_stats() for name, s in list(_sessions.items())}
@@ -1,5 +1,6 @@
 # app/services/kraken_service.py
 import os
+import threading
 import time
 import hashlib
 import hmac
@@ -8,6 +9,7 @@ import urllib.parse
 import requests
 from dotenv import load_dotenv
 from app.services.log_service import log_to_firestore
+from app.services.http_session import get_session, backoff_delay, MAX_RETRIES
 
 load_dotenv()
 
@@ -15,6 +17,12 @@ KRAKEN_API_KEY = os.getenv("KRAKEN_API_KEY", "")
 KRAKEN_API_SECRET = os.getenv("KRAKEN_API_SECRET", "")
 KRAKEN_BASE_URL = "https://api.kraken.com"
 
+_http = get_session("kraken")
+
+# Endpoints privés en lecture seule : rejouables (avec un nouveau nonce)
+READ_ONLY_PRIVATE = {"Balance", "QueryOrders", "OpenOrders", "ClosedOrders", "TradesHistory", "OpenPositions"}
+QUERY_ORDERS_MAX = 50  # txids par appel QueryOrders
+
 DECIMALS_BY_PAIR = {
     "XBTUSD": 1,
     "ETHUSD": 2,
@@ -34,8 +42,16 @@ def format_price(price: float, pair: str) -> str:
     return f"{round(price, decimals):.{decimals}f}"
 
 
+_nonce_lock = threading.Lock()
+_last_nonce = 0
+
+
 def _nonce():
-    return str(int(time.time() * 1000))
+    """Nonce strictement croissant, même pour deux appels concurrents dans la même milliseconde."""
+    global _last_nonce
+    with _nonce_lock:
+        _last_nonce = max(_last_nonce + 1, int(time.time() * 1000))
+        return str(_last_nonce)
 
 
 def _sign(urlpath: str, data: dict) -> dict:
@@ -57,9 +73,31 @@ def _private_request(endpoint: str, data: dict = None) -> dict:
     url = KRAKEN_BASE_URL + urlpath
     if data is None:
         data = {}
-    data["nonce"] = _nonce()
-    headers = _sign(urlpath, data)
-    response = requests.post(url, headers=headers, data=urllib.parse.urlencode(data))
+    retry_safe = endpoint in READ_ONLY_PRIVATE
+    attempt = 0
+    while True:
+        # nonce et signature recalculés à chaque tentative (Kraken refuse un nonce rejoué)
+        data["nonce"] = _nonce()
+        headers = _sign(urlpath, data)
+        try:
+            # lectures (QueryOrders...) sous le plafond de débit ; ordres jamais mis en attente
+            response = _http.post(url, endpoint=endpoint, retries=0, headers=headers, throttle=retry_safe,
+                                  data=urllib.parse.urlencode(data))
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            # ordre (AddOrder, EditOrder...) : rejoué seulement si la connexion n'a jamais abouti
+            safe = retry_safe or isinstance(e, requests.exceptions.ConnectTimeout)
+            if not safe or attempt >= MAX_RETRIES:
+                raise
+            _http.note_retry(endpoint)
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+        if retry_safe and response.status_code in (429, 502, 503, 504) and attempt < MAX_RETRIES:
+            _http.note_retry(endpoint)
+            time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+            attempt += 1
+            continue
+        break
     response.raise_for_status()
     result = response.json()
     if result.get("error") and len(result["error"]) > 0:
@@ -70,7 +108,7 @@ def _private_request(endpoint: str, data: dict = None) -> dict:
 def _public_request(endpoint: str, params: dict = None) -> dict:
     """Public GET to Kraken API."""
     url = f"{KRAKEN_BASE_URL}/0/public/{endpoint}"
-    response = requests.get(url, params=params or {})
+    response = _http.get(url, endpoint=endpoint, params=params or {})
     response.raise_for_status()
     result = response.json()
     if result.get("error") and len(result["error"]) > 0:
@@ -96,6 +134,29 @@ def get_latest_price(pair: str) -> float:
     return round((ask + bid) / 2, decimals)
 
 
+_ticker_keys = {}  # pair demandée -> clé interne Kraken dans la réponse Ticker (XBTUSD -> XXBTZUSD)
+
+
+def get_latest_prices(pairs) -> dict:
+    """Mid prices for several pairs in one Ticker call -> {pair: mid}."""
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    unknown = [p for p in pairs if p not in _ticker_keys]
+    if unknown:
+        for key, info in _public_request("AssetPairs", {"pair": ",".join(unknown)}).items():
+            _ticker_keys[info.get("altname", key)] = key
+    result = _public_request("Ticker", {"pair": ",".join(pairs)})
+    prices = {}
+    for pair in pairs:
+        ticker = result.get(_ticker_keys.get(pair, pair)) or result.get(pair)
+        if ticker is None:
+            continue
+        mid = (float(ticker["a"][0]) + float(ticker["b"][0])) / 2
+        prices[pair] = round(mid, DECIMALS_BY_PAIR.get(pair, 2))
+    return prices
+
+
 def create_order(pair: str, sl_price: float, tp_price: float, volume: float, side: str, validate: bool = False) -> dict:
     """
     Create a market order with SL as conditional close.
@@ -121,18 +182,8 @@ def create_order(pair: str, sl_price: float, tp_price: float, volume: float, sid
     # Place TP as separate limit order (opposite side)
     tp_txid = None
     if main_txid and not validate:
-        tp_side = "sell" if side.lower() == "buy" else "buy"
-        tp_data = {
-            "pair": pair,
-            "type": tp_side,
-            "ordertype": "take-profit",
-            "price": format_price(tp_price, pair),
-            "volume": str(abs(volume)),
-        }
         try:
-            tp_result = _private_request("AddOrder", tp_data)
-            tp_txid_list = tp_result.get("txid", [])
-            tp_txid = tp_txid_list[0] if tp_txid_list else None
+            tp_txid = add_take_profit(pair, side, tp_price, volume)
         except Exception as e:
             log_to_firestore(f"Kraken TP order failed: {e}", level="ERROR")
 
@@ -143,6 +194,22 @@ def create_order(pair: str, sl_price: float, tp_price: float, volume: float, sid
     }
 
 
+def add_take_profit(pair: str, side: str, tp_price: float, volume: float) -> str:
+    """
+    Take-profit order closing `volume` of a position (full TP or one rung of a ladder).
+    side = original trade side ("buy" or "sell"). Returns the txid.
+    """
+    tp_data = {
+        "pair": pair,
+        "type": "sell" if side.lower() == "buy" else "buy",
+        "ordertype": "take-profit",
+        "price": format_price(tp_price, pair),
+        "volume": str(abs(volume)),
+    }
+    tp_txid_list = _private_request("AddOrder", tp_data).get("txid", [])
+    return tp_txid_list[0] if tp_txid_list else None
+
+
 def cancel_order(txid: str) -> dict:
     """Cancel an open order by txid."""
     return _private_request("CancelOrder", {"txid": txid})
@@ -184,10 +251,7 @@ def modify_trade_sl(txid: str, new_sl: float, pair: str) -> dict:
         raise
 
 
-def get_order_status(txid: str) -> dict:
-    """Query order info by txid."""
-    result = _private_request("QueryOrders", {"txid": txid})
-    order = result.get(txid, {})
+def _order_status(txid: str, order: dict) -> dict:
     return {
         "txid": txid,
         "status": order.get("status", "unknown"),
@@ -201,9 +265,26 @@ def get_order_status(txid: str) -> dict:
     }
 
 
-def get_trade_details(txid: str) -> dict:
-    """Get trade/order details, mapping to a format compatible with the trade tracker."""
-    order = get_order_status(txid)
+def get_order_status(txid: str) -> dict:
+    """Query order info by txid."""
+    result = _private_request("QueryOrders", {"txid": txid})
+    return _order_status(txid, result.get(txid, {}))
+
+
+def get_orders_status(txids) -> dict:
+    """Query several orders at once (QueryOrders accepts up to 50 comma-separated txids)."""
+    txids = list(dict.fromkeys(str(t) for t in txids))
+    statuses = {}
+    for start in range(0, len(txids), QUERY_ORDERS_MAX):
+        chunk = txids[start:start + QUERY_ORDERS_MAX]
+        result = _private_request("QueryOrders", {"txid": ",".join(chunk)})
+        for txid in chunk:
+            statuses[txid] = _order_status(txid, result.get(txid, {}))
+    return statuses
+
+
+def _trade_details(order: dict) -> dict:
+    """Map a Kraken order to the trade-details format used by the trade tracker."""
     status = order.get("status", "unknown")
 
     # Map Kraken statuses to our expected format
@@ -217,7 +298,7 @@ def get_trade_details(txid: str) -> dict:
     vol_exec = order.get("vol_exec", "0")
 
     return {
-        "id": txid,
+        "id": order["txid"],
         "state": state,
         "realizedPL": "0",  # Kraken doesn't provide PnL directly — computed externally
         "unrealizedPL": "0",
@@ -227,3 +308,13 @@ def get_trade_details(txid: str) -> dict:
         "sl_filled": False,
         "tp_filled": False,
     }
+
+
+def get_trade_details(txid: str) -> dict:
+    """Get trade/order details, mapping to a format compatible with the trade tracker."""
+    return _trade_details(get_order_status(txid))
+
+
+def get_trades_details(txids) -> dict:
+    """Trade details for several txids with a single QueryOrders call -> {txid: details}."""
+    return {txid: _trade_details(order) for txid, order in get_orders_status(txids).items()}
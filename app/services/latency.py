@@ -0,0 +1,108 @@
+# app/services/latency.py
+"""
+Latence de bout en bout d'un signal : clôture de la bougie Polygon → fill broker.
+
+Chaque exécution de stratégie sur une bougie ouvre une trace qui horodate
+(epoch ms) les étapes du pipeline :
+
+    bar_close → ws_recv → strategy_start → decision → price_fetched
+              → order_sent → order_filled → trade_written
+
+La trace est stockée sur le document du trade (`latency`) et alimente des
+fenêtres glissantes par stratégie et par étape (ms depuis la clôture de la
+bougie) exposées en p50/p95/p99 par /api/latency.
+"""
+import math
+import threading
+import time
+from collections import deque
+from app.services.batch_writer import candle_writer
+
+STAGES = (
+    "bar_close", "ws_recv", "strategy_start", "decision",
+    "price_fetched", "order_sent", "order_filled", "trade_written",
+)
+WINDOW = 1000  # dernières mesures conservées par (stratégie, étape)
+
+_samples = {}   # strategy -> stage -> deque[ms depuis bar_close]
+_counts = {}    # strategy -> nombre de traces terminées
+_lock = threading.Lock()
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class LatencyTrace:
+    __slots__ = ("strategy", "marks")
+
+    def __init__(self, strategy: str, candle):
+        self.strategy = strategy
+        self.marks = {"bar_close": candle.e}
+        if getattr(candle, "recv_ms", None) is not None:
+            self.marks["ws_recv"] = candle.recv_ms
+        self.marks["strategy_start"] = _now_ms()
+
+    def mark(self, stage: str):
+        self.marks[stage] = _now_ms()
+
+    def to_doc(self) -> dict:
+        """Champ `latency` du trade : horodatages bruts + délais depuis la clôture."""
+        t0 = self.marks["bar_close"]
+        return {
+            "stages": dict(self.marks),
+            "since_bar_close_ms": {k: v - t0 for k, v in self.marks.items() if k != "bar_close"},
+        }
+
+    def finish(self, trade_ref=None):
+        """Enregistre la trace dans les histogrammes (et sur le trade s'il y en a un)."""
+        if trade_ref is not None:
+            self.marks.setdefault("trade_written", _now_ms())  # marqué par la stratégie dès l'écriture
+            # merge asynchrone : pas de 2e aller-retour Firestore dans la stratégie
+            collection, doc_id = trade_ref.path.rsplit("/", 1)
+            candle_writer.enqueue(collection, doc_id, {"latency": self.to_doc()}, merge=True)
+        _record(self.strategy, self.marks)
+
+
+def start_trace(strategy: str, candle) -> LatencyTrace:
+    return LatencyTrace(strategy, candle)
+
+
+def _record(strategy: str, marks: dict):
+    t0 = marks["bar_close"]
+    with _lock:
+        per_stage = _samples.setdefault(strategy, {})
+        for stage, ts in marks.items():
+            if stage != "bar_close":
+                per_stage.setdefault(stage, deque(maxlen=WINDOW)).append(ts - t0)
+        _counts[strategy] = _counts.get(strategy, 0) + 1
+
+
+def _percentile(sorted_values: list, pct: float):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))  # nearest-rank
+    return sorted_values[k]
+
+
+def get_stats() -> dict:
+    """{strategy: {"traces": n, "stages": {stage: {count, p50, p95, p99, max}}}} en ms depuis bar_close."""
+    with _lock:
+        snapshot = {s: {st: list(d) for st, d in stages.items()} for s, stages in _samples.items()}
+        counts = dict(_counts)
+    out = {}
+    for strategy, stages in snapshot.items():
+        rows = {}
+        for stage in STAGES:
+            values = sorted(stages.get(stage, ()))
+            if not values:
+                continue
+            rows[stage] = {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+                "max": values[-1],
+            }
+        out[strategy] = {"traces": counts.get(strategy, 0), "stages": rows}
+    return out
@@ -0,0 +1,212 @@
+# app/services/log_index.py
+"""
+Index local (SQLite + FTS5) des execution_logs.
+
+Alimenté par le writer des logs après chaque batch commité dans Firestore :
+niveau, tag, timestamp, trade id et tokens du message sont indexés, et
+/api/logs répond depuis l'index avec une pagination par curseur au lieu de
+rapatrier 1000 documents pour filtrer en Python. Le registre des tags est
+tenu à jour à l'insertion.
+
+Au démarrage, l'index est complété depuis Firestore (entrées plus récentes
+que la dernière indexée). Tant qu'il n'est pas prêt, les endpoints gardent
+le chemin Firestore.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from app.services.firebase import get_firestore
+
+LOG_INDEX_PATH = os.getenv("LOG_INDEX_PATH", os.path.join(tempfile.gettempdir(), "execution_logs_index.db"))
+MAX_ROWS = 200_000      # rétention locale ; Firestore reste la source de vérité
+PRUNE_EVERY = 1_000     # inserts entre deux purges
+WARM_LIMIT = 5_000      # docs Firestore rechargés au démarrage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    level TEXT,
+    tag TEXT COLLATE NOCASE,
+    trade_id TEXT,
+    message TEXT,
+    doc TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS logs_dedup ON logs (ts, message);
+CREATE INDEX IF NOT EXISTS logs_ts ON logs (ts, id);
+CREATE INDEX IF NOT EXISTS logs_level_ts ON logs (level, ts, id);
+CREATE INDEX IF NOT EXISTS logs_tag_ts ON logs (tag, ts, id);
+CREATE INDEX IF NOT EXISTS logs_trade ON logs (trade_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5 (message, level, ts);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT PRIMARY KEY COLLATE NOCASE,
+    count INTEGER NOT NULL,
+    last_seen TEXT
+);
+"""
+
+_conn = None
+_lock = threading.Lock()
+_ready = False
+_since_prune = 0
+
+
+def _connect(path: str = None) -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(path or LOG_INDEX_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(_SCHEMA)
+    return _conn
+
+
+def _trade_id(entry: dict):
+    tid = entry.get("trade_id") or entry.get("oanda_trade_id")
+    return str(tid) if tid is not None else None
+
+
+def add_entries(entries: list):
+    """Indexe des entrées execution_logs (dicts au format Firestore)."""
+    global _since_prune
+    rows = [e for e in entries if isinstance(e, dict) and e.get("timestamp")]
+    if not rows:
+        return
+    with _lock:
+        conn = _connect()
+        with conn:
+            for e in rows:
+                # OR IGNORE : une entrée vue à la fois par le writer et par le warm n'est indexée qu'une fois
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO logs (ts, level, tag, trade_id, message, doc) VALUES (?, ?, ?, ?, ?, ?)",
+                    (e["timestamp"], e.get("level"), e.get("tag"), _trade_id(e), e.get("message", ""),
+                     json.dumps(e, default=str)),
+                )
+                if not cur.rowcount:
+                    continue
+                conn.execute(
+                    "INSERT INTO logs_fts (rowid, message, level, ts) VALUES (?, ?, ?, ?)",
+                    # "T" remplacé pour que date et heure soient des tokens séparés (recherche "14:03")
+                    (cur.lastrowid, e.get("message", ""), e.get("level") or "", e["timestamp"].replace("T", " ")),
+                )
+                if e.get("tag"):
+                    conn.execute(
+                        "INSERT INTO tags (tag, count, last_seen) VALUES (?, 1, ?) "
+                        "ON CONFLICT(tag) DO UPDATE SET count = count + 1, last_seen = MAX(last_seen, excluded.last_seen)",
+                        (e["tag"], e["timestamp"]),
+                    )
+        _since_prune += len(rows)
+        if _since_prune >= PRUNE_EVERY:
+            _since_prune = 0
+            _prune(conn)
+
+
+def _prune(conn):
+    with conn:
+        cutoff = conn.execute("SELECT id FROM logs ORDER BY id DESC LIMIT 1 OFFSET ?", (MAX_ROWS,)).fetchone()
+        if cutoff:
+            conn.execute("DELETE FROM logs WHERE id <= ?", cutoff)
+            conn.execute("DELETE FROM logs_fts WHERE rowid <= ?", cutoff)
+
+
+def index_writes(writes):
+    """Callback `on_commit` du BatchWriter des logs."""
+    add_entries([data for collection, _doc_id, data, _merge in writes if collection == "execution_logs"])
+
+
+def _fts_query(text: str) -> str:
+    # chaque mot-clé doit apparaître (préfixe de token) dans message, niveau ou timestamp
+    return " AND ".join('"' + kw.replace('"', '""') + '"*' for kw in text.split())
+
+
+def encode_cursor(ts: str, row_id: int) -> str:
+    return f"{ts}|{row_id}"
+
+
+def _decode_cursor(cursor: str):
+    ts, _, row_id = cursor.rpartition("|")
+    return ts, int(row_id)
+
+
+def query(limit: int = 50, level: str = None, contains: str = None, tag: str = None,
+          trade_id: str = None, date: str = None, cursor: str = None):
+    """Entrées les plus récentes d'abord. Retourne (entrées, curseur suivant ou None)."""
+    where, params = [], []
+    if level:
+        where.append("l.level = ?")
+        params.append(level.upper())
+    if tag:
+        where.append("l.tag = ?")
+        params.append(tag)
+    if date:
+        where.append("l.ts >= ? AND l.ts <= ?")
+        params += [date, date + "T23:59:59\uffff"]
+    if trade_id:
+        where.append("(l.trade_id = ? OR l.id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?))")
+        params += [trade_id, 'message:"' + trade_id.replace('"', '""') + '"']
+    if contains and contains.split():
+        where.append("l.id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)")
+        params.append(_fts_query(contains.lower()))
+    if cursor:
+        ts, row_id = _decode_cursor(cursor)
+        where.append("(l.ts < ? OR (l.ts = ? AND l.id < ?))")
+        params += [ts, ts, row_id]
+
+    sql = "SELECT l.id, l.ts, l.doc FROM logs l"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY l.ts DESC, l.id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    with _lock:
+        rows = _connect().execute(sql, params).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if more and rows else None
+    return [json.loads(doc) for _id, _ts, doc in rows], next_cursor
+
+
+def get_tags() -> list:
+    with _lock:
+        return [t for (t,) in _connect().execute("SELECT tag FROM tags ORDER BY tag COLLATE NOCASE")]
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def _last_ts():
+    with _lock:
+        row = _connect().execute("SELECT MAX(ts) FROM logs").fetchone()
+    return row[0] if row else None
+
+
+def warm(last_ts=None):
+    """Complète l'index avec les logs Firestore plus récents que `last_ts` (dernière entrée indexée)."""
+    global _ready
+    db = get_firestore()
+    q = db.collection("execution_logs")
+    if last_ts:
+        q = q.where("timestamp", ">", last_ts)
+    docs = q.order_by("timestamp", direction="DESCENDING").limit(WARM_LIMIT).stream()
+    entries = [d.to_dict() for d in docs]
+    entries.reverse()
+    add_entries(entries)
+    _ready = True
+    return len(entries)
+
+
+def start():
+    """Chargement initial en arrière-plan (appelé au startup FastAPI)."""
+    # borne lue avant que le writer des logs n'indexe les entrées de ce process
+    last_ts = _last_ts()
+
+    def _run():
+        try:
+            n = warm(last_ts)
+            print(f"[LogIndex] Index pret ({n} entree(s) chargee(s) depuis Firestore)")
+        except Exception as e:
+            print(f"[LogIndex] Chargement initial echoue, endpoints sur Firestore: {e}")
+    threading.Thread(target=_run, name="log-index-warm", daemon=True).start()
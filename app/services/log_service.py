@@ -1,8 +1,11 @@
-from app.services.firebase import get_firestore
+from app.services.batch_writer import BatchWriter
+from app.services import log_index
 from datetime import datetime
 import re
 import requests
 import os
+import threading
+import time
 
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")  # à stocker dans Render en variable d'env
 
@@ -45,28 +48,128 @@ def _extract_tag(message: str) -> str | None:
     return tag
 
 
+# ---------- écriture asynchrone des execution_logs ----------
+# Un log ne coûte qu'un put dans une queue : le writer de fond commit par WriteBatch.
+# Chaque batch commité alimente l'index local des logs (/api/logs).
+log_writer = BatchWriter("execution_logs", max_queue=10_000, flush_interval=2.0, drop_when_full=True,
+                         on_commit=log_index.index_writes)
+
+# Débit max par niveau (entrées / minute). Les niveaux absents ne sont pas limités.
+LEVEL_RATE_LIMITS = {
+    "NO_TRADING": 30,
+    "INFO": 300,
+}
+# Même message répété pour un même tag : écrit une fois par fenêtre, avec le nombre de répétitions.
+# Les répétitions en attente sont reportées à la fenêtre suivante, ou par le balayage périodique
+# (REPEAT_SWEEP_S) quand le message ne revient pas, et au flush de l'arrêt.
+REPEAT_WINDOW_S = 300
+REPEAT_SWEEP_S = 30
+NEVER_SUPPRESSED = {"TRADING", "ERROR"}  # ni limités en débit, ni filtrés par répétition
+
+MAX_TRACKED_REPEATS = 2000
+
+_state_lock = threading.Lock()
+_rate = {}      # level -> [début fenêtre (monotonic), nb écrit]
+_repeats = {}   # (tag, message) -> [premier envoi (monotonic), répétitions supprimées, niveau]
+_last_sweep = 0.0
+_log_stats = {"enqueued": 0, "rate_limited": 0, "repeats_suppressed": 0}
+
+
+def _rate_ok(level: str, now: float) -> bool:
+    limit = LEVEL_RATE_LIMITS.get(level)
+    if limit is None:
+        return True
+    w = _rate.get(level)
+    if w is None or now - w[0] >= 60:
+        _rate[level] = [now, 1]
+        return True
+    if w[1] >= limit:
+        return False
+    w[1] += 1
+    return True
+
+
+def _admit(message: str, level: str, tag: str | None, now: float):
+    """None si le log est filtré, sinon le nombre de répétitions supprimées à reporter."""
+    with _state_lock:
+        repeated = 0
+        if tag and level not in NEVER_SUPPRESSED:
+            key = (tag, message)
+            seen = _repeats.get(key)
+            if seen and now - seen[0] < REPEAT_WINDOW_S:
+                seen[1] += 1
+                _log_stats["repeats_suppressed"] += 1
+                return None
+            if seen:
+                repeated = seen[1]
+            if len(_repeats) >= MAX_TRACKED_REPEATS:
+                for k in [k for k, v in _repeats.items() if now - v[0] >= REPEAT_WINDOW_S]:
+                    del _repeats[k]
+                if len(_repeats) >= MAX_TRACKED_REPEATS:
+                    _repeats.clear()
+            _repeats[key] = [now, 0, level]
+        if level not in NEVER_SUPPRESSED and not _rate_ok(level, now):
+            _log_stats["rate_limited"] += 1
+            return None
+        return repeated
+
+
+def _sweep_repeats(now: float, force: bool = False):
+    """Reporte les répétitions dont la fenêtre est close (toutes si `force`) : une rafale qui s'arrête est comptée."""
+    global _last_sweep
+    with _state_lock:
+        if not force and now - _last_sweep < REPEAT_SWEEP_S:
+            return
+        _last_sweep = now
+        due = [(k, v) for k, v in _repeats.items() if v[1] and (force or now - v[0] >= REPEAT_WINDOW_S)]
+        for k, _ in due:
+            del _repeats[k]
+    for (tag, message), (_, repeated, level) in due:
+        _enqueue(message, level, tag, repeated)
+
+
+def _enqueue(message: str, level: str, tag: str | None, repeated: int, extra_data=None):
+    log_entry = {
+        "message": message,
+        "level": level,
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+    if tag:
+        log_entry["tag"] = tag
+    if repeated:
+        log_entry["repeated"] = repeated
+    if extra_data:
+        log_entry.update(extra_data)
+    log_writer.enqueue("execution_logs", None, log_entry)
+    _log_stats["enqueued"] += 1
+
+
 def log_to_firestore(message: str, level="INFO", extra_data=None):
     # Slack uniquement si c'est un ordre de trading
     # log_to_slack(message, level)
 
     try:
-        db = get_firestore()
-        log_entry = {
-            "message": message,
-            "level": level,
-            "timestamp": datetime.utcnow().isoformat(),
-        }
         tag = _extract_tag(message)
-        if tag:
-            log_entry["tag"] = tag
-        if extra_data:
-            log_entry.update(extra_data)
-        db.collection("execution_logs").add(log_entry)
+        now = time.monotonic()
+        repeated = _admit(message, level, tag, now)
+        if repeated is not None:
+            _enqueue(message, level, tag, repeated, extra_data)
+        _sweep_repeats(now)
     except Exception as e:
-        # Si Firestore échoue, on logue l'erreur sur Slack
+        # Si la mise en queue échoue, on logue l'erreur sur Slack
         log_to_slack(f"Firestore logging failed: {e}", level="ERROR")
 
 
+def flush_logs(timeout: float = 10.0):
+    """Vide la queue des logs (shutdown, scripts), répétitions en attente comprises."""
+    _sweep_repeats(time.monotonic(), force=True)
+    log_writer.stop(timeout)
+
+
+def get_log_stats() -> dict:
+    return {**_log_stats, "writer": log_writer.get_stats()}
+
+
 def log_trade_event(trade_ref, event_type: str, message: str, data: dict = None):
     """Log an event to a trade's events subcollection."""
     try:
@@ -35,7 +35,7 @@ CURRENCY_INSTRUMENTS = {
 # In-memory state for each group being tracked
 _event_state = {}
 
-# Scheduler instance
+# Scheduler instance (shared with exit_scheduler)
 _scheduler = None
 
 
@@ -387,20 +387,34 @@ def load_and_schedule_today():
     )
 
 
-def start():
-    """Start the news trading scheduler."""
+def get_scheduler() -> BackgroundScheduler:
+    """The app's APScheduler instance, created and started on first use."""
     global _scheduler
+    if _scheduler is None:
+        _scheduler = BackgroundScheduler(timezone="UTC")
+        _scheduler.start()
+    return _scheduler
 
-    _scheduler = BackgroundScheduler(timezone="UTC")
+
+def start():
+    """Start the news trading scheduler."""
+    scheduler = get_scheduler()
 
     # Load today's events immediately
     load_and_schedule_today()
 
     # Refresh daily at 00:05 UTC
-    _scheduler.add_job(
+    scheduler.add_job(
         load_and_schedule_today, "cron",
         hour=0, minute=5, id="daily_refresh", replace_existing=True,
     )
 
-    _scheduler.start()
     log_to_firestore("[NewsScheduler] Background scheduler started", level="INFO")
+
+
+def stop():
+    """Shut down the shared scheduler (news and exit jobs)."""
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
@@ -1,7 +1,8 @@
 import os
-import requests
 from dotenv import load_dotenv
 from app.services.log_service import log_to_firestore
+from app.services.http_session import get_session
+from app.services import price_stream
 
 # 📦 Chargement des variables d'environnement
 load_dotenv()
@@ -15,6 +16,10 @@ headers = {
     "Content-Type": "application/json"
 }
 
+# Session keep-alive partagée (timeouts, retries idempotents, mesures par endpoint)
+_http = get_session("oanda", headers=headers)
+price_stream.configure(OANDA_API_URL, OANDA_ACCOUNT_ID, headers)
+
 # 🎯 Précision maximale par instrument
 DECIMALS_BY_INSTRUMENT = {
     "SPX500_USD": 1,
@@ -32,6 +37,20 @@ DECIMALS_BY_INSTRUMENT = {
     "USD_CAD": 5,
 }
 
+# Précision des units par instrument : CFDs au dixième, forex en units entières (défaut)
+UNITS_DECIMALS_BY_INSTRUMENT = {
+    "SPX500_USD": 1,
+    "NAS100_USD": 1,
+    "US30_USD": 1,
+    "DE30_EUR": 1,
+    "UK100_GBP": 1,
+    "FR40_EUR": 1,
+}
+
+def format_units(units, instrument: str) -> str:
+    decimals = UNITS_DECIMALS_BY_INSTRUMENT.get(instrument, 0)
+    return f"{round(float(units), decimals):.{decimals}f}"
+
 def format_price(price: float, instrument: str) -> str:
     decimals = DECIMALS_BY_INSTRUMENT.get(instrument, 2)
     return f"{round(price, decimals):.{decimals}f}"
@@ -39,21 +58,36 @@ def format_price(price: float, instrument: str) -> str:
 # ✅ Obtenir le solde du compte
 def get_account_balance():
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/summary"
-    response = requests.get(url, headers=headers)
+    response = _http.get(url, endpoint="account_summary")
     response.raise_for_status()
     return float(response.json()["account"]["balance"])
 
+# ✅ Etat complet du compte (trades, ordres, positions) + lastTransactionID
+def get_account():
+    url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}"
+    response = _http.get(url, endpoint="account")
+    response.raise_for_status()
+    return response.json()
+
+# ✅ Changements du compte depuis une transaction (trades/ordres/positions + état calculé)
+def get_account_changes(since_transaction_id: str):
+    url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/changes"
+    params = {"sinceTransactionID": since_transaction_id}
+    response = _http.get(url, endpoint="account_changes", params=params)
+    response.raise_for_status()
+    return response.json()
+
 # ✅ Obtenir les trades ouverts
 def get_open_trades():
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/openTrades"
-    response = requests.get(url, headers=headers)
+    response = _http.get(url, endpoint="open_trades")
     response.raise_for_status()
     return response.json().get("trades", [])
 
 # ✅ Obtenir les positions ouvertes
 def get_open_positions():
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/openPositions"
-    response = requests.get(url, headers=headers)
+    response = _http.get(url, endpoint="open_positions")
     response.raise_for_status()
     return response.json()["positions"]
 
@@ -79,7 +113,7 @@ def create_order(instrument, entry_price, stop_loss_price, take_profit_price, un
     }
 
     log_to_firestore(f"📈 Création d'ordre OANDA DATA : {data, url}", level="OANDA")
-    response = requests.post(url, headers=headers, json=data)
+    response = _http.post(url, endpoint="create_order", json=data)
     if not response.ok:
         log_to_firestore(f"❌ Erreur OANDA : {response.status_code} — {response.text}", level="ERROR")
     response.raise_for_status()
@@ -92,39 +126,99 @@ def close_order(instrument: str):
         "longUnits": "ALL",
         "shortUnits": "ALL"
     }
-    response = requests.put(url, headers=headers, json=data)
+    response = _http.put(url, endpoint="close_position", json=data)
+    response.raise_for_status()
+    return response.json()
+
+# ✅ Ordre LIMIT de clôture partielle (palier de take-profit posé chez le broker)
+def create_reduce_only_limit(instrument: str, units, price: float) -> str:
+    """units signées dans le sens de la clôture (négatives pour un LONG). Retourne l'id de l'ordre."""
+    url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/orders"
+    units_str = format_units(units, instrument)
+    if float(units_str) == 0:
+        raise ValueError(f"units too small: {units}")
+    data = {
+        "order": {
+            "units": units_str,
+            "instrument": instrument,
+            "price": format_price(price, instrument),
+            "timeInForce": "GTC",
+            "type": "LIMIT",
+            "positionFill": "REDUCE_ONLY",
+            "triggerCondition": "DEFAULT",
+        }
+    }
+    response = _http.post(url, endpoint="create_order", json=data)
+    if not response.ok:
+        log_to_firestore(f"❌ Erreur OANDA ordre limite : {response.status_code} — {response.text}", level="ERROR")
+    response.raise_for_status()
+    return response.json()["orderCreateTransaction"]["id"]
+
+# ✅ Annuler un ordre en attente
+def cancel_order(order_id: str):
+    url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/orders/{order_id}/cancel"
+    response = _http.put(url, endpoint="cancel_order", idempotent=True)
     response.raise_for_status()
     return response.json()
 
 # ✅ Obtenir le dernier prix moyen (bid + ask) / 2
 def get_latest_price(instrument: str) -> float:
+    # Carnet du flux de pricing d'abord ; REST seulement si le flux est périmé
+    quote = price_stream.get_quote(instrument)
+    if quote is None:
+        price_stream.subscribe([instrument])
+        return _get_latest_price_rest(instrument)
+    decimals = DECIMALS_BY_INSTRUMENT.get(instrument, 5)
+    return round((quote[0] + quote[1]) / 2, decimals)
+
+def _get_latest_price_rest(instrument: str) -> float:
+    prices = _get_latest_prices_rest([instrument])
+    if instrument not in prices:
+        raise Exception(f"❌ Aucun prix retourné pour {instrument}")
+    return prices[instrument]
+
+def _get_latest_prices_rest(instruments) -> dict:
+    """Un seul appel /pricing pour plusieurs instruments -> {instrument: mid}."""
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/pricing"
-    params = {"instruments": instrument}
-    response = requests.get(url, headers=headers, params=params)
+    params = {"instruments": ",".join(instruments)}
+    response = _http.get(url, endpoint="pricing", params=params)
 
     if response.status_code == 401:
         raise Exception("❌ Unauthorized. Vérifie ton API Token et compte.")
 
     response.raise_for_status()
-    data = response.json()
-    prices = data.get("prices", [])
-    if not prices:
-        raise Exception(f"❌ Aucun prix retourné pour {instrument}")
+    prices = {}
+    for price in response.json().get("prices", []):
+        try:
+            bid = float(price["bids"][0]["price"])
+            ask = float(price["asks"][0]["price"])
+        except (KeyError, IndexError, ValueError) as e:
+            log_to_firestore(f"⚠️ Extraction bid/ask échouée pour {price.get('instrument')} : {e}", level="ERROR")
+            continue
+        instrument = price["instrument"]
+        decimals = DECIMALS_BY_INSTRUMENT.get(instrument, 5)
+        prices[instrument] = round((bid + ask) / 2, decimals)
+    return prices
 
-    price = prices[0]
-    try:
-        bid = float(price["bids"][0]["price"])
-        ask = float(price["asks"][0]["price"])
-    except (KeyError, IndexError, ValueError) as e:
-        raise Exception(f"⚠️ Extraction bid/ask échouée : {e}")
-
-    decimals = DECIMALS_BY_INSTRUMENT.get(instrument, 5)
-    return round((bid + ask) / 2, decimals)
+# ✅ Prix moyens de plusieurs instruments (carnet du flux, puis un seul appel REST pour le reste)
+def get_latest_prices(instruments) -> dict:
+    prices, missing = {}, []
+    for instrument in sorted(set(instruments)):
+        quote = price_stream.get_quote(instrument)
+        if quote is None:
+            missing.append(instrument)
+        else:
+            decimals = DECIMALS_BY_INSTRUMENT.get(instrument, 5)
+            prices[instrument] = round((quote[0] + quote[1]) / 2, decimals)
+    if missing:
+        price_stream.subscribe(missing)
+        prices.update(_get_latest_prices_rest(missing))
+    return prices
 
 # ✅ Lister tous les instruments disponibles sur le compte
 def list_instruments():
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/instruments"
-    response = requests.get(url, headers=headers)
+    response = _http.get(url, endpoint="instruments")
     response.raise_for_status()
     raw = response.json()["instruments"]
 
@@ -140,10 +234,11 @@ def list_instruments():
 
 def close_trade(trade_id: str, units=None):
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/trades/{trade_id}/close"
-    kwargs = {"headers": headers}
+    kwargs = {}
     if units is not None:
         kwargs["json"] = {"units": str(round(abs(float(units)), 4))}
-    response = requests.put(url, **kwargs)
+    # clôture (partielle) non idempotente : jamais rejouée après envoi
+    response = _http.put(url, endpoint="close_trade", **kwargs)
     if not response.ok:
         log_to_firestore(
             f"Erreur OANDA close trade {trade_id}: {response.status_code} — {response.text}",
@@ -156,7 +251,8 @@ def close_trade(trade_id: str, units=None):
 def modify_trade_sl(trade_id: str, new_sl_price: float, instrument: str):
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/trades/{trade_id}/orders"
     data = {"stopLoss": {"price": format_price(new_sl_price, instrument)}}
-    response = requests.put(url, headers=headers, json=data)
+    # remplacer le SL par la même valeur est sans effet : rejouable
+    response = _http.put(url, endpoint="trade_orders", idempotent=True, json=data)
     if not response.ok:
         log_to_firestore(
             f"❌ Erreur OANDA modify SL trade {trade_id}: {response.status_code} — {response.text}",
@@ -168,7 +264,7 @@ def modify_trade_sl(trade_id: str, new_sl_price: float, instrument: str):
 
 def get_trade_details(trade_id: str):
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/trades/{trade_id}"
-    response = requests.get(url, headers=headers)
+    response = _http.get(url, endpoint="trade_details")
     response.raise_for_status()
     trade = response.json()["trade"]
     sl_order = trade.get("stopLossOrder", {})
@@ -189,7 +285,7 @@ def get_trade_details(trade_id: str):
 def get_closed_trades(count: int = 500):
     url = f"{OANDA_API_URL}/accounts/{OANDA_ACCOUNT_ID}/trades"
     params = {"state": "CLOSED", "count": count}
-    response = requests.get(url, headers=headers, params=params)
+    response = _http.get(url, endpoint="closed_trades", params=params)
     response.raise_for_status()
     return response.json().get("trades", [])
 
@@ -201,7 +297,7 @@ def get_candles(instrument: str, from_time: str, to_time: str, granularity: str
         "to": to_time,
         "price": "M",
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = _http.get(url, endpoint="candles", params=params, timeout=(3.05, 20))
     response.raise_for_status()
     raw = response.json().get("candles", [])
     return [
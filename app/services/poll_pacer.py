@@ -0,0 +1,106 @@
+# app/services/poll_pacer.py
+"""
+Prochain contrôle au prix d'un trade, selon la distance à son seuil le plus
+proche (palier / breakeven / trailing du plan de sortie, SL, TP) exprimée en
+volatilité récente de l'instrument.
+
+Volatilité : variance par seconde des variations de prix, moyenne exponentielle
+sur les prix relevés par le tracker (demi-vie VOL_HALF_LIFE_S) ; à défaut,
+ATR 1m des bougies en mémoire (indices suivis par polygon).
+
+Délai : temps pour qu'un mouvement de SIGMAS écarts-types atteigne le seuil,
+    delay = distance² / (SIGMAS² * variance_par_seconde)
+borné à [MIN_DELAY_S, MAX_DELAY_S] : sous la seconde au contact d'un seuil,
+quelques minutes quand tout est loin.
+"""
+import math
+import threading
+import time
+from app.services import bar_store, tick_manager
+from app.services.session_calendar import calendar
+
+MIN_DELAY_S = 0.5
+MAX_DELAY_S = 300.0
+SIGMAS = 3.0            # marge : contrôle avant qu'un mouvement à 3 sigma puisse franchir le seuil
+VOL_HALF_LIFE_S = 600   # demi-vie de la moyenne de variance
+
+_vol = {}               # (broker, instrument) -> [dernier temps, dernier prix, variance/s ou None]
+_lock = threading.Lock()
+
+
+def observe(broker: str, instrument: str, price: float, now: float = None):
+    """Prix relevé : met à jour la variance par seconde de l'instrument."""
+    now = time.monotonic() if now is None else now
+    key = (broker, instrument)
+    with _lock:
+        prev = _vol.get(key)
+        if prev is None:
+            _vol[key] = [now, price, None]
+            return
+        dt = now - prev[0]
+        if dt <= 0:
+            return
+        rate = (price - prev[1]) ** 2 / dt
+        weight = 1 - 0.5 ** (dt / VOL_HALF_LIFE_S)
+        var = rate if prev[2] is None else prev[2] + weight * (rate - prev[2])
+        _vol[key] = [now, price, var]
+
+
+def variance_rate(broker: str, instrument: str):
+    """Variance des variations de prix par seconde, ou None si inconnue."""
+    with _lock:
+        state = _vol.get((broker, instrument))
+    if state and state[2]:
+        return state[2]
+    sym = calendar.symbol_for_instrument(instrument)
+    if sym:
+        atr = bar_store.atr(sym, int(time.time() * 1000))
+        if atr:
+            return atr ** 2 / 60  # ATR 1m ~ un écart-type sur 60 s
+    return None
+
+
+def levels(trade_data: dict, broker: str) -> list:
+    """Seuils surveillés du trade : prochaine règle du plan de sortie, SL, TP."""
+    found = []
+    trig = tick_manager.next_trigger(trade_data, broker)
+    if trig is not None:
+        found.append(trig[1])
+    for field in ("sl", "tp"):
+        try:
+            if trade_data.get(field) is not None:
+                found.append(float(trade_data[field]))
+        except (TypeError, ValueError):
+            continue
+    return found
+
+
+def distance(trade_data: dict, broker: str, price: float):
+    """Distance de prix au seuil le plus proche (0 si déjà franchi), ou None sans seuil."""
+    found = levels(trade_data, broker)
+    if not found:
+        return None
+    return min(abs(price - level) for level in found)
+
+
+def delay(trade_data: dict, broker: str, price: float, default: float) -> float:
+    """Secondes avant le prochain contrôle au prix du trade (`default` si distance ou volatilité inconnue)."""
+    if price is None:
+        return default
+    dist = distance(trade_data, broker, price)
+    var = variance_rate(broker, trade_data.get("instrument"))
+    if dist is None or not var:
+        return default
+    seconds = dist ** 2 / (SIGMAS ** 2 * var)
+    return min(max(seconds, MIN_DELAY_S), MAX_DELAY_S) if math.isfinite(seconds) else MAX_DELAY_S
+
+
+def crossed(trade_data: dict, price: float) -> bool:
+    """Prix au-delà du SL ou du TP : le trade est probablement clos chez le broker."""
+    sign = 1 if trade_data.get("direction") == "LONG" else -1
+    try:
+        sl, tp = trade_data.get("sl"), trade_data.get("tp")
+        return (sl is not None and sign * (price - float(sl)) <= 0) or \
+               (tp is not None and sign * (price - float(tp)) >= 0)
+    except (TypeError, ValueError):
+        return False
@@ -3,75 +3,93 @@ from massive import WebSocketClient
 from massive.websocket.models import Feed, Market
 from threading import Thread
 import time
-from app.services.firebase import get_firestore
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from app.services.range_manager import calculate_and_store_opening_range
-from app.services.log_service import log_to_firestore
-from app.strategies import get_all_strategies
-from app.config.universe import UNIVERSE
+from app.services import range_manager
+from app.services.log_service import log_to_firestore, get_log_stats
+from app.services.batch_writer import candle_writer
+from app.services import bar_store, bar_backfill, config_service, strategy_dispatcher
+from app.services.bar_store import Candle
+from app.strategies import build_routing_table
+from app.services.session_calendar import calendar
+from app.config.universe import UNIVERSE, PHASE_OPENING_RANGE
 import os, pytz
 
 load_dotenv()
 POLYGON_API_KEY = os.getenv("POLYGON_API_KEY")
 
-def _parse_hhmm(s):
-    h, m = s.split(":"); return int(h), int(m)
+_routes = {}
+_routes_key = None
+
+
+def _refresh_routes():
+    """(Re)construit la table symbole -> phase -> stratégies et le calendrier de session si UNIVERSE a changé."""
+    global _routes, _routes_key
+    key = tuple(sorted(
+        (sym, bool(cfg.get("active")), cfg.get("instrument"), tuple(sorted(cfg.get("session", {}).items())))
+        for sym, cfg in UNIVERSE.items()
+    ))
+    if key != _routes_key:
+        calendar.load(UNIVERSE)
+        _routes = build_routing_table(UNIVERSE)
+        _routes_key = key
+    return _routes
+
+
+def _ingest(candle: Candle, session, phase=None, routes=None):
+    """Chemin d'ingestion commun (WS et rattrapage). Sans `routes`, pas de stratégies."""
+    sym, e = candle.sym, candle.e
+
+    # Copie mémoire (lue par range_manager, stratégies et /api/candles)
+    bar_store.append_candle(candle)
+
+    # Persistance hors chemin critique : les stratégies reçoivent la bougie tout de suite
+    candle_writer.enqueue("ohlc_1m", candle.doc_id, candle)
+    # log debug utile:
+    # print(f"✅ Stored {candle.doc_id} (in_open={candle.in_opening_range})")
+
+    # Range d'ouverture incrémental : high/low courants pendant la fenêtre,
+    # publication dès la 1re bougie qui atteint la fin de fenêtre (même si 09:45 manque)
+    if candle.in_opening_range:
+        range_manager.update_opening_range(session.day, sym, candle.h, candle.l)
+    if e >= session.or_end_ms and not range_manager.is_published(session.day, sym):
+        rdoc = range_manager.close_opening_range(session.day, sym)
+        log_to_firestore(f"🕒 {sym} fin du range d'ouverture → range {session.day} publié ({rdoc.get('status')})")
+
+    # Stratégies abonnées à (symbole, phase) uniquement, sur le worker du symbole
+    strategies = routes.get(sym, {}).get(phase) if routes and not candle.backfilled else None
+    if strategies:
+        config = config_service.get_snapshot()  # même version de config pour toute la bougie
+        strategy_dispatcher.dispatch(sym, candle, config, strategies)
 
-def _session_for(sym):
-    s = UNIVERSE.get(sym, {}).get("session", {})
-    tz = pytz.timezone(s.get("tz", "America/New_York"))
-    oh, om = _parse_hhmm(s.get("open", "09:30"))
-    or_minutes = int(s.get("or_minutes", 15))
-    th, tm = _parse_hhmm(s.get("trade_end", "11:30"))
-    return tz, oh, om, or_minutes, th, tm
 
 def handle_msg(msgs):
-    db = get_firestore()
+    routes = _refresh_routes()
     for m in msgs:
         try:
+            recv_ms = int(time.time() * 1000)
             _ws_status["last_msg"] = datetime.now(timezone.utc).isoformat()
-            dt_utc = datetime.fromtimestamp(m.end_timestamp/1000, tz=timezone.utc)
             sym = m.symbol  # <-- garder EXACTEMENT le symbole WS partout
+            e = m.end_timestamp
+
+            # phase de session par symbole (bornes précalculées par jour, si inconnu → défaut US)
+            session = calendar.bounds(sym, e)
+            phase = session.phase(e)
+            in_open = phase == PHASE_OPENING_RANGE
+
+            # Bougie compacte : numérique, sérialisée en dict ohlc_1m uniquement par le writer
+            candle = Candle(
+                sym, int(m.start_timestamp), int(e),
+                float(m.open), float(m.high), float(m.low), float(m.close),
+                None if m.official_open_price is None else float(m.official_open_price),
+                in_open, ev=m.event_type, recv_ms=recv_ms,
+            )
 
-            # horaires par symbole (si inconnu → défaut US)
-            tz, oh, om, or_min, th, tm = _session_for(sym)
-            dt_local = dt_utc.astimezone(tz)
-
-            open_start = dt_local.replace(hour=oh, minute=om, second=0, microsecond=0)
-            open_end   = open_start + timedelta(minutes=or_min)
-            trade_end  = dt_local.replace(hour=th, minute=tm, second=0, microsecond=0)
-
-            in_open = open_start <= dt_local <= open_end
-
-            candle = {
-                "ev": m.event_type, "sym": sym,
-                "op": m.official_open_price,
-                "o": m.open, "c": m.close, "h": m.high, "l": m.low,
-                "s": m.start_timestamp, "e": m.end_timestamp,
-                "utc_time": dt_utc.strftime("%Y-%m-%d %H:%M:%S"),
-                "day": dt_utc.strftime("%Y-%m-%d"),
-                "in_opening_range": in_open,
-            }
-
-            doc_id = f"{sym}_{m.end_timestamp}"
-            db.collection("ohlc_1m").document(doc_id).set(candle)
-            # log debug utile:
-            # print(f"✅ Stored {doc_id} (in_open={in_open})")
-
-            # Fin de fenêtre d’ouverture locale → calcule le range pour CE symbole
-            if dt_local.strftime("%H:%M") == open_end.strftime("%H:%M"):
-                day_str = dt_local.strftime("%Y-%m-%d")
-                log_to_firestore(f"🕒 {sym} {open_end.strftime('%H:%M %Z')} → calc range {day_str}")
-                calculate_and_store_opening_range(day=day_str, symbol=sym)
-
-            # Exécuter stratégies hors opening range et avant fin de session
-            if (not in_open) and (dt_local <= trade_end) and UNIVERSE.get(sym, {}).get("active", False):
-                for fn in get_all_strategies():
-                    try:
-                        fn(candle)
-                    except Exception as e:
-                        log_to_firestore(f"❌ Strat {fn.__name__} ({sym}) : {e}", level="ERROR")
+            # Minutes manquées (reconnexion, perte de messages) : rattrapage REST en arrière-plan
+            prev = bar_store.latest(sym)
+            bar_backfill.check_gap(sym, prev.e if prev else None, candle.e, session)
+
+            _ingest(candle, session, phase, routes)
 
         except Exception as e:
             log_to_firestore(f"⚠️ WS error ({getattr(m,'symbol','?')}) : {e}", level="ERROR")
@@ -97,12 +115,27 @@ def _is_market_open() -> bool:
 def get_ws_status():
     status = _ws_status.copy()
     status["market_open"] = _is_market_open()
+    status["candle_writer"] = candle_writer.get_stats()
+    status["strategy_workers"] = strategy_dispatcher.get_stats()
+    status["backfill"] = bar_backfill.get_stats()
+    status["logger"] = get_log_stats()
     return status
 
 
+def _warm_bar_store():
+    """Redémarrage en cours de journée : recharge les bougies du jour déjà stockées."""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    try:
+        bar_store.warm_day(today)
+    except Exception as e:
+        log_to_firestore(f"[PolygonWS] Warm bar store {today} échoué: {e}", level="ERROR")
+
+
 def _run_with_reconnect():
     global _ws_status
     backoff = 1
+    _warm_bar_store()
+    bar_backfill.start(_ingest)
 
     while True:
         # Wait for market hours before connecting
@@ -118,6 +151,7 @@ def _run_with_reconnect():
             client = WebSocketClient(api_key=POLYGON_API_KEY, feed=Feed.RealTime, market=Market.Indices)
 
             symbols = [sym for sym, cfg in UNIVERSE.items() if cfg.get("active")]
+            _refresh_routes()
             if not symbols:
                 log_to_firestore("[PolygonWS] Aucun symbole actif dans UNIVERSE", level="ERROR")
                 time.sleep(30)
@@ -0,0 +1,195 @@
+# app/services/price_stream.py
+"""
+Carnet de prix OANDA alimenté par le flux de pricing (streaming HTTP).
+
+Un thread daemon garde ouverte la connexion
+    {OANDA_STREAM_URL}/accounts/{id}/pricing/stream?instruments=A,B,...
+et met à jour un carnet en mémoire {instrument: bid/ask}. OANDA envoie un
+snapshot de chaque instrument à la connexion, puis un PRICE à chaque
+changement et un HEARTBEAT toutes les 5 s.
+
+- fraîcheur : un prix est utilisable tant que le flux est vivant (dernier
+  message, prix ou heartbeat, il y a moins de STALE_AFTER_S). Un instrument
+  calme n'envoie rien mais reste valide : c'est le heartbeat qui prouve que
+  la connexion n'est pas figée.
+- souscription : `subscribe()` ajoute des instruments ; le thread se
+  reconnecte avec la nouvelle liste (au plus tard au heartbeat suivant).
+- reconnexion : timeout de lecture > intervalle des heartbeats, backoff avec
+  jitter entre deux tentatives ; le carnet est marqué périmé tant que le flux
+  est coupé, get_latest_price retombe alors sur REST.
+"""
+import json
+import os
+import threading
+import time
+from app.services.http_session import get_session, backoff_delay, CONNECT_TIMEOUT
+from app.services.log_service import log_to_firestore
+
+OANDA_STREAM_URL = os.getenv("OANDA_STREAM_URL")  # défaut : dérivé de OANDA_API_URL (api- → stream-)
+STALE_AFTER_S = 10.0         # 2 heartbeats manqués
+READ_TIMEOUT_S = 12.0        # lecture bloquée plus longtemps = connexion morte
+
+_api_url = None              # fournis par oanda_service (configure)
+_account_id = None
+_headers = {}
+_book = {}                   # instrument -> (bid, ask, time OANDA, reçu à (monotonic))
+_wanted = set()
+_listeners = []              # fn(instrument, bid, ask) appelées à chaque PRICE (tick manager)
+_lock = threading.Lock()
+_resubscribe = threading.Event()
+_stop = threading.Event()
+_thread = None
+_connected = False
+_last_msg = 0.0              # monotonic du dernier message reçu
+_stats = {
+    "connects": 0,
+    "disconnects": 0,
+    "prices": 0,
+    "heartbeats": 0,
+    "hits": 0,
+    "misses": 0,
+    "last_error": None,
+}
+
+
+def configure(api_url: str, account_id: str, headers: dict):
+    global _api_url, _account_id, _headers
+    _api_url, _account_id, _headers = api_url, account_id, headers
+
+
+def stream_url(path: str) -> str:
+    """URL d'un endpoint de streaming du compte (pricing/stream, transactions/stream)."""
+    base = OANDA_STREAM_URL or (_api_url or "").replace("//api-", "//stream-")
+    return f"{base}/accounts/{_account_id}/{path}"
+
+
+def stream_session():
+    # session à part : les connexions de streaming ne doivent pas occuper le pool REST
+    return get_session("oanda_stream", headers=_headers, pool_size=2)
+
+
+def is_live() -> bool:
+    return _connected and time.monotonic() - _last_msg <= STALE_AFTER_S
+
+
+def get_quote(instrument: str):
+    """(bid, ask) si le carnet est frais pour cet instrument, sinon None."""
+    q = _book.get(instrument) if is_live() else None
+    if q is None:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    return q[0], q[1]
+
+
+def subscribe(instruments):
+    """Ajoute des instruments au flux (démarre le thread au besoin)."""
+    new = set(instruments) - _wanted
+    if new:
+        with _lock:
+            _wanted.update(new)
+        _resubscribe.set()
+    start()
+
+
+def add_listener(fn):
+    """fn(instrument, bid, ask) appelée dans le thread du flux : doit rester courte."""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def _handle_line(line: bytes):
+    global _last_msg
+    _last_msg = time.monotonic()
+    msg = json.loads(line)
+    kind = msg.get("type")
+    if kind == "HEARTBEAT":
+        _stats["heartbeats"] += 1
+    elif kind == "PRICE":
+        try:
+            bid = float(msg["bids"][0]["price"])
+            ask = float(msg["asks"][0]["price"])
+        except (KeyError, IndexError, ValueError):
+            return  # pas de liquidité (marché fermé) : on garde le dernier prix
+        _book[msg["instrument"]] = (bid, ask, msg.get("time"), _last_msg)
+        _stats["prices"] += 1
+        for fn in _listeners:
+            try:
+                fn(msg["instrument"], bid, ask)
+            except Exception as e:
+                _stats["last_error"] = f"listener: {e}"[:200]
+
+
+def _consume(instruments: list):
+    global _connected
+    response = stream_session().get(
+        stream_url("pricing/stream"), endpoint="pricing_stream", retries=0, stream=True,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT_S),
+        params={"instruments": ",".join(instruments)},
+    )
+    try:
+        response.raise_for_status()
+        _connected = True
+        _stats["connects"] += 1
+        # chunk_size=None : chaque chunk HTTP est traité dès réception
+        for line in response.iter_lines(chunk_size=None):
+            if line:
+                _handle_line(line)
+            if _resubscribe.is_set() or _stop.is_set():
+                return
+        raise ConnectionError("flux ferme par le serveur")
+    finally:
+        _connected = False
+        response.close()
+
+
+def _run():
+    attempt = 0
+    while not _stop.is_set():
+        _resubscribe.clear()
+        with _lock:
+            instruments = sorted(_wanted)
+        if not instruments:
+            _resubscribe.wait(1.0)
+            continue
+        connects = _stats["connects"]
+        try:
+            _consume(instruments)
+            attempt = 0
+        except Exception as e:
+            _stats["disconnects"] += 1
+            _stats["last_error"] = str(e)[:200]
+            if _stats["connects"] > connects:
+                attempt = 0  # la connexion avait abouti : nouvelle coupure, pas un echec en boucle
+            if attempt == 0:
+                log_to_firestore(f"[PriceStream] Flux coupe, fallback REST: {e}", level="ERROR")
+            _stop.wait(backoff_delay(attempt))
+            attempt = min(attempt + 1, 5)
+
+
+def start(instruments=()):
+    """Démarre le consommateur du flux (idempotent)."""
+    global _thread
+    with _lock:
+        _wanted.update(instruments)
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="oanda-price-stream", daemon=True)
+        _thread.start()
+
+
+def stop():
+    _stop.set()
+    _resubscribe.set()
+
+
+def get_stats() -> dict:
+    age = time.monotonic() - _last_msg if _last_msg else None
+    return {
+        **_stats,
+        "live": is_live(),
+        "last_msg_age_s": round(age, 1) if age is not None else None,
+        "subscribed": sorted(_wanted),
+        "book": {k: {"bid": v[0], "ask": v[1], "time": v[2]} for k, v in list(_book.items())},
+    }
@@ -1,12 +1,97 @@
 # app/services/range_manager.py
+"""
+Range d'ouverture par symbole et par jour.
+
+Le range est calculé au fil de l'eau (high/low courants) pendant que les
+bougies in_opening_range arrivent dans handle_msg, puis publié dans un
+registre en mémoire dès que la fenêtre se ferme. Les stratégies lisent le
+registre sans I/O ; la persistance dans `opening_range` est asynchrone.
+"""
+import threading
 from app.services.firebase import get_firestore
+from app.services import bar_store
+from app.services.batch_writer import candle_writer
 
-def calculate_and_store_opening_range(day: str, symbol: str):
-    """
-    Calcule le range d'ouverture (high/low) pour un symbole et une journée donnée,
-    à partir des bougies 1 minute stockées dans Firestore.
-    """
+_building = {}   # (day, symbol) -> {"high", "low", "count"} pendant la fenêtre
+_registry = {}   # (day, symbol) -> doc publié (même format que opening_range)
+_lock = threading.Lock()
+
+
+def _range_doc(day: str, symbol: str, high, low, count: int) -> dict:
+    if not count:
+        return {"day": day, "symbol": symbol, "status": "empty"}
+    return {
+        "day": day,
+        "symbol": symbol,
+        "high": high,
+        "low": low,
+        "range": high - low,
+        "count": count,
+        "status": "ready",
+    }
+
+
+def _publish(day: str, symbol: str, doc: dict, persist: bool = True):
+    with _lock:
+        _registry[(day, symbol)] = doc
+    if persist:
+        # écriture Firestore hors chemin critique (même writer que les bougies)
+        candle_writer.enqueue("opening_range", f"{day}_{symbol}", doc)
+
+
+def update_opening_range(day: str, symbol: str, high: float, low: float):
+    """Intègre une bougie du range. Une bougie arrivée après publication met le range à jour."""
+    key = (day, symbol)
+    with _lock:
+        r = _building.get(key)
+        if r is None:
+            r = _building[key] = {"high": high, "low": low, "count": 0}
+        r["high"] = max(r["high"], high)
+        r["low"] = min(r["low"], low)
+        r["count"] += 1
+        published = key in _registry
+        doc = _range_doc(day, symbol, r["high"], r["low"], r["count"])
+    if published:
+        _publish(day, symbol, doc)
+
+
+def is_published(day: str, symbol: str) -> bool:
+    return (day, symbol) in _registry
+
+
+def close_opening_range(day: str, symbol: str) -> dict:
+    """Fenêtre fermée : publie le range courant (ou le reconstruit après un redémarrage)."""
+    key = (day, symbol)
+    with _lock:
+        if key in _registry:
+            return _registry[key]
+        r = _building.get(key)
+    if r is None:
+        # aucune bougie du range vue par ce process (redémarrage, bougies manquantes)
+        return calculate_and_store_opening_range(day, symbol)
+    doc = _range_doc(day, symbol, r["high"], r["low"], r["count"])
+    _publish(day, symbol, doc)
+    return doc
+
+
+def get_opening_range(day: str, symbol: str) -> dict | None:
+    """Range publié pour (day, symbol). Lecture mémoire ; I/O uniquement au 1er accès après redémarrage."""
+    doc = _registry.get((day, symbol))
+    if doc is not None:
+        return doc
+    db = get_firestore()
+    stored = db.collection("opening_range").document(f"{day}_{symbol}").get().to_dict()
+    if stored and stored.get("status") == "ready":
+        _publish(day, symbol, stored, persist=False)
+        return stored
+    return calculate_and_store_opening_range(day, symbol)
+
+
+def _range_bars_firestore(day: str, symbol: str):
+    """Bougies du range lues dans ohlc_1m (jour non couvert par le bar store)."""
     db = get_firestore()
+    # les bougies du range peuvent encore être dans la queue d'écriture
+    candle_writer.flush()
 
     # même symbole exact que celui stocké dans ohlc_1m
     q = (
@@ -25,23 +110,26 @@ def calculate_and_store_opening_range(day: str, symbol: str):
                 lows.append(float(data["l"]))
             except Exception:
                 continue
+    return highs, lows
 
-    doc_id = f"{day}_{symbol}"
 
-    if not highs or not lows:
-        db.collection("opening_range").document(doc_id).set({
-            "day": day,
-            "symbol": symbol,
-            "status": "empty"
-        })
-        return
+def calculate_and_store_opening_range(day: str, symbol: str) -> dict:
+    """
+    Recalcule le range d'ouverture (high/low) pour un symbole et une journée donnée
+    à partir des bougies 1 minute stockées (bar store, fallback Firestore), puis le publie.
+    """
+    if bar_store.has_day(day):
+        bars = [b for b in bar_store.day_bars(symbol, day) if b.in_opening_range]
+        highs, lows = [b.h for b in bars], [b.l for b in bars]
+    else:
+        highs, lows = _range_bars_firestore(day, symbol)
 
-    hi, lo = max(highs), min(lows)
-    db.collection("opening_range").document(doc_id).set({
-        "day": day,
-        "symbol": symbol,
-        "high": hi,
-        "low": lo,
-        "range": hi - lo,
-        "status": "ready"
-    })
+    if highs:
+        hi, lo = max(highs), min(lows)
+        with _lock:
+            _building[(day, symbol)] = {"high": hi, "low": lo, "count": len(highs)}
+        doc = _range_doc(day, symbol, hi, lo, len(highs))
+    else:
+        doc = _range_doc(day, symbol, None, None, 0)
+    _publish(day, symbol, doc)
+    return doc
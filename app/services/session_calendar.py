@@ -0,0 +1,122 @@
+# app/services/session_calendar.py
+"""
+Calendrier de session précalculé par symbole et par jour.
+
+Les bornes (ouverture, fin du range d'ouverture, fin de trading) sont
+calculées une fois par jour local en epoch ms UTC, DST compris (pytz).
+Classer une bougie devient quelques comparaisons d'entiers sur son
+end_timestamp, sans parse "HH:MM" ni astimezone par message.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+import pytz
+from app.config.universe import (
+    UNIVERSE, PHASE_PRE_OPEN, PHASE_OPENING_RANGE, PHASE_TRADING, PHASE_CLOSED,
+)
+
+DEFAULT_SESSION = {"tz": "America/New_York", "open": "09:30", "or_minutes": 15, "trade_end": "11:30"}
+MAX_CACHED_DAYS = 64    # LRU (symbole, jour) : jour courant et veille de chaque symbole, plus quelques relectures
+
+
+class SessionBounds(NamedTuple):
+    day: str              # date locale YYYY-MM-DD
+    day_start_ms: int     # minuit local (inclus)
+    day_end_ms: int       # minuit local du lendemain (exclu)
+    open_ms: int
+    or_end_ms: int
+    trade_end_ms: int
+
+    def phase(self, ts_ms: int) -> str:
+        if ts_ms < self.open_ms:
+            return PHASE_PRE_OPEN
+        if ts_ms <= self.or_end_ms:
+            return PHASE_OPENING_RANGE
+        if ts_ms <= self.trade_end_ms:
+            return PHASE_TRADING
+        return PHASE_CLOSED
+
+
+def _ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+def ms_to_utc(ts_ms: int) -> datetime:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+
+
+class SessionCalendar:
+    def __init__(self, universe: dict):
+        self._default = self._parse({})
+        self._lock = threading.Lock()
+        self.load(universe)
+
+    def load(self, universe: dict):
+        """(Re)charge les sessions depuis `universe`, en place : les modules qui ont importé `calendar` la voient."""
+        sessions, instrument_symbol = {}, {}
+        for sym, cfg in universe.items():
+            sessions[sym] = self._parse(cfg.get("session", {}))
+            if cfg.get("instrument"):
+                instrument_symbol[cfg["instrument"]] = sym
+        with self._lock:
+            self._sessions = sessions
+            self._instrument_symbol = instrument_symbol
+            self._current = {}   # sym -> SessionBounds du dernier jour demandé
+            self._cache = OrderedDict()  # (sym, date locale) -> SessionBounds, LRU borné
+
+    @staticmethod
+    def _parse(s: dict):
+        s = {**DEFAULT_SESSION, **s}
+        oh, om = map(int, s["open"].split(":"))
+        th, tm = map(int, s["trade_end"].split(":"))
+        return pytz.timezone(s["tz"]), oh, om, int(s["or_minutes"]), th, tm
+
+    def _compute(self, sym: str, local_date) -> SessionBounds:
+        tz, oh, om, or_min, th, tm = self._sessions.get(sym, self._default)
+        y, mo, d = local_date.year, local_date.month, local_date.day
+        nxt = local_date + timedelta(days=1)
+        open_dt = tz.localize(datetime(y, mo, d, oh, om))
+        return SessionBounds(
+            day=local_date.strftime("%Y-%m-%d"),
+            day_start_ms=_ms(tz.localize(datetime(y, mo, d))),
+            day_end_ms=_ms(tz.localize(datetime(nxt.year, nxt.month, nxt.day))),
+            open_ms=_ms(open_dt),
+            or_end_ms=_ms(open_dt) + or_min * 60_000,
+            trade_end_ms=_ms(tz.localize(datetime(y, mo, d, th, tm))),
+        )
+
+    def _for_date(self, sym: str, local_date) -> SessionBounds:
+        # hors chemin rapide (changement de jour, relecture d'un jour passé) : LRU sous verrou
+        key = (sym, local_date)
+        with self._lock:
+            b = self._cache.get(key)
+            if b is not None:
+                self._cache.move_to_end(key)
+                return b
+            b = self._cache[key] = self._compute(sym, local_date)
+            while len(self._cache) > MAX_CACHED_DAYS:
+                self._cache.popitem(last=False)
+        return b
+
+    def bounds(self, sym: str, ts_ms: int) -> SessionBounds:
+        """Bornes du jour local de `sym` contenant `ts_ms` (chemin rapide : même jour que l'appel précédent)."""
+        b = self._current.get(sym)
+        if b is not None and b.day_start_ms <= ts_ms < b.day_end_ms:
+            return b
+        tz = self._sessions.get(sym, self._default)[0]
+        b = self._for_date(sym, ms_to_utc(ts_ms).astimezone(tz).date())
+        self._current[sym] = b
+        return b
+
+    def bounds_for_day(self, sym: str, day: str) -> SessionBounds:
+        return self._for_date(sym, datetime.strptime(day, "%Y-%m-%d").date())
+
+    def phase(self, sym: str, ts_ms: int) -> str:
+        return self.bounds(sym, ts_ms).phase(ts_ms)
+
+    def symbol_for_instrument(self, instrument: str):
+        return self._instrument_symbol.get(instrument)
+
+
+calendar = SessionCalendar(UNIVERSE)
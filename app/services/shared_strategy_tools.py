@@ -1,6 +1,8 @@
 # app/services/shared_strategy_tools.py
 import math
-from app.services import oanda_service, kraken_service
+from app.services import oanda_service, kraken_service, bar_store, exit_plan, strategy_dispatcher
+from app.services.batch_writer import candle_writer
+from app.services.log_service import log_to_firestore
 
 STEP = 0.1  # pas OANDA
 
@@ -15,6 +17,13 @@ def get_entry_price(instrument: str, broker: str = "oanda"):
         return kraken_service.get_latest_price(instrument)
     return oanda_service.get_latest_price(instrument)
 
+def record_decision(sym: str, end_ts: int, strategy_key: str, decision: str):
+    """Trace la décision d'une stratégie sur une bougie (bar store + ohlc_1m.strategy_decisions)."""
+    bar_store.annotate(sym, end_ts, strategy_key, decision)
+    candle_writer.enqueue(
+        "ohlc_1m", f"{sym}_{end_ts}", {"strategy_decisions": {strategy_key: decision}}, merge=True
+    )
+
 def calculate_sl_tp(entry, sl_level, direction, tp_ratio=2.75, decimals=2):
     risk = abs(entry - sl_level)
     if risk == 0:
@@ -65,6 +74,7 @@ def execute_trade(instrument: str, entry_price, sl_price, tp_price, units, direc
     print(f"execute_trade: {units} -> {qty} ({direction}) [{broker}]")
     if qty < step:
         raise ValueError(f"units too small (< {step}): {units}")
+    strategy_dispatcher.check_deadline()  # appel de stratégie en retard : signal perimé, pas d'ordre
 
     if broker == "kraken":
         side = "buy" if direction == "LONG" else "sell"
@@ -121,3 +131,85 @@ def execute_trade(instrument: str, entry_price, sl_price, tp_price, units, direc
         "oanda_trade_id": oanda_trade_id,
         "fill_price": fill_price,
     }
+
+
+def _cancel_exit_order(order_id, broker: str):
+    try:
+        if broker == "kraken":
+            kraken_service.cancel_order(order_id)
+        else:
+            oanda_service.cancel_order(order_id)
+    except Exception as e:
+        log_to_firestore(f"[Ladder] Annulation ordre {order_id} [{broker}] echouee: {e}", level="ERROR")
+
+
+def place_exit_ladder(instrument: str, result: dict, direction: str, plan: dict, tp_price: float,
+                      broker: str = "oanda", settings=None) -> dict:
+    """
+    settings["scaling_mode"] == "broker" : pose chez le broker, juste après l'entrée, les paliers
+    du plan qui ferment des units ; le tracker ne fait plus que réconcilier leurs fills et déplacer le SL.
+    - OANDA : un ordre LIMIT REDUCE_ONLY par palier ; le TP du trade prend le reste
+    - Kraken : chaîne de take-profit ; le TP complet est remplacé par un TP sur le reliquat
+    Les paliers posés reçoivent leur order_id dans `plan`. Retourne les champs en plus pour le
+    document ({} = paliers exécutés par le tracker, comme avant).
+    """
+    if (settings or {}).get("scaling_mode", "tracker") != "broker":
+        return {}
+    trade_id = result.get("oanda_trade_id") or result.get("trade_id")
+    rungs = [rung for rung in plan["rungs"] if rung["units"]]
+    if not trade_id or not rungs:
+        return {}
+    sign = plan["sign"]
+    side = "buy" if direction == "LONG" else "sell"
+
+    placed, new_tp = [], None
+    try:
+        for rung in rungs:
+            if broker == "kraken":
+                order_id = kraken_service.add_take_profit(instrument, side, rung["level"], rung["units"])
+            else:
+                order_id = oanda_service.create_reduce_only_limit(instrument, -sign * rung["units"], rung["level"])
+            placed.append((rung, order_id))
+        if broker == "kraken":
+            remainder = round(abs(float(result["units"])) - sum(rung["units"] for rung in rungs), 4)
+            new_tp = kraken_service.add_take_profit(instrument, side, tp_price, remainder)
+            if result.get("tp_txid"):
+                kraken_service.cancel_order(result["tp_txid"])
+    except Exception as e:
+        log_to_firestore(f"[Ladder] Paliers non poses sur {instrument} [{broker}], scaling par le tracker: {e}",
+                         level="ERROR")
+        for order_id in [order_id for _, order_id in placed] + ([new_tp] if new_tp else []):
+            _cancel_exit_order(order_id, broker)
+        return {}
+
+    for rung, order_id in placed:
+        rung["order_id"] = order_id
+    log_to_firestore(
+        f"[Ladder] {len(placed)} paliers poses sur {instrument} [{broker}]: "
+        + ", ".join(f"{rung['units']} @ {rung['r']}R" for rung in rungs),
+        level="TRADING"
+    )
+    return {"tp_txid": new_tp} if new_tp else {}
+
+
+def build_exit_plan(strategy_key: str, settings: dict, instrument: str, result: dict, direction: str,
+                    risk_per_unit: float, tp_price: float, step=None, broker: str = "oanda",
+                    default_plan: str = exit_plan.DEFAULT_PLAN, atr: float = None) -> dict:
+    """
+    Plan de sortie de la stratégie (config, sinon `default_plan`) compilé sur le fill du trade,
+    avec ses paliers posés chez le broker en scaling_mode "broker". Champs à ajouter au document.
+    """
+    if step is None:
+        step = STEP
+    fill = float(result.get("fill_price") or 0)
+    if not fill or not risk_per_unit:
+        return {}
+    if broker == "kraken":
+        decimals = kraken_service.DECIMALS_BY_PAIR.get(instrument, 2)
+    else:
+        decimals = oanda_service.DECIMALS_BY_INSTRUMENT.get(instrument, 5)
+    name, spec = exit_plan.plan_for(strategy_key, settings, default_plan)
+    plan = exit_plan.compile_plan(name, spec, fill, direction, risk_per_unit, result["units"], step,
+                                  exit_plan.be_offset(decimals), atr=atr)
+    fields = place_exit_ladder(instrument, result, direction, plan, tp_price, broker=broker, settings=settings)
+    return {"exit_plan": plan, **fields}
@@ -0,0 +1,141 @@
+# app/services/strategy_dispatcher.py
+"""
+Exécution des stratégies hors du thread WebSocket.
+
+Une queue ordonnée et un worker par symbole : l'ordre des bougies est
+conservé pour un symbole, les symboles tournent en parallèle, et un appel
+OANDA lent sur SPX ne retarde ni l'ingestion ni NDX.
+
+Politique de queue : bornée à MAX_QUEUE_PER_SYMBOL bougies ; si elle est
+pleine, la plus ancienne est abandonnée (coalescence sur la plus récente).
+Une bougie plus vieille que MAX_BAR_AGE_S au moment de son traitement est
+ignorée : le signal n'est plus exploitable.
+
+Chaque appel de stratégie a une échéance (STRATEGY_DEADLINE_S). L'appel n'est
+pas interrompu, mais l'envoi d'ordre vérifie l'échéance (check_deadline, dans
+execute_trade) : une stratégie en retard ne place plus son ordre.
+"""
+import threading
+import time
+from collections import deque
+from app.services.log_service import log_to_firestore
+
+MAX_QUEUE_PER_SYMBOL = 5
+MAX_BAR_AGE_S = 90          # au-delà de la clôture de la bougie + 90 s, plus de décision
+STRATEGY_DEADLINE_S = 10    # échéance par appel de stratégie : plus d'ordre envoyé au-delà
+
+_workers = {}
+_workers_lock = threading.Lock()
+_local = threading.local()   # échéance de l'appel en cours dans ce thread worker
+
+
+class DeadlineExpired(Exception):
+    """Ordre refusé : l'appel de stratégie a dépassé son échéance."""
+
+
+def check_deadline():
+    """Avant un envoi d'ordre : lève DeadlineExpired si l'appel de stratégie en cours a expiré (no-op hors worker)."""
+    deadline = getattr(_local, "deadline", None)
+    if deadline is None:
+        return
+    late = time.monotonic() - deadline
+    if late > 0:
+        worker = _local.worker
+        worker.stats["expired"] += 1
+        log_to_firestore(
+            f"[StrategyDispatcher] Ordre {worker.sym} annule: echeance depassee de {late:.1f}s", level="ERROR"
+        )
+        raise DeadlineExpired(f"strategy deadline exceeded by {late:.1f}s")
+
+
+class _SymbolWorker:
+    def __init__(self, sym: str):
+        self.sym = sym
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self.stats = {
+            "submitted": 0,
+            "processed": 0,
+            "dropped": 0,
+            "stale": 0,
+            "overruns": 0,
+            "expired": 0,
+            "errors": 0,
+            "last_lag_ms": None,
+            "max_call_ms": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name=f"strategies-{sym}", daemon=True)
+        self._thread.start()
+
+    def submit(self, candle, config, strategies):
+        with self._cond:
+            self.stats["submitted"] += 1
+            if len(self._queue) >= MAX_QUEUE_PER_SYMBOL:
+                self._queue.popleft()
+                self.stats["dropped"] += 1
+            self._queue.append((candle, config, strategies))
+            self._cond.notify()
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                candle, config, strategies = self._queue.popleft()
+            self._process(candle, config, strategies)
+
+    def _process(self, candle, config, strategies):
+        lag_ms = time.time() * 1000 - candle.e
+        self.stats["last_lag_ms"] = round(lag_ms)
+        if lag_ms > MAX_BAR_AGE_S * 1000:
+            self.stats["stale"] += 1
+            log_to_firestore(
+                f"[StrategyDispatcher] Bougie {self.sym} {candle.e} ignoree (lag {lag_ms / 1000:.0f}s)",
+                level="ERROR"
+            )
+            return
+
+        _local.worker = self
+        for fn in strategies:
+            t0 = time.perf_counter()
+            _local.deadline = time.monotonic() + STRATEGY_DEADLINE_S
+            try:
+                fn(candle, config)
+            except Exception as e:
+                self.stats["errors"] += 1
+                log_to_firestore(f"❌ Strat {fn.__name__} ({self.sym}) : {e}", level="ERROR")
+            finally:
+                _local.deadline = None
+            elapsed = time.perf_counter() - t0
+            self.stats["max_call_ms"] = round(max(self.stats["max_call_ms"], elapsed * 1000), 1)
+            if elapsed > STRATEGY_DEADLINE_S:
+                self.stats["overruns"] += 1
+                log_to_firestore(
+                    f"[StrategyDispatcher] {fn.__name__} ({self.sym}) a depasse son budget: "
+                    f"{elapsed:.1f}s > {STRATEGY_DEADLINE_S}s",
+                    level="ERROR"
+                )
+        self.stats["processed"] += 1
+
+
+def _worker(sym: str) -> _SymbolWorker:
+    w = _workers.get(sym)
+    if w is None:
+        with _workers_lock:
+            w = _workers.get(sym)
+            if w is None:
+                w = _workers[sym] = _SymbolWorker(sym)
+    return w
+
+
+def dispatch(sym: str, candle, config, strategies):
+    """Planifie les stratégies pour une bougie ; retourne immédiatement."""
+    if strategies:
+        _worker(sym).submit(candle, config, strategies)
+
+
+def get_stats() -> dict:
+    return {sym: {**w.stats, "queue_depth": w.depth()} for sym, w in list(_workers.items())}
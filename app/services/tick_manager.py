@@ -0,0 +1,151 @@
+# app/services/tick_manager.py
+"""
+Gestion des positions au tick : paliers du plan de sortie (exit_plan) et
+trailing stop.
+
+Chaque trade géré n'a qu'une règle active à la fois (le prochain palier, ou
+le prochain cran du trailing s'il est plus proche), précalculée en niveau de
+prix et rangée dans une liste triée par (broker, instrument) :
+    - _up   : se déclenche quand prix >= niveau (LONG), triée croissante
+    - _down : se déclenche quand prix <= niveau (SHORT), triée croissante
+Un tick ne compare donc que les extrémités des deux listes (seuils les plus
+proches) ; il ne fait rien de plus tant qu'aucun seuil n'est franchi.
+
+Sources de prix : le flux OANDA (price_stream, chaque PRICE) et les prix
+récupérés par le cycle du tracker (Kraken, ou flux indisponible).
+
+Les actions broker passent par trade_tracker.apply_exit_rule (même logique
+qu'au polling), une seule à la fois par
+(trade, règle) : une rafale de ticks ne peut pas clôturer deux fois. Une
+règle exécutée n'est plus réarmée, même si le cycle suivant relit un
+document Firestore pas encore à jour.
+"""
+import bisect
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.services import trade_tracker, price_stream, exit_plan
+
+ACTION_WORKERS = 4
+
+_up = {}          # (broker, instrument) -> [(niveau, seq, key, règle)]
+_down = {}
+_trades = {}      # key (broker, trade_id) -> (doc_ref, trade_id, broker, trade_data)
+_done = set()     # (key, règle) déjà exécutées
+_inflight = set()
+_lock = threading.Lock()
+_seq = itertools.count()
+_executor = None
+_stats = {"ticks": 0, "fired": 0, "deduped": 0, "errors": 0}
+
+
+def next_trigger(trade_data: dict, broker: str = "oanda"):
+    """(règle, niveau, sens) de la prochaine règle du trade, ou None. sens = +1 LONG, -1 SHORT."""
+    plan = trade_tracker.plan_of(trade_data, broker)
+    trig = exit_plan.next_trigger(plan)
+    if trig is None:
+        return None
+    return trig[0], trig[1], plan["sign"]
+
+
+def _register(key):
+    doc_ref, trade_id, broker, data = _trades[key]
+    trig = next_trigger(data, broker)
+    if trig is None or (key, trig[0]) in _done:
+        return
+    rule, level, sign = trig
+    book = _up if sign > 0 else _down
+    bisect.insort(book.setdefault((broker, data["instrument"]), []), (level, next(_seq), key, rule))
+
+
+def sync(trades, broker: str = None):
+    """
+    Trades à gérer (cycle du tracker) : [(doc_ref, trade_id, broker, trade_data)]. Reconstruit les seuils,
+    ceux de `broker` seulement s'il est donné (un cycle par broker : les autres restent armés).
+    """
+    with _lock:
+        new = {(b, str(tid)): (doc_ref, tid, b, data) for doc_ref, tid, b, data in trades}
+        in_scope = lambda key: broker is None or key[0] == broker
+        for key in [k for k in _trades if in_scope(k) and k not in new]:
+            if not any(k == key for k, _ in _inflight):
+                _trades.pop(key)
+        for k in [d for d in _done if in_scope(d[0]) and d[0] not in new]:
+            _done.discard(k)
+        for key, trade in new.items():
+            if not any(k == key for k, _ in _inflight):
+                _trades[key] = trade  # un trade en cours d'action garde sa copie à jour
+        for book in (_up, _down):
+            for book_key in [k for k in book if in_scope(k)]:
+                del book[book_key]
+        for key in new:
+            if not any(k == key for k, _ in _inflight):
+                _register(key)
+
+
+def on_price(broker: str, instrument: str, price: float, inline: bool = False):
+    """Tick : déclenche les règles dont le seuil est franchi. inline=True exécute dans le thread appelant."""
+    fired = []
+    with _lock:
+        _stats["ticks"] += 1
+        up = _up.get((broker, instrument))
+        while up and up[0][0] <= price:
+            fired.append(up.pop(0))
+        down = _down.get((broker, instrument))
+        while down and down[-1][0] >= price:
+            fired.append(down.pop())
+        ready = []
+        for _level, _seq_no, key, rule in fired:
+            if (key, rule) in _inflight or (key, rule) in _done:
+                _stats["deduped"] += 1
+                continue
+            _inflight.add((key, rule))
+            ready.append((key, rule))
+        _stats["fired"] += len(ready)
+    for key, rule in ready:
+        if inline:
+            _execute(key, rule, price)
+        else:
+            _get_executor().submit(_execute, key, rule, price)
+
+
+def _execute(key, rule: str, price: float):
+    doc_ref, trade_id, broker, data = _trades[key]
+    try:
+        if not trade_tracker.is_finalized(trade_id, broker):  # sinon clôturé entre-temps (flux de transactions)
+            trade_tracker.apply_exit_rule(doc_ref, trade_id, broker, data, rule, price)
+    except Exception:
+        _stats["errors"] += 1
+    with _lock:
+        _inflight.discard((key, rule))
+        trig = next_trigger(data, broker)
+        if trig is None or trig[0] != rule:
+            # règle appliquée (trade_data mis à jour) : on arme la suivante
+            _done.add((key, rule))
+            if key in _trades:
+                _register(key)
+        # sinon échec broker : réarmée au prochain cycle du tracker, pas à chaque tick
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ACTION_WORKERS, thread_name_prefix="tick-action")
+    return _executor
+
+
+def _on_stream_price(instrument: str, bid: float, ask: float):
+    on_price("oanda", instrument, (bid + ask) / 2)
+
+
+def start():
+    price_stream.add_listener(_on_stream_price)
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "trades": len(_trades),
+            "armed": sum(len(v) for v in _up.values()) + sum(len(v) for v in _down.values()),
+            "inflight": len(_inflight),
+        }
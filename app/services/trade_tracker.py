@@ -1,22 +1,49 @@
-import math
+import copy
 import threading
 import time
-from datetime import datetime, timezone, timedelta
-import pytz
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from app.services.firebase import get_firestore
-from app.services import oanda_service, kraken_service
+from app.services import oanda_service, kraken_service, account_mirror, tick_manager, exit_plan, exit_scheduler
+from app.services import http_session, poll_pacer
 from app.services.oanda_service import DECIMALS_BY_INSTRUMENT
 from app.services.kraken_service import DECIMALS_BY_PAIR
 from app.services.log_service import log_to_firestore, log_trade_event
-from app.config.universe import UNIVERSE
+from app.services.session_calendar import calendar
+from app.config.universe import PHASE_OPENING_RANGE, PHASE_TRADING
 from app.config.instrument_map import INSTRUMENT_MAP
 
 POLL_INTERVAL = 30  # seconds
 
-_open_trades = []  # list of (doc_ref, trade_id_value, broker)
-
-# Reverse mapping: instrument -> session config
-INSTRUMENT_SESSION = {cfg["instrument"]: cfg["session"] for cfg in UNIVERSE.values()}
+# Un worker par broker (un broker lent ne retarde plus l'autre) :
+#   interval        : secondes entre deux cycles complets (etats broker, nouveaux trades) ; les prix
+#                     de chaque trade sont releves entre-temps selon sa distance a ses seuils (poll_pacer)
+#   active_interval : intervalle quand un trade suivi est sur un indice en session (matinee US)
+#   workers         : threads du pool des decisions par trade (cloture, paliers, seuils au prix)
+#   budget_s        : latence max d'un cycle ; au-dela, compte en depassement (overruns)
+BROKER_WORKERS = {
+    "oanda": {"interval": POLL_INTERVAL, "active_interval": 10, "workers": 4, "budget_s": 5.0},
+    "kraken": {"interval": POLL_INTERVAL, "workers": 2, "budget_s": 10.0},  # 24/7, pas de session
+}
+
+_open_trades = []  # list of (doc_ref, trade_id_value, broker, trade_data)
+_open_lock = threading.Lock()
+_trade_locks = {}  # (broker, trade_id) -> RLock : mises a jour d'un trade serialisees, toutes sources
+_trade_locks_lock = threading.Lock()
+_pools = {}  # broker -> ThreadPoolExecutor
+_managed = {}  # broker -> trades dont un seuil est surveille au prix (dernier cycle complet)
+_next_check = {}  # (broker, trade_id) -> time.monotonic() du prochain releve de prix
+_wake = {broker: threading.Event() for broker in BROKER_WORKERS}  # SL/TP franchi : cycle complet anticipe
+MIN_CYCLE_GAP_S = 1.0  # ecart min entre deux cycles complets anticipes
+_stats = {broker: {"cycles": 0, "overruns": 0, "errors": 0, "trades": 0, "last_ms": 0, "max_ms": 0,
+                   "checks": 0, "deferred": 0}
+          for broker in BROKER_WORKERS}
+_finalized = set()  # (broker, trade_id) deja finalises par ce process
+_finalized_lock = threading.Lock()
+_ladder_applied = set()  # (broker, trade_id, palier) deja reconcilies (paliers poses chez le broker)
+
+AUTO_CLOSE_BEFORE_END_MS = 5 * 60_000  # auto-close 5 min before the session trade_end
+WEEKEND_CLOSE_UTC = (4, 20, 55)  # Friday 20:55 UTC, 5 min before the forex weekend close
 
 # Forex instruments (from instrument_map)
 FOREX_INSTRUMENTS = {cfg["oanda"] for cfg in INSTRUMENT_MAP.values() if "oanda" in cfg}
@@ -29,14 +56,8 @@ def _get_decimals(instrument: str, broker: str) -> int:
     return DECIMALS_BY_INSTRUMENT.get(instrument, 5)
 
 
-def _get_latest_price(instrument: str, broker: str) -> float:
-    if broker == "kraken":
-        return kraken_service.get_latest_price(instrument)
-    return oanda_service.get_latest_price(instrument)
-
-
-def _load_open_trades():
-    """Load all trades with outcome == 'open' from Firestore."""
+def load_open_trades():
+    """Load all trades with outcome == 'open' from Firestore (with their data: no re-read per trade)."""
     db = get_firestore()
     trades = []
 
@@ -46,11 +67,189 @@ def _load_open_trades():
         # Use generic trade_id field, fallback to oanda_trade_id
         trade_id_val = data.get("trade_id") or data.get("oanda_trade_id")
         if trade_id_val:
-            trades.append((doc.reference, trade_id_val, broker))
+            trades.append((doc.reference, trade_id_val, broker, data))
 
     return trades
 
 
+def _fetch_trade_states(trades) -> tuple:
+    """
+    Etat broker de tous les trades suivis, un appel par broker :
+    - OANDA : miroir du compte synchronise par /changes ; les trades absents sont clotures
+      (details du miroir, ou lus via l'API si le miroir ne les a pas vus)
+    - Kraken : QueryOrders multi-txid
+    Retourne ({trade_id: details} des trades clotures, {trade_id} dont l'etat est inconnu ce cycle).
+    """
+    closed, unknown = {}, set()
+    oanda_ids = [str(tid) for _, tid, broker, _ in trades if broker != "kraken"]
+    kraken_ids = [str(tid) for _, tid, broker, _ in trades if broker == "kraken"]
+
+    if oanda_ids:
+        try:
+            account_mirror.sync()
+            open_ids = account_mirror.trade_ids()
+        except Exception as e:
+            log_to_firestore(f"[TradeTracker] Error syncing OANDA account: {e}", level="ERROR")
+            open_ids = None
+            unknown.update(oanda_ids)
+        if open_ids is not None:
+            for tid in oanda_ids:
+                if tid in open_ids:
+                    continue
+                try:
+                    details = account_mirror.closed_trade(tid) or oanda_service.get_trade_details(tid)
+                except Exception as e:
+                    log_to_firestore(f"[TradeTracker] Error fetching trade {tid} [oanda]: {e}", level="ERROR")
+                    unknown.add(tid)
+                    continue
+                if details["state"] == "CLOSED":
+                    closed[tid] = details
+
+    if kraken_ids:
+        try:
+            for tid, details in kraken_service.get_trades_details(kraken_ids).items():
+                if details["state"] == "CLOSED":
+                    closed[tid] = details
+        except Exception as e:
+            log_to_firestore(f"[TradeTracker] Error fetching Kraken orders: {e}", level="ERROR")
+            unknown.update(kraken_ids)
+
+    return closed, unknown
+
+
+def _fetch_prices(trades) -> dict:
+    """Prix courants en un appel par broker -> {(broker, instrument): prix}."""
+    by_broker = {}
+    for _, _, broker, data in trades:
+        by_broker.setdefault(broker, set()).add(data.get("instrument"))
+    prices = {}
+    for broker, instruments in by_broker.items():
+        try:
+            service = kraken_service if broker == "kraken" else oanda_service
+            for instrument, price in service.get_latest_prices(sorted(instruments)).items():
+                prices[(broker, instrument)] = price
+        except Exception as e:
+            log_to_firestore(f"[TradeTracker] Price fetch error [{broker}]: {e}", level="ERROR")
+    return prices
+
+
+def _needs_price(trade_data: dict) -> bool:
+    """Un seuil du plan de sortie est surveille au prix (paliers poses chez le broker exclus)."""
+    if not trade_data.get("instrument"):
+        return False
+    return exit_plan.next_trigger(plan_of(trade_data, trade_data.get("broker", "oanda"))) is not None
+
+
+def _pending_rungs(trade_data: dict) -> list:
+    """Paliers poses chez le broker (ordre en attente), [(index, palier)]."""
+    plan = trade_data.get("exit_plan") or {}
+    return [(i, rung) for i, rung in enumerate(plan.get("rungs", []))
+            if rung.get("order_id") and rung["state"] == "pending"]
+
+
+def _unseen_rung_state(trade_id_val, trade_data: dict, index: int):
+    """Ordre OANDA jamais vu par le miroir (snapshot posterieur) : deduit des units restantes du trade."""
+    units = account_mirror.trade_units(trade_id_val)
+    if units is None:
+        return None
+    rungs = trade_data["exit_plan"]["rungs"]
+    expected = abs(float(trade_data.get("initial_units", 0))) - sum(float(r["units"]) for r in rungs[:index + 1])
+    return "FILLED" if abs(units) <= expected + 1e-9 else "CANCELLED"
+
+
+def _fetch_ladder_fills(trades) -> dict:
+    """
+    Paliers de take-profit poses chez le broker sortis du carnet depuis le dernier cycle
+    (OANDA : miroir deja synchronise ; Kraken : un QueryOrders pour tous les paliers).
+    Retourne {(broker, trade_id): [(index, "FILLED" | "CANCELLED", prix ou None)]}.
+    """
+    events, kraken_rungs = {}, {}
+    for _, tid, broker, data in trades:
+        for i, rung in _pending_rungs(data):
+            key = (broker, str(tid))
+            if broker == "kraken":
+                kraken_rungs[str(rung["order_id"])] = (key, i)
+                continue
+            state, price = account_mirror.order_state(rung["order_id"])
+            if state is None:
+                state = _unseen_rung_state(tid, data, i)
+            if state in ("FILLED", "CANCELLED"):
+                events.setdefault(key, []).append((i, state, price))
+
+    if kraken_rungs:
+        try:
+            for txid, status in kraken_service.get_orders_status(list(kraken_rungs)).items():
+                key, i = kraken_rungs[txid]
+                if status["status"] == "closed":
+                    events.setdefault(key, []).append((i, "FILLED", status.get("price")))
+                elif status["status"] in ("canceled", "expired"):
+                    events.setdefault(key, []).append((i, "CANCELLED", None))
+        except Exception as e:
+            log_to_firestore(f"[TradeTracker] Error fetching Kraken ladder orders: {e}", level="ERROR")
+    return events
+
+
+def _claim(trade_id_val, broker: str) -> bool:
+    """Reserve la finalisation d'un trade (poll loop, flux de transactions, auto/force close) : une seule gagne."""
+    key = (broker, str(trade_id_val))
+    with _finalized_lock:
+        if key in _finalized:
+            return False
+        _finalized.add(key)
+        return True
+
+
+def _release(trade_id_val, broker: str):
+    with _finalized_lock:
+        _finalized.discard((broker, str(trade_id_val)))
+
+
+def is_finalized(trade_id_val, broker: str = "oanda") -> bool:
+    """True si la cloture du trade a deja ete finalisee (ou est en cours) dans ce process."""
+    with _finalized_lock:
+        return (broker, str(trade_id_val)) in _finalized
+
+
+def trade_lock(trade_id_val, broker: str) -> threading.RLock:
+    """
+    Verrou d'un trade : cycle du tracker, tick manager, flux de transactions et clotures a heure fixe
+    ne modifient jamais le meme trade en parallele. Reentrant (finalisation appelee sous le verrou).
+    """
+    key = (broker, str(trade_id_val))
+    with _trade_locks_lock:
+        lock = _trade_locks.get(key)
+        if lock is None:
+            lock = _trade_locks[key] = threading.RLock()
+        return lock
+
+
+def find_open_trade(trade_id_val, broker: str = "oanda"):
+    """(doc_ref, trade_data) d'un trade suivi encore ouvert, ou (None, None)."""
+    for doc_ref, tid, b, _data in list(_open_trades):
+        if b == broker and str(tid) == str(trade_id_val):
+            data = doc_ref.get().to_dict() or {}
+            return (doc_ref, data) if data.get("outcome") == "open" else (None, None)
+    field = "trade_id" if broker == "kraken" else "oanda_trade_id"
+    for doc in get_firestore().collection_group("trades").where(field, "==", str(trade_id_val)).stream():
+        data = doc.to_dict() or {}
+        if data.get("outcome") == "open":
+            return doc.reference, data
+    return None, None
+
+
+def finalize_closed(doc_ref, trade_id_val: str, trade_data: dict, details: dict, broker: str) -> bool:
+    """Finalise un trade clos cote broker, une seule fois quelle que soit la source. True si ecrit."""
+    with trade_lock(trade_id_val, broker):
+        if not _claim(trade_id_val, broker):
+            return False
+        try:
+            _finalize_closed(doc_ref, trade_id_val, trade_data, details, broker)
+        except Exception:
+            _release(trade_id_val, broker)
+            raise
+        return True
+
+
 def _determine_outcome(realized_pl: float) -> str:
     if realized_pl > 0:
         return "win"
@@ -61,14 +260,11 @@ def _determine_outcome(realized_pl: float) -> str:
 
 def _should_auto_close(instrument: str) -> bool:
     """Return True if we are within 5 minutes of the session trade_end for this instrument."""
-    session = INSTRUMENT_SESSION.get(instrument)
-    if not session:
+    sym = calendar.symbol_for_instrument(instrument)
+    if not sym:
         return False
-    tz = pytz.timezone(session.get("tz", "America/New_York"))
-    now_local = datetime.now(timezone.utc).astimezone(tz)
-    th, tm = map(int, session.get("trade_end", "11:30").split(":"))
-    trade_end = now_local.replace(hour=th, minute=tm, second=0, microsecond=0)
-    return now_local >= trade_end - timedelta(minutes=5)
+    now_ms = int(time.time() * 1000)
+    return now_ms >= calendar.bounds(sym, now_ms).trade_end_ms - AUTO_CLOSE_BEFORE_END_MS
 
 
 def _should_close_before_weekend(instrument: str, broker: str) -> bool:
@@ -78,8 +274,8 @@ def _should_close_before_weekend(instrument: str, broker: str) -> bool:
     if instrument not in FOREX_INSTRUMENTS:
         return False
     now_utc = datetime.now(timezone.utc)
-    # Friday = 4, close at 20:55 UTC (5 min before market close)
-    return now_utc.weekday() == 4 and now_utc.hour >= 20 and now_utc.minute >= 55
+    weekday, hour, minute = WEEKEND_CLOSE_UTC
+    return now_utc.weekday() == weekday and (now_utc.hour, now_utc.minute) >= (hour, minute)
 
 
 def _close_trade_broker(trade_id_val: str, trade_data: dict, broker: str, units=None):
@@ -99,11 +295,30 @@ def _modify_sl_broker(trade_id_val: str, new_sl: float, instrument: str, broker:
     return oanda_service.modify_trade_sl(trade_id_val, new_sl, instrument)
 
 
-def _get_trade_details_broker(trade_id_val: str, broker: str):
-    """Get trade details via the appropriate broker."""
+def _cancel_order_broker(order_id: str, broker: str):
+    """Cancel a pending order via the appropriate broker."""
     if broker == "kraken":
-        return kraken_service.get_trade_details(trade_id_val)
-    return oanda_service.get_trade_details(trade_id_val)
+        return kraken_service.cancel_order(order_id)
+    return oanda_service.cancel_order(order_id)
+
+
+def _cancel_ladder(trade_id_val: str, trade_data: dict, broker: str):
+    """Trade clos : annule les paliers encore en attente chez le broker (ils reduiraient une autre position)."""
+    for i, rung in _pending_rungs(trade_data):
+        try:
+            _cancel_order_broker(rung["order_id"], broker)
+        except Exception as e:
+            log_to_firestore(f"[TradeTracker] Palier {rung['order_id']} du trade {trade_id_val} "
+                             f"non annule (deja sorti du carnet ?): {e}", level="INFO")
+    with _finalized_lock:
+        for key in [k for k in _ladder_applied if k[:2] == (broker, str(trade_id_val))]:
+            _ladder_applied.discard(key)
+
+
+def _on_closed(trade_id_val: str, trade_data: dict, broker: str):
+    """Trade clos (quelle que soit la source) : paliers broker et jobs de cloture a heure fixe annules."""
+    _cancel_ladder(trade_id_val, trade_data, broker)
+    exit_scheduler.cancel(trade_id_val, broker)
 
 
 def _auto_close_trade(doc_ref, trade_id_val: str, trade_data: dict, broker: str) -> bool:
@@ -115,394 +330,610 @@ def _auto_close_trade(doc_ref, trade_id_val: str, trade_data: dict, broker: str)
         return False  # No auto-close for crypto
     if not _should_auto_close(instrument) and not _should_close_before_weekend(instrument, broker):
         return False
+    return auto_close_now(doc_ref, trade_id_val, trade_data, broker)
 
-    try:
-        response = _close_trade_broker(trade_id_val, trade_data, broker)
-        realized_pl = 0.0
-        try:
-            fill_tx = response.get("orderFillTransaction", {})
-            realized_pl = float(fill_tx.get("pl", 0))
-        except Exception:
-            pass
-
-        doc_ref.update({
-            "outcome": "auto_closed",
-            "realized_pnl": realized_pl,
-            "close_time": datetime.now().isoformat(),
-        })
-
-        log_trade_event(doc_ref, "AUTO_CLOSED", f"Trade auto-cloture avant fin de session (PnL: {realized_pl})", {
-            "outcome": "auto_closed",
-            "realized_pnl": realized_pl,
-            "instrument": instrument,
-        })
-
-        log_to_firestore(
-            f"[TradeTracker] Trade {trade_id_val} auto-closed: PnL={realized_pl}",
-            level="TRADING"
-        )
-        return True
-    except Exception as e:
-        log_to_firestore(
-            f"[TradeTracker] Auto-close error on trade {trade_id_val}: {e}",
-            level="ERROR"
-        )
-        return False
 
+def auto_close_now(doc_ref, trade_id_val: str, trade_data: dict, broker: str) -> bool:
+    """Session-end / weekend close without the clock check (exact-time scheduler jobs). Returns True if closed."""
+    with trade_lock(trade_id_val, broker):
+        instrument = trade_data.get("instrument")
+        if not _claim(trade_id_val, broker):
+            return True  # deja finalise (flux de transactions)
 
-def _force_close_trade(doc_ref, trade_id_val: str, trade_data: dict, reason: str, broker: str) -> bool:
-    """Force close a trade (e.g. max hold time expired). Returns True if closed."""
-    try:
-        response = _close_trade_broker(trade_id_val, trade_data, broker)
-        realized_pl = 0.0
-        if broker == "oanda":
+        try:
+            response = _close_trade_broker(trade_id_val, trade_data, broker)
+            _on_closed(trade_id_val, trade_data, broker)
+            realized_pl = 0.0
             try:
                 fill_tx = response.get("orderFillTransaction", {})
                 realized_pl = float(fill_tx.get("pl", 0))
             except Exception:
                 pass
 
-        doc_ref.update({
-            "outcome": reason,
-            "realized_pnl": realized_pl,
-            "close_time": datetime.now().isoformat(),
-        })
-
-        instrument = trade_data.get("instrument", "unknown")
-        log_trade_event(doc_ref, "FORCE_CLOSED", f"Trade force-closed: {reason} (PnL: {realized_pl})", {
-            "outcome": reason,
-            "realized_pnl": realized_pl,
-            "instrument": instrument,
-        })
-
-        log_to_firestore(
-            f"[TradeTracker] Trade {trade_id_val} force-closed ({reason}): PnL={realized_pl}",
-            level="TRADING"
-        )
-        return True
-    except Exception as e:
-        log_to_firestore(
-            f"[TradeTracker] Force-close error on trade {trade_id_val}: {e}",
-            level="ERROR"
-        )
-        return False
-
-
-def _get_be_offset(instrument: str, broker: str) -> float:
-    """Return a small price offset for breakeven SL, ensuring a tiny locked-in profit."""
-    decimals = _get_decimals(instrument, broker)
-    # CFDs (1-2 decimals): 0.1, JPY pairs (3 decimals): 0.01, other forex (5 decimals): 0.0001
-    offsets = {1: 0.1, 2: 0.1, 3: 0.01, 5: 0.0001}
-    return offsets.get(decimals, 10 ** -(decimals))
-
-
-def _check_breakeven(doc_ref, trade_id_val: str, broker: str):
-    """Move SL to breakeven (fill_price + small offset) when trade reaches +0.5R profit."""
-    try:
-        trade_data = doc_ref.get().to_dict()
-        if not trade_data:
-            return
-
-        if trade_data.get("breakeven_applied"):
-            return
-
-        fill_price = trade_data.get("fill_price")
-        sl = trade_data.get("sl")
-        direction = trade_data.get("direction")
-        instrument = trade_data.get("instrument")
-
-        if not all([fill_price, sl, direction, instrument]):
-            return
+            doc_ref.update({
+                "outcome": "auto_closed",
+                "realized_pnl": realized_pl,
+                "close_time": datetime.now().isoformat(),
+            })
 
-        fill_price = float(fill_price)
-        sl = float(sl)
-        risk = abs(fill_price - sl)
-        if risk == 0:
-            return
+            log_trade_event(doc_ref, "AUTO_CLOSED", f"Trade auto-cloture avant fin de session (PnL: {realized_pl})", {
+                "outcome": "auto_closed",
+                "realized_pnl": realized_pl,
+                "instrument": instrument,
+            })
 
-        current_price = _get_latest_price(instrument, broker)
+            log_to_firestore(
+                f"[TradeTracker] Trade {trade_id_val} auto-closed: PnL={realized_pl}",
+                level="TRADING"
+            )
+            return True
+        except Exception as e:
+            _release(trade_id_val, broker)
+            log_to_firestore(
+                f"[TradeTracker] Auto-close error on trade {trade_id_val}: {e}",
+                level="ERROR"
+            )
+            return False
 
-        if direction == "LONG":
-            profit = current_price - fill_price
-        else:
-            profit = fill_price - current_price
 
-        if profit >= risk * 0.5:
-            offset = _get_be_offset(instrument, broker)
-            if direction == "LONG":
-                be_price = fill_price + offset
-            else:
-                be_price = fill_price - offset
+def force_close_trade(doc_ref, trade_id_val: str, trade_data: dict, reason: str, broker: str) -> bool:
+    """Force close a trade (e.g. max hold time expired). Returns True if closed."""
+    with trade_lock(trade_id_val, broker):
+        if not _claim(trade_id_val, broker):
+            return True  # deja finalise (flux de transactions)
+        try:
+            response = _close_trade_broker(trade_id_val, trade_data, broker)
+            _on_closed(trade_id_val, trade_data, broker)
+            realized_pl = 0.0
+            if broker == "oanda":
+                try:
+                    fill_tx = response.get("orderFillTransaction", {})
+                    realized_pl = float(fill_tx.get("pl", 0))
+                except Exception:
+                    pass
 
-            _modify_sl_broker(trade_id_val, be_price, instrument, broker)
             doc_ref.update({
-                "breakeven_applied": True,
-                "sl_original": sl,
-                "sl": be_price,
+                "outcome": reason,
+                "realized_pnl": realized_pl,
+                "close_time": datetime.now().isoformat(),
             })
-            log_trade_event(doc_ref, "BREAKEVEN", f"SL deplace au breakeven: {sl} -> {be_price}", {
-                "sl_original": sl,
-                "sl_new": be_price,
-                "profit_at_trigger": round(profit, 2),
-                "risk": round(risk, 2),
+
+            instrument = trade_data.get("instrument", "unknown")
+            log_trade_event(doc_ref, "FORCE_CLOSED", f"Trade force-closed: {reason} (PnL: {realized_pl})", {
+                "outcome": reason,
+                "realized_pnl": realized_pl,
+                "instrument": instrument,
             })
+
             log_to_firestore(
-                f"[TradeTracker] Breakeven applied on trade {trade_id_val}: "
-                f"SL moved from {sl} to {be_price} (profit={profit:.2f}, risk={risk:.2f})",
+                f"[TradeTracker] Trade {trade_id_val} force-closed ({reason}): PnL={realized_pl}",
                 level="TRADING"
             )
-    except Exception as e:
-        log_to_firestore(
-            f"[TradeTracker] Breakeven check error on trade {trade_id_val}: {e}",
-            level="ERROR"
-        )
+            return True
+        except Exception as e:
+            _release(trade_id_val, broker)
+            log_to_firestore(
+                f"[TradeTracker] Force-close error on trade {trade_id_val}: {e}",
+                level="ERROR"
+            )
+            return False
 
 
-def _check_scaling_out(doc_ref, trade_id_val: str, trade_data: dict, broker: str):
-    """Scaling-out for ichimoku: TP1=1R (close 50%), TP2=2R (close 25%), TP3=6R (broker TP)."""
-    try:
-        scaling_step = trade_data.get("scaling_step", 0)
-        if scaling_step >= 2:
-            return  # TP1+TP2 done; TP3 (6R) handled by broker TP
+def _get_be_offset(instrument: str, broker: str) -> float:
+    """Return a small price offset for breakeven SL, ensuring a tiny locked-in profit."""
+    return exit_plan.be_offset(_get_decimals(instrument, broker))
 
-        fill_price = float(trade_data.get("fill_price", 0))
-        risk_r = float(trade_data.get("risk_r", 0))
-        direction = trade_data.get("direction")
-        instrument = trade_data.get("instrument")
-        initial_units = abs(float(trade_data.get("initial_units", 0)))
-        step = float(trade_data.get("step", 1))
-        decimals = _get_decimals(instrument, broker)
 
-        if not all([fill_price, risk_r, direction, instrument, initial_units]):
-            return
+def plan_of(trade_data: dict, broker: str = "oanda"):
+    """Plan de sortie du trade (compile a l'entree), ou son equivalent pour un trade d'avant les plans."""
+    plan = trade_data.get("exit_plan")
+    if plan:
+        return plan
+    instrument = trade_data.get("instrument")
+    if not instrument:
+        return None
+    return exit_plan.legacy_plan(trade_data, _get_be_offset(instrument, broker))
+
+
+def partially_closed(trade_data: dict) -> bool:
+    """Au moins un palier a deja ferme des units (PnL / prix moyen de cloture a relire chez le broker)."""
+    return bool(exit_plan.closed_rungs(plan_of(trade_data, trade_data.get("broker", "oanda"))))
+
+
+def _move_stop(trade_id_val: str, trade_data: dict, broker: str, stop_price):
+    """Deplace le SL vers `stop_price` s'il le resserre. Retourne le nouveau SL, ou None."""
+    if stop_price is None:
+        return None
+    instrument = trade_data["instrument"]
+    sign = 1 if trade_data.get("direction") == "LONG" else -1
+    sl = trade_data.get("sl")
+    if sl is not None and sign * (stop_price - float(sl)) <= 0:
+        return None
+    new_sl = round(stop_price, _get_decimals(instrument, broker))
+    _modify_sl_broker(trade_id_val, new_sl, instrument, broker)
+    return new_sl
+
+
+def _complete_rung(doc_ref, trade_id_val: str, broker: str, trade_data: dict, plan: dict, index: int, fill_price=None):
+    """
+    Palier `index` execute (cloture par le tracker ou ordre broker rempli) : SL deplace,
+    fill / slippage sur le palier, `done` avance. `plan` est une copie, ecrite sur le document.
+    """
+    rung = plan["rungs"][index]
+    instrument = trade_data["instrument"]
+    decimals = _get_decimals(instrument, broker)
+    for skipped in plan["rungs"][plan["done"]:index]:
+        if skipped["state"] == "pending":
+            skipped["state"] = "skipped"  # ordre broker rempli dans un gap avant un palier du tracker
 
-        current_price = _get_latest_price(instrument, broker)
+    try:
+        new_sl = _move_stop(trade_id_val, trade_data, broker, rung.get("stop_price"))
+    except Exception as e:
+        # les units sont deja fermees : on enregistre le palier, le SL reste en place
+        new_sl = None
+        log_to_firestore(f"[TradeTracker] SL move failed on trade {trade_id_val} (palier {index + 1}): {e}",
+                         level="ERROR")
+
+    rung["state"] = "filled"
+    rung["time"] = datetime.now(timezone.utc).isoformat()
+    if fill_price:
+        rung["fill_price"] = float(fill_price)
+        rung["slippage"] = round(float(fill_price) - rung["level"], decimals)
+    plan["done"] = max(plan["done"], index + 1)
+
+    update = {"exit_plan": plan}
+    if new_sl is not None:
+        update["sl"] = new_sl
+        if rung.get("stop") == "be" and not trade_data.get("breakeven_applied"):
+            update.update({"breakeven_applied": True, "sl_original": trade_data.get("sl")})
+    doc_ref.update(update)
+    trade_data.update(update)  # copie en memoire (tick manager : regle suivante)
+
+    slip_str = f" (slippage: {rung['slippage']})" if rung.get("slippage") else ""
+    price_str = f" @ {rung['fill_price']}" if rung.get("fill_price") else ""
+    units_str = f"{rung['units']} units fermees" if rung["units"] else "aucune unit fermee"
+    sl_str = f", SL -> {new_sl}" if new_sl is not None else ""
+    log_trade_event(doc_ref, "EXIT_RUNG",
+        f"Palier {index + 1}/{len(plan['rungs'])} ({rung['r']}R, niveau {rung['level']:.{decimals}f})"
+        f"{price_str}{slip_str}: {units_str}{sl_str}", {
+            "plan": plan.get("name"),
+            "rung": index + 1,
+            "r": rung["r"],
+            "units_closed": rung["units"],
+            "fill_price": rung.get("fill_price"),
+            "expected_price": round(rung["level"], decimals),
+            "slippage": rung.get("slippage"),
+            "sl_new": new_sl,
+            "order_id": rung.get("order_id"),
+        })
+    log_to_firestore(
+        f"[TradeTracker] Exit rung {index + 1} ({rung['r']}R) on {trade_id_val}{price_str}{slip_str}: "
+        f"{units_str}{sl_str}",
+        level="TRADING"
+    )
+
+
+def _apply_trail(doc_ref, trade_id_val: str, broker: str, trade_data: dict, plan: dict, current_price: float):
+    """Cran du trailing stop : stop = prix - distance (s'il resserre), nouveau point d'ancrage."""
+    trailing = plan["trailing"]
+    new_sl = _move_stop(trade_id_val, trade_data, broker, exit_plan.trail_stop(plan, current_price))
+    trailing["anchor"] = current_price
+    trailing["moves"] += 1
+    update = {"exit_plan": plan}
+    if new_sl is not None:
+        update["sl"] = new_sl
+    doc_ref.update(update)
+    trade_data.update(update)
+    if new_sl is not None:
+        log_trade_event(doc_ref, "TRAILING_STOP", f"Trailing {trailing['type']}: SL -> {new_sl} (prix {current_price})", {
+            "sl_new": new_sl,
+            "price": current_price,
+            "distance": trailing["dist"],
+        })
+        log_to_firestore(f"[TradeTracker] Trailing stop on {trade_id_val}: SL -> {new_sl}", level="TRADING")
 
-        if direction == "LONG":
-            profit = current_price - fill_price
-        else:
-            profit = fill_price - current_price
 
-        profit_r = profit / risk_r if risk_r else 0
+def apply_exit_rule(doc_ref, trade_id_val: str, broker: str, trade_data: dict, rule: str, current_price: float):
+    """Execute la regle `rule` du plan (palier "rung<i>" ou cran "trail<n>") si son seuil est atteint."""
+    with trade_lock(trade_id_val, broker):
+        try:
+            plan = copy.deepcopy(plan_of(trade_data, broker))
+            trig = exit_plan.next_trigger(plan)
+            if trig is None or trig[0] != rule or plan["sign"] * (current_price - trig[1]) < 0:
+                return  # regle perimee (document a jour entre-temps) ou seuil non atteint
+
+            if rule.startswith("trail"):
+                _apply_trail(doc_ref, trade_id_val, broker, trade_data, plan, current_price)
+                return
+
+            index = plan["done"]
+            rung = plan["rungs"][index]
+            fill_price = None
+            if rung["units"]:
+                close_resp = _close_trade_broker(trade_id_val, trade_data, broker, units=rung["units"])
+                if broker == "oanda":
+                    fill_price = float(close_resp.get("orderFillTransaction", {}).get("price", 0)) or None
+                else:
+                    fill_price = current_price  # Kraken doesn't return fill price in same format
+            _complete_rung(doc_ref, trade_id_val, broker, trade_data, plan, index, fill_price)
+        except Exception as e:
+            log_to_firestore(
+                f"[TradeTracker] Exit rule {rule} error on trade {trade_id_val}: {e}",
+                level="ERROR"
+            )
 
-        if profit_r >= 1.0 and scaling_step == 0:
-            # TP1: close 50%, SL -> breakeven
-            units_to_close = round(max(math.floor(initial_units * 0.5 / step) * step, step), 4)
-            expected_tp1 = fill_price + risk_r if direction == "LONG" else fill_price - risk_r
 
-            close_resp = _close_trade_broker(trade_id_val, trade_data, broker, units=units_to_close)
-            actual_price = 0
-            if broker == "oanda":
-                actual_price = float(close_resp.get("orderFillTransaction", {}).get("price", 0))
-            else:
-                actual_price = current_price  # Kraken doesn't return fill price in same format
-            slippage = round(actual_price - expected_tp1, decimals) if actual_price else None
+def apply_ladder_fill(doc_ref, trade_id_val: str, trade_data: dict, broker: str, index: int, fill_price=None) -> bool:
+    """
+    Palier `index` pose chez le broker et rempli : meme enregistrement qu'un palier du tracker
+    (SL deplace, fill / slippage). Une seule fois par palier. True si applique.
+    """
+    with trade_lock(trade_id_val, broker):
+        key = (broker, str(trade_id_val), index)
+        with _finalized_lock:
+            if key in _ladder_applied:
+                return False
+            _ladder_applied.add(key)
+        try:
+            plan = copy.deepcopy(trade_data["exit_plan"])
+            rung = plan["rungs"][index]
+            if rung.get("state") != "pending":
+                return False
+            # LIMIT / take-profit : execute au prix demande ou mieux ; prix exact quand le broker le donne
+            _complete_rung(doc_ref, trade_id_val, broker, trade_data, plan, index, fill_price or rung["level"])
+            return True
+        except Exception as e:
+            with _finalized_lock:
+                _ladder_applied.discard(key)
+            log_to_firestore(f"[TradeTracker] Ladder reconcile error on trade {trade_id_val}: {e}", level="ERROR")
+            return False
+
+
+def _ladder_fallback(doc_ref, trade_id_val: str, trade_data: dict, broker: str, index: int):
+    """Palier annule par le broker : les paliers restants repassent au tracker (seuils au prix)."""
+    _cancel_ladder(trade_id_val, trade_data, broker)
+    plan = copy.deepcopy(trade_data["exit_plan"])
+    for rung in plan["rungs"]:
+        if rung["state"] == "pending":
+            rung.pop("order_id", None)
+    update = {"exit_plan": plan}
+    doc_ref.update(update)
+    trade_data.update(update)
+    log_to_firestore(
+        f"[TradeTracker] Ladder rung {index + 1} annule par le broker sur {trade_id_val}: paliers repris par le tracker",
+        level="ERROR"
+    )
+
+
+def _reconcile_ladder(doc_ref, trade_id_val: str, trade_data: dict, broker: str, events: list):
+    for index, state, price in sorted(events, key=lambda e: e[0]):
+        if state == "FILLED":
+            if not apply_ladder_fill(doc_ref, trade_id_val, trade_data, broker, index, price):
+                break  # erreur broker : reprise au cycle suivant, dans l'ordre des paliers
+        else:
+            _ladder_fallback(doc_ref, trade_id_val, trade_data, broker, index)
+            break
 
-            offset = _get_be_offset(instrument, broker)
-            be_price = fill_price + offset if direction == "LONG" else fill_price - offset
-            _modify_sl_broker(trade_id_val, be_price, instrument, broker)
 
-            doc_ref.update({
-                "scaling_step": 1,
-                "sl": be_price,
-                "sl_original": trade_data.get("sl"),
-                "breakeven_applied": True,
-                "tp1_fill_price": actual_price or None,
-                "tp1_slippage": slippage,
-            })
+def reconcile_ladder_fill(trade_id_val, order_id, fill_price=None, broker: str = "oanda") -> bool:
+    """Fill d'un ordre vu par le flux de transactions : applique le palier correspondant s'il en est un."""
+    doc_ref, trade_data = find_open_trade(trade_id_val, broker)
+    if doc_ref is None:
+        return False
+    for index, rung in _pending_rungs(trade_data):
+        if str(rung.get("order_id")) == str(order_id):
+            return apply_ladder_fill(doc_ref, trade_id_val, trade_data, broker, index, fill_price)
+    return False
 
-            slip_str = f" (slippage: {slippage})" if slippage else ""
-            log_trade_event(doc_ref, "SCALING_TP1",
-                f"TP1 @ {actual_price} (attendu {expected_tp1:.{decimals}f}){slip_str}: "
-                f"{units_to_close} units fermees, SL -> {be_price}", {
-                    "units_closed": units_to_close,
-                    "fill_price": actual_price,
-                    "expected_price": round(expected_tp1, decimals),
-                    "slippage": slippage,
-                    "sl_new": be_price,
-                    "profit_r": round(profit_r, 2),
-                })
-            log_to_firestore(
-                f"[TradeTracker] Scaling TP1 on {trade_id_val}: "
-                f"@ {actual_price}{slip_str}, {units_to_close}/{initial_units} units, SL -> {be_price}",
-                level="TRADING"
-            )
 
-        elif profit_r >= 2.0 and scaling_step == 1:
-            # TP2: close 25% of original, SL -> +1R
-            units_to_close = round(max(math.floor(initial_units * 0.25 / step) * step, step), 4)
-            expected_tp2 = fill_price + 2 * risk_r if direction == "LONG" else fill_price - 2 * risk_r
+def _stop_in_profit(trade_data: dict, plan: dict) -> bool:
+    """SL courant au breakeven ou mieux par rapport au fill d'entree."""
+    try:
+        return plan["sign"] * (float(trade_data["sl"]) - float(plan["fill"])) >= 0
+    except (KeyError, TypeError, ValueError):
+        return False
 
-            close_resp = _close_trade_broker(trade_id_val, trade_data, broker, units=units_to_close)
-            actual_price = 0
-            if broker == "oanda":
-                actual_price = float(close_resp.get("orderFillTransaction", {}).get("price", 0))
-            else:
-                actual_price = current_price
-            slippage = round(actual_price - expected_tp2, decimals) if actual_price else None
 
-            if direction == "LONG":
-                new_sl = fill_price + risk_r
-            else:
-                new_sl = fill_price - risk_r
-            _modify_sl_broker(trade_id_val, new_sl, instrument, broker)
+def _scaled_close_reason(plan: dict, rungs_closed: int, tp_filled: bool) -> str:
+    """Raison de cloture apres paliers : libelles historiques pour scaling_3 (dashboard, stats)."""
+    rungs = [{k: r[k] for k in ("r", "fraction", "stop")} for r in plan["rungs"]]
+    if rungs == exit_plan.DEFAULT_PLANS["scaling_3"]["rungs"]:
+        if rungs_closed >= 2:
+            return "TP3" if tp_filled else "SL +1R (apres TP2)"
+        return "TP (apres TP1)" if tp_filled else "BE SL (apres TP1)"
+    return f"TP (apres TP{rungs_closed})" if tp_filled else f"SL (apres TP{rungs_closed})"
+
+
+def _finalize_closed(doc_ref, trade_id_val: str, trade_data: dict, details: dict, broker: str):
+    """Trade clos cote broker : outcome, raison, prix et slippage de cloture sur le document."""
+    _on_closed(trade_id_val, trade_data, broker)
+    realized_pl = float(details["realizedPL"])
+    plan = plan_of(trade_data, broker)
+    rungs_closed = len(exit_plan.closed_rungs(plan))
+    tp_filled = details.get("tp_filled", False)
+    sl_filled = details.get("sl_filled", False)
+    close_price = float(details["averageClosePrice"]) if details.get("averageClosePrice") else None
+    instrument = trade_data.get("instrument")
+    decimals = _get_decimals(instrument, broker) if instrument else 5
+
+    # Determine expected close price & slippage
+    if tp_filled:
+        expected_price = float(trade_data.get("tp", 0))
+    elif sl_filled:
+        expected_price = float(trade_data.get("sl", 0))
+    else:
+        expected_price = None
+    slippage = round(close_price - expected_price, decimals) if (close_price and expected_price) else None
+
+    if rungs_closed:
+        # gagnant si TP, ou SL final au-dela de l'entree ; sinon (plan sans deplacement du stop) selon le PnL
+        if tp_filled or (sl_filled and _stop_in_profit(trade_data, plan)):
+            outcome = "win"
+        else:
+            outcome = _determine_outcome(realized_pl)
+        close_reason = _scaled_close_reason(plan, rungs_closed, tp_filled)
+    elif trade_data.get("breakeven_applied"):
+        if sl_filled:
+            outcome = "breakeven"
+            close_reason = "BE SL"
+        else:
+            outcome = _determine_outcome(realized_pl)
+            close_reason = "TP" if tp_filled else "SL"
+    else:
+        outcome = _determine_outcome(realized_pl)
+        close_reason = "TP" if tp_filled else "SL" if sl_filled else "close"
+
+    currency = "USD" if broker == "kraken" else "CHF"
+    update_data = {
+        "outcome": outcome,
+        "close_reason": close_reason,
+        "realized_pnl": realized_pl,
+        "close_time": datetime.now().isoformat(),
+    }
+    if close_price:
+        update_data["close_price"] = close_price
+    if slippage is not None:
+        update_data["close_slippage"] = slippage
+    doc_ref.update(update_data)
+
+    slip_str = f" (slippage: {slippage})" if slippage else ""
+    price_str = f" @ {close_price}" if close_price else ""
+    log_trade_event(doc_ref, "CLOSED",
+        f"Trade cloture: {close_reason}{price_str}{slip_str} — {outcome} (PnL: {realized_pl:.2f} {currency})", {
+        "outcome": outcome,
+        "close_reason": close_reason,
+        "close_price": close_price,
+        "slippage": slippage,
+        "realized_pnl": round(realized_pl, 2),
+        "instrument": instrument,
+        "direction": trade_data.get("direction"),
+        "rungs_closed": rungs_closed,
+        "breakeven_applied": trade_data.get("breakeven_applied"),
+        "broker": broker,
+    })
+
+    log_to_firestore(
+        f"[TradeTracker] Trade {trade_id_val} closed: {close_reason}{price_str}{slip_str} — {outcome} (PnL: {realized_pl:.2f})",
+        level="TRADING"
+    )
+
+
+def _process_trade(trade, closed: dict, unknown: set, ladder_events: dict) -> str:
+    """Decisions d'un trade sur les etats du cycle, sous son verrou. Retourne "closed", "open" ou "manage"."""
+    doc_ref, trade_id_val, broker, trade_data = trade
+    key = str(trade_id_val)
+    with trade_lock(trade_id_val, broker):
+        if is_finalized(key, broker):
+            return "closed"  # finalise entre-temps (flux de transactions)
+        if key in closed:
+            finalize_closed(doc_ref, trade_id_val, trade_data, closed[key], broker)
+            return "closed"
+        if key in unknown:
+            return "open"
+
+        # --- Auto-close near session end (OANDA only) ---
+        if _auto_close_trade(doc_ref, trade_id_val, trade_data, broker):
+            return "closed"
+
+        # --- Max hold time (news trading) ---
+        max_hold = trade_data.get("max_hold_until")
+        if max_hold:
+            max_hold_dt = datetime.fromisoformat(max_hold)
+            if datetime.now(timezone.utc) >= max_hold_dt:
+                force_close_trade(doc_ref, trade_id_val, trade_data, "max_hold_expired", broker)
+                return "closed"
+
+        if (broker, key) in ladder_events:
+            _reconcile_ladder(doc_ref, trade_id_val, trade_data, broker, ladder_events[(broker, key)])
+
+        return "manage" if _needs_price(trade_data) else "open"
+
+
+def _safe_process_trade(trade, closed: dict, unknown: set, ladder_events: dict) -> str:
+    try:
+        return _process_trade(trade, closed, unknown, ladder_events)
+    except Exception as e:
+        _stats[trade[2]]["errors"] += 1
+        log_to_firestore(f"[TradeTracker] Error on trade {trade[1]} [{trade[2]}]: {e}", level="ERROR")
+        return "open"  # repris au cycle suivant
 
-            doc_ref.update({
-                "scaling_step": 2,
-                "sl": new_sl,
-                "tp2_fill_price": actual_price or None,
-                "tp2_slippage": slippage,
-            })
 
-            slip_str = f" (slippage: {slippage})" if slippage else ""
-            log_trade_event(doc_ref, "SCALING_TP2",
-                f"TP2 @ {actual_price} (attendu {expected_tp2:.{decimals}f}){slip_str}: "
-                f"{units_to_close} units fermees, SL -> {new_sl}", {
-                    "units_closed": units_to_close,
-                    "fill_price": actual_price,
-                    "expected_price": round(expected_tp2, decimals),
-                    "slippage": slippage,
-                    "sl_new": new_sl,
-                    "profit_r": round(profit_r, 2),
-                })
-            log_to_firestore(
-                f"[TradeTracker] Scaling TP2 on {trade_id_val}: "
-                f"@ {actual_price}{slip_str}, {units_to_close}/{initial_units} units, SL -> {new_sl}",
-                level="TRADING"
-            )
+def _get_pool(broker: str) -> ThreadPoolExecutor:
+    pool = _pools.get(broker)
+    if pool is None:
+        pool = _pools.setdefault(broker, ThreadPoolExecutor(
+            max_workers=BROKER_WORKERS[broker]["workers"], thread_name_prefix=f"tracker-{broker}"))
+    return pool
 
-    except Exception as e:
+
+def _set_open_trades(broker: str, loaded: list, still_open: list):
+    global _open_trades
+    with _open_lock:
+        _open_trades = [t for t in _open_trades if t[2] != broker] + still_open
+    loaded_keys = {(broker, str(t[1])) for t in loaded}
+    with _trade_locks_lock:
+        for key in [k for k in _trade_locks if k[0] == broker and k not in loaded_keys]:
+            del _trade_locks[key]  # trade plus ouvert dans Firestore
+    for key in [k for k in _next_check if k[0] == broker and k not in loaded_keys]:
+        _next_check.pop(key, None)
+    # Trade clos dans Firestore : find_open_trade ne le renvoie plus, ses marques sont inutiles
+    with _finalized_lock:
+        _finalized.difference_update([k for k in _finalized if k[0] == broker and k not in loaded_keys])
+        _ladder_applied.difference_update([k for k in _ladder_applied if k[0] == broker and k[:2] not in loaded_keys])
+
+
+def _record_cycle(broker: str, elapsed_s: float, n_trades: int):
+    """Latence du cycle et depassements du budget du broker."""
+    stats = _stats[broker]
+    elapsed_ms = round(elapsed_s * 1000)
+    stats["cycles"] += 1
+    stats["trades"] = n_trades
+    stats["last_ms"] = elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    budget_s = BROKER_WORKERS[broker]["budget_s"]
+    if elapsed_s > budget_s:
+        stats["overruns"] += 1
         log_to_firestore(
-            f"[TradeTracker] Scaling check error on trade {trade_id_val}: {e}",
-            level="ERROR"
+            f"[TradeTracker] Cycle {broker} hors budget: {elapsed_ms} ms > {budget_s * 1000:.0f} ms "
+            f"({n_trades} trade(s), depassement #{stats['overruns']})",
+            level="WARN"
         )
 
 
-def _poll_loop():
-    global _open_trades
+def _run_broker_cycle(broker: str, trades: list):
+    """Cycle d'un broker : etats et prix en un appel, decisions par trade dans le pool du broker."""
+    started = time.monotonic()
+    if trades:
+        log_to_firestore(
+            f"[TradeTracker] Tracking {len(trades)} open {broker} trade(s)",
+            level="INFO"
+        )
 
+    closed, unknown = _fetch_trade_states(trades)
+    ladder_events = _fetch_ladder_fills([t for t in trades if str(t[1]) not in closed])
+
+    pool = _get_pool(broker)
+    states = list(pool.map(lambda t: _safe_process_trade(t, closed, unknown, ladder_events), trades))
+    still_open = [t for t, state in zip(trades, states) if state != "closed"]
+    to_manage = [t for t, state in zip(trades, states) if state == "manage"]
+
+    # --- Position management: exit plan rungs / trailing ---
+    # seuils armes dans le tick manager (declenches aussi par le flux de prix entre deux cycles)
+    tick_manager.sync(to_manage, broker)
+    _managed[broker] = to_manage
+    _check_prices(broker, _due(broker, to_manage))
+
+    _set_open_trades(broker, trades, still_open)
+    exit_scheduler.ensure(still_open)  # trades ouverts par un autre process / avant le demarrage
+    _record_cycle(broker, time.monotonic() - started, len(trades))
+
+
+def _due(broker: str, trades: list, now: float = None) -> list:
+    """Trades dont le prochain releve de prix est echu (jamais releve : tout de suite)."""
+    now = time.monotonic() if now is None else now
+    return [t for t in trades if _next_check.get((broker, str(t[1])), 0.0) <= now]
+
+
+def _check_prices(broker: str, trades: list):
+    """
+    Releve de prix des trades echus (un appel par broker) : seuils du tick manager, puis prochain
+    releve de chaque trade selon sa distance a ses seuils. Differe si le plafond de debit est atteint.
+    """
+    if not trades:
+        return
+    if not http_session.has_headroom(broker):
+        _stats[broker]["deferred"] += 1
+        later = time.monotonic() + poll_pacer.MIN_DELAY_S
+        for _, tid, _, _ in trades:
+            _next_check[(broker, str(tid))] = later
+        return
+
+    prices = _fetch_prices(trades)
+    now = time.monotonic()
+    for (b, instrument), price in prices.items():
+        poll_pacer.observe(b, instrument, price, now)
+    # un instrument par tache : les regles d'instruments differents s'executent en parallele
+    list(_get_pool(broker).map(
+        lambda item: tick_manager.on_price(broker, item[0][1], item[1], inline=True), prices.items()))
+
+    default, crossed = _interval(broker), False
+    for _, tid, b, data in trades:
+        price = prices.get((b, data.get("instrument")))
+        _next_check[(b, str(tid))] = now + poll_pacer.delay(data, b, price, default)
+        crossed = crossed or (price is not None and poll_pacer.crossed(data, price))
+    _stats[broker]["checks"] += 1
+    if crossed:
+        _wake[broker].set()  # SL/TP franchi : cloture a constater sans attendre le cycle complet
+
+
+def _run_cycle(broker: str = None):
+    """Un cycle du tracker pour `broker` (tous les brokers si None), sur les trades ouverts relus dans Firestore."""
+    # Reload open trades each cycle to pick up new ones
+    trades = load_open_trades()
+    for b in ([broker] if broker else list(BROKER_WORKERS)):
+        _run_broker_cycle(b, [t for t in trades if t[2] == b])
+
+
+def _interval(broker: str) -> float:
+    """Intervalle du worker : active_interval tant qu'un trade suivi du broker est sur un indice en session."""
+    cfg = BROKER_WORKERS[broker]
+    if cfg.get("active_interval"):
+        now_ms = int(time.time() * 1000)
+        for _, _, b, data in list(_open_trades):
+            sym = calendar.symbol_for_instrument(data.get("instrument")) if b == broker else None
+            if sym and calendar.phase(sym, now_ms) in (PHASE_OPENING_RANGE, PHASE_TRADING):
+                return cfg["active_interval"]
+    return cfg["interval"]
+
+
+def _next_wake(broker: str, next_full: float) -> float:
+    """Prochain reveil du worker : cycle complet, ou releve de prix du trade le plus proche d'un seuil."""
+    checks = [_next_check.get((broker, str(t[1])), 0.0) for t in _managed.get(broker, [])]
+    return min([next_full] + checks)
+
+
+def _poll_loop(broker: str):
+    wake = _wake[broker]
+    next_full = last_full = 0.0
     while True:
+        now = time.monotonic()
+        if wake.is_set():
+            wake.clear()
+            next_full = min(next_full, last_full + MIN_CYCLE_GAP_S)
         try:
-            # Reload open trades each cycle to pick up new ones
-            _open_trades = _load_open_trades()
-
-            if _open_trades:
-                log_to_firestore(
-                    f"[TradeTracker] Tracking {len(_open_trades)} open trade(s)",
-                    level="INFO"
-                )
-
-            still_open = []
-            for doc_ref, trade_id_val, broker in _open_trades:
-                try:
-                    details = _get_trade_details_broker(trade_id_val, broker)
-                except Exception as e:
-                    log_to_firestore(
-                        f"[TradeTracker] Error fetching trade {trade_id_val} [{broker}]: {e}",
-                        level="ERROR"
-                    )
-                    still_open.append((doc_ref, trade_id_val, broker))
-                    continue
-
-                if details["state"] == "CLOSED":
-                    realized_pl = float(details["realizedPL"])
-                    trade_data = doc_ref.get().to_dict() or {}
-                    scaling_step = trade_data.get("scaling_step", 0)
-                    tp_filled = details.get("tp_filled", False)
-                    sl_filled = details.get("sl_filled", False)
-                    close_price = float(details["averageClosePrice"]) if details.get("averageClosePrice") else None
-                    instrument = trade_data.get("instrument")
-                    decimals = _get_decimals(instrument, broker) if instrument else 5
-
-                    # Determine expected close price & slippage
-                    if tp_filled:
-                        expected_price = float(trade_data.get("tp", 0))
-                    elif sl_filled:
-                        expected_price = float(trade_data.get("sl", 0))
-                    else:
-                        expected_price = None
-                    slippage = round(close_price - expected_price, decimals) if (close_price and expected_price) else None
-
-                    if scaling_step >= 2:
-                        outcome = "win"
-                        close_reason = "TP3" if tp_filled else "SL +1R (apres TP2)"
-                    elif scaling_step == 1:
-                        outcome = "win"
-                        close_reason = "TP (apres TP1)" if tp_filled else "BE SL (apres TP1)"
-                    elif trade_data.get("breakeven_applied"):
-                        if sl_filled:
-                            outcome = "breakeven"
-                            close_reason = "BE SL"
-                        else:
-                            outcome = _determine_outcome(realized_pl)
-                            close_reason = "TP" if tp_filled else "SL"
-                    else:
-                        outcome = _determine_outcome(realized_pl)
-                        close_reason = "TP" if tp_filled else "SL" if sl_filled else "close"
-
-                    currency = "USD" if broker == "kraken" else "CHF"
-                    update_data = {
-                        "outcome": outcome,
-                        "close_reason": close_reason,
-                        "realized_pnl": realized_pl,
-                        "close_time": datetime.now().isoformat(),
-                    }
-                    if close_price:
-                        update_data["close_price"] = close_price
-                    if slippage is not None:
-                        update_data["close_slippage"] = slippage
-                    doc_ref.update(update_data)
-
-                    slip_str = f" (slippage: {slippage})" if slippage else ""
-                    price_str = f" @ {close_price}" if close_price else ""
-                    log_trade_event(doc_ref, "CLOSED",
-                        f"Trade cloture: {close_reason}{price_str}{slip_str} — {outcome} (PnL: {realized_pl:.2f} {currency})", {
-                        "outcome": outcome,
-                        "close_reason": close_reason,
-                        "close_price": close_price,
-                        "slippage": slippage,
-                        "realized_pnl": round(realized_pl, 2),
-                        "instrument": instrument,
-                        "direction": trade_data.get("direction"),
-                        "scaling_step": scaling_step,
-                        "breakeven_applied": trade_data.get("breakeven_applied"),
-                        "broker": broker,
-                    })
-
-                    log_to_firestore(
-                        f"[TradeTracker] Trade {trade_id_val} closed: {close_reason}{price_str}{slip_str} — {outcome} (PnL: {realized_pl:.2f})",
-                        level="TRADING"
-                    )
-                else:
-                    # --- Auto-close near session end (OANDA only) ---
-                    trade_data = doc_ref.get().to_dict() or {}
-                    if _auto_close_trade(doc_ref, trade_id_val, trade_data, broker):
-                        continue
-
-                    # --- Max hold time (news trading) ---
-                    max_hold = trade_data.get("max_hold_until")
-                    if max_hold:
-                        max_hold_dt = datetime.fromisoformat(max_hold)
-                        if datetime.now(timezone.utc) >= max_hold_dt:
-                            _force_close_trade(doc_ref, trade_id_val, trade_data, "max_hold_expired", broker)
-                            continue
-
-                    # --- Position management: scaling or breakeven ---
-                    if trade_data.get("scaling_step") is not None:
-                        _check_scaling_out(doc_ref, trade_id_val, trade_data, broker)
-                    else:
-                        _check_breakeven(doc_ref, trade_id_val, broker)
-                    still_open.append((doc_ref, trade_id_val, broker))
-
-            _open_trades = still_open
-
+            if now >= next_full:
+                # cadence mesuree depuis le debut du cycle : un cycle hors budget ne decale pas les suivants
+                last_full, next_full = now, now + _interval(broker)
+                _run_cycle(broker)
+            else:
+                _check_prices(broker, _due(broker, _managed.get(broker, []), now))
         except Exception as e:
-            log_to_firestore(f"[TradeTracker] Poll error: {e}", level="ERROR")
+            _stats[broker]["errors"] += 1
+            log_to_firestore(f"[TradeTracker] Poll error [{broker}]: {e}", level="ERROR")
 
-        time.sleep(POLL_INTERVAL)
+        wake.wait(max(0.0, _next_wake(broker, next_full) - time.monotonic()))
 
 
 def start():
-    thread = threading.Thread(target=_poll_loop, daemon=True)
-    thread.start()
-    log_to_firestore("[TradeTracker] Background tracker started", level="INFO")
+    tick_manager.start()
+    for broker in BROKER_WORKERS:
+        thread = threading.Thread(target=_poll_loop, args=(broker,), daemon=True, name=f"tracker-{broker}")
+        thread.start()
+    log_to_firestore(f"[TradeTracker] Background tracker started ({', '.join(BROKER_WORKERS)})", level="INFO")
+
+
+def get_stats() -> dict:
+    """Cycles par broker (latence, depassements du budget, prochains releves, debit) et regles armees du tick manager."""
+    brokers, now = {}, time.monotonic()
+    rate_limits = http_session.get_rate_stats()
+    for broker, cfg in BROKER_WORKERS.items():
+        brokers[broker] = {
+            **_stats[broker],
+            "interval_s": _interval(broker),
+            "budget_ms": round(cfg["budget_s"] * 1000),
+            "workers": cfg["workers"],
+            "next_check_s": {str(t[1]): round(max(0.0, _next_check.get((broker, str(t[1])), now) - now), 1)
+                             for t in _managed.get(broker, [])},
+            "rate_limit": rate_limits.get(broker),
+        }
+    return {"brokers": brokers, "tick_manager": tick_manager.get_stats()}
@@ -0,0 +1,146 @@
+# app/services/transaction_stream.py
+"""
+Consommateur (optionnel) du flux de transactions OANDA.
+
+    {OANDA_STREAM_URL}/accounts/{id}/transactions/stream
+
+Chaque ORDER_FILL qui clôture un trade (stop-loss, take-profit, clôture
+manuelle ou par le tracker) finalise le document Firestore du trade dès
+réception, avec la même logique d'outcome / slippage que la boucle de
+polling (trade_tracker.finalize_closed). La boucle reste le filet de
+sécurité : un trade n'est finalisé qu'une fois, quelle que soit la source.
+
+Pour un trade déjà réduit (palier du plan de sortie), le PnL total et le prix moyen de
+clôture viennent de get_trade_details (les fills partiels précédents ne sont
+pas dans la transaction). Le fill d'un palier de take-profit posé chez le
+broker (ordre LIMIT qui réduit le trade) est réconcilié de la même façon :
+SL déplacé dès réception. Désactivable avec OANDA_TRANSACTION_STREAM=0.
+"""
+import json
+import os
+import threading
+from app.services import oanda_service, price_stream, trade_tracker
+from app.services.http_session import backoff_delay, CONNECT_TIMEOUT
+from app.services.log_service import log_to_firestore
+
+ENABLED = os.getenv("OANDA_TRANSACTION_STREAM", "1") != "0"
+READ_TIMEOUT_S = 12.0    # heartbeat toutes les 5 s
+
+_stop = threading.Event()
+_thread = None
+_stats = {
+    "connects": 0,
+    "disconnects": 0,
+    "transactions": 0,
+    "heartbeats": 0,
+    "closures": 0,
+    "ladder_fills": 0,
+    "last_txid": None,
+    "last_error": None,
+}
+
+
+def _fill_details(trade_id: str, closed: dict, tx: dict) -> dict:
+    """Détails de clôture au format get_trade_details, depuis l'ORDER_FILL."""
+    reason = tx.get("reason")
+    return {
+        "id": trade_id,
+        "state": "CLOSED",
+        "realizedPL": closed.get("realizedPL", "0"),
+        "averageClosePrice": closed.get("price") or tx.get("price"),
+        "sl_filled": reason == "STOP_LOSS_ORDER",
+        "tp_filled": reason == "TAKE_PROFIT_ORDER",
+    }
+
+
+def handle_transaction(tx: dict):
+    _stats["transactions"] += 1
+    _stats["last_txid"] = tx.get("id", _stats["last_txid"])
+    if tx.get("type") != "ORDER_FILL":
+        return
+    reduced = tx.get("tradeReduced")
+    if reduced and tx.get("reason") == "LIMIT_ORDER" and tx.get("orderID"):
+        trade_id = str(reduced["tradeID"])
+        try:
+            if trade_tracker.reconcile_ladder_fill(trade_id, tx["orderID"], reduced.get("price") or tx.get("price")):
+                _stats["ladder_fills"] += 1
+        except Exception as e:
+            log_to_firestore(f"[TxStream] Palier du trade {trade_id} non reconcilie (reprise par le polling): {e}",
+                             level="ERROR")
+    for closed in tx.get("tradesClosed", []):
+        trade_id = str(closed["tradeID"])
+        try:
+            doc_ref, trade_data = trade_tracker.find_open_trade(trade_id)
+            if doc_ref is None:
+                continue  # trade inconnu ou déjà finalisé
+            if trade_tracker.partially_closed(trade_data):
+                details = oanda_service.get_trade_details(trade_id)
+            else:
+                details = _fill_details(trade_id, closed, tx)
+            if trade_tracker.finalize_closed(doc_ref, trade_id, trade_data, details, "oanda"):
+                _stats["closures"] += 1
+        except Exception as e:
+            log_to_firestore(f"[TxStream] Finalisation trade {trade_id} echouee (reprise par le polling): {e}",
+                             level="ERROR")
+
+
+def _handle_line(line: bytes):
+    msg = json.loads(line)
+    if msg.get("type") == "HEARTBEAT":
+        _stats["heartbeats"] += 1
+        _stats["last_txid"] = msg.get("lastTransactionID", _stats["last_txid"])
+    else:
+        handle_transaction(msg)
+
+
+def _consume():
+    response = price_stream.stream_session().get(
+        price_stream.stream_url("transactions/stream"), endpoint="transactions_stream",
+        retries=0, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT_S),
+    )
+    try:
+        response.raise_for_status()
+        _stats["connects"] += 1
+        for line in response.iter_lines(chunk_size=None):
+            if line:
+                _handle_line(line)
+            if _stop.is_set():
+                return
+        raise ConnectionError("flux ferme par le serveur")
+    finally:
+        response.close()
+
+
+def _run():
+    attempt = 0
+    while not _stop.is_set():
+        connects = _stats["connects"]
+        try:
+            _consume()
+            attempt = 0
+        except Exception as e:
+            _stats["disconnects"] += 1
+            _stats["last_error"] = str(e)[:200]
+            if _stats["connects"] > connects:
+                attempt = 0  # la connexion avait abouti : nouvelle coupure, pas un echec en boucle
+            if attempt == 0:
+                log_to_firestore(f"[TxStream] Flux coupe, clotures par le polling: {e}", level="ERROR")
+            _stop.wait(backoff_delay(attempt))
+            attempt = min(attempt + 1, 5)
+
+
+def start():
+    global _thread
+    if not ENABLED or (_thread is not None and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="oanda-transaction-stream", daemon=True)
+    _thread.start()
+
+
+def stop():
+    _stop.set()
+
+
+def get_stats() -> dict:
+    return {**_stats, "enabled": ENABLED}
@@ -1,6 +1,52 @@
+from typing import Callable, NamedTuple
+from app.config.universe import PHASE_TRADING
+from . import sp_mean_revert_multi as _mean_revert_module
+from . import nasdaq_trend_follow as _trend_follow_module
 from .sp_mean_revert_multi import process as mean_revert_multi
 from .nasdaq_trend_follow import process as nasdaq_trend_follow
 
 
+class StrategySpec(NamedTuple):
+    """Ce qu'une stratégie bougie consomme : symboles, phases de session et timeframes."""
+    key: str
+    fn: Callable
+    symbols: tuple
+    phases: tuple = (PHASE_TRADING,)
+    timeframes: tuple = ("1m",)
+
+
+def _spec(module) -> StrategySpec:
+    return StrategySpec(
+        key=module.STRATEGY_KEY,
+        fn=module.process,
+        symbols=tuple(module.SYMBOLS),
+        phases=tuple(getattr(module, "PHASES", (PHASE_TRADING,))),
+        timeframes=tuple(getattr(module, "TIMEFRAMES", ("1m",))),
+    )
+
+
+STRATEGY_REGISTRY = [_spec(_mean_revert_module), _spec(_trend_follow_module)]
+
+
 def get_all_strategies():
-    return [mean_revert_multi, nasdaq_trend_follow]
+    return [spec.fn for spec in STRATEGY_REGISTRY]
+
+
+def build_routing_table(universe: dict, timeframe: str = "1m") -> dict:
+    """
+    {symbole: {phase: (fn, ...)}} pour les symboles actifs du UNIVERSE.
+    Une bougie n'est envoyée qu'aux stratégies qui l'ont déclarée.
+    """
+    table = {}
+    for sym, cfg in universe.items():
+        if not cfg.get("active"):
+            continue
+        by_phase = {}
+        for spec in STRATEGY_REGISTRY:
+            if sym not in spec.symbols or timeframe not in spec.timeframes:
+                continue
+            for phase in spec.phases:
+                by_phase.setdefault(phase, []).append(spec.fn)
+        if by_phase:
+            table[sym] = {phase: tuple(fns) for phase, fns in by_phase.items()}
+    return table
@@ -1,67 +1,69 @@
 # app/strategies/nasdaq_trend_follow.py
-from datetime import datetime, timezone, timedelta
-import pytz
+from datetime import datetime
 from app.services.firebase import get_firestore
 from app.services.log_service import log_to_firestore, log_trade_event
-from app.config.universe import UNIVERSE
+from app.config.universe import UNIVERSE, PHASE_TRADING
+from app.services.session_calendar import calendar
+from app.services import range_manager, config_service, latency, exit_scheduler
+from app.services import bar_store
+from app.services.bar_store import Candle
 from app.services.shared_strategy_tools import (
-    get_entry_price, calculate_sl_tp, compute_position_size, execute_trade
+    get_entry_price, calculate_sl_tp, compute_position_size, execute_trade, record_decision, build_exit_plan
 )
 
 STRATEGY_KEY = "trend_follow"
 DEFAULT_RISK_CHF = 50
 
+# Routage (cf. app.strategies.build_routing_table)
+SYMBOLS = ("I:NDX",)
+PHASES = (PHASE_TRADING,)
+TIMEFRAMES = ("1m",)
 
-def _session_for(sym: str):
-    s = UNIVERSE.get(sym, {}).get("session", {})
-    tz = pytz.timezone(s.get("tz", "America/New_York"))
-    oh, om = map(int, s.get("open", "09:30").split(":"))
-    or_min = int(s.get("or_minutes", 15))
-    th, tm = map(int, s.get("trade_end", "11:30").split(":"))
-    return tz, oh, om, or_min, th, tm
 
-
-def process(candle: dict):
-    if candle["sym"] != "I:NDX":
+def process(candle: Candle, config=None):
+    if candle.sym not in SYMBOLS:
         return
+    trace = latency.start_trace(STRATEGY_KEY, candle)
+    trade_ref = None
+    try:
+        trade_ref = _evaluate(candle, config, trace)
+    finally:
+        trace.finish(trade_ref)  # une trace par bougie, ordre rejeté ou en échec compris
+
 
+def _evaluate(candle: Candle, config, trace):
+    """Décision et exécution sur la bougie ; retourne la référence du trade écrit, sinon None."""
     db = get_firestore()
 
-    sym = candle["sym"]
-    today = candle["day"]
+    sym = candle.sym
+    today = candle.day
     cfg = UNIVERSE.get(sym)
     if not cfg or not cfg.get("active"):
         return
 
     instrument = cfg["instrument"]
-    settings = db.collection("config").document("settings").get().to_dict() or {}
-    risk_chf = settings.get("risk_chf", DEFAULT_RISK_CHF)
-
-    # Fenetre horaire locale
-    utc_dt = datetime.strptime(candle["utc_time"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-    tz, oh, om, or_min, th, tm = _session_for(sym)
-    loc = utc_dt.astimezone(tz)
-    open_start = loc.replace(hour=oh, minute=om, second=0, microsecond=0)
-    open_end = open_start + timedelta(minutes=or_min)
-    trade_end = loc.replace(hour=th, minute=tm, second=0, microsecond=0)
-
-    if loc < open_end or loc > trade_end:
+    if config is None:
+        config = config_service.get_snapshot()
+    risk_chf = config.settings.get("risk_chf", DEFAULT_RISK_CHF)
+
+    # Fenêtre de session précalculée (UTC ms) : entre fin du range d'ouverture et fin de session
+    session = calendar.bounds(sym, candle.e)
+    if candle.e < session.or_end_ms or candle.e > session.trade_end_ms:
         return
 
-    # Activation via config Firestore
-    strat_cfg = db.collection("config").document("strategies").get().to_dict() or {}
-    if not strat_cfg.get(STRATEGY_KEY, False):
+    # Activation via config (cache on_snapshot)
+    if not config.is_enabled(STRATEGY_KEY):
         return
 
-    # Opening range
-    rdoc = db.collection("opening_range").document(f"{today}_{sym}").get().to_dict()
+    # Opening range (registre memoire, sans I/O)
+    rdoc = range_manager.get_opening_range(today, sym)
     if not rdoc or rdoc.get("status") != "ready":
         log_to_firestore(f"[{STRATEGY_KEY}::{sym}] opening_range manquant ({today}_{sym})", level="INFO")
         return
 
     high_15, low_15 = float(rdoc["high"]), float(rdoc["low"])
-    o, c = float(candle["o"]), float(candle["c"])
-    candle_id = f"{sym}_{candle['e']}"
+    o, c = candle.o, candle.c
+    candle_id = candle.doc_id
 
     # Signal trend following (ORB strict)
     # LONG  : open DANS le range ET close AU-DESSUS
@@ -72,15 +74,13 @@ def process(candle: dict):
     elif low_15 <= o <= high_15 and c < low_15:
         direction = "SHORT"
     else:
-        db.collection("ohlc_1m").document(candle_id).update(
-            {f"strategy_decisions.{STRATEGY_KEY}": "REJECT: conditions non remplies"}
-        )
+        trace.mark("decision")
+        record_decision(sym, candle.e, STRATEGY_KEY, "REJECT: conditions non remplies")
         log_to_firestore(f"[{STRATEGY_KEY}::{sym}] Conditions non remplies", level="NO_TRADING")
         return
 
-    db.collection("ohlc_1m").document(candle_id).update(
-        {f"strategy_decisions.{STRATEGY_KEY}": f"ACCEPT: {direction}"}
-    )
+    trace.mark("decision")
+    record_decision(sym, candle.e, STRATEGY_KEY, f"ACCEPT: {direction}")
 
     # 1 trade / jour / symbole / direction
     trades_same_dir = list(
@@ -100,6 +100,7 @@ def process(candle: dict):
     # Prix d'entree OANDA
     try:
         entry = float(get_entry_price(instrument))
+        trace.mark("price_fetched")
         log_to_firestore(f"[{STRATEGY_KEY}::{sym}] Prix {instrument} : {entry}", level="OANDA")
     except Exception as e:
         log_to_firestore(f"[{STRATEGY_KEY}::{sym}] Erreur prix OANDA : {e}", level="ERROR")
@@ -122,7 +123,9 @@ def process(candle: dict):
 
     # Execution
     try:
+        trace.mark("order_sent")
         result = execute_trade(instrument, entry, sl_price, tp_price, units, direction)
+        trace.mark("order_filled")
         log_to_firestore(f"[{STRATEGY_KEY}::{sym}] Ordre {direction} execute ({result['units']})", level="TRADING")
     except Exception as e:
         log_to_firestore(f"[{STRATEGY_KEY}::{sym}] Erreur execution : {e}", level="ERROR")
@@ -145,12 +148,16 @@ def process(candle: dict):
         "oanda_trade_id": result.get("oanda_trade_id"),
         "fill_price": result.get("fill_price"),
         "breakeven_applied": False,
-        "scaling_step": 0,
         "initial_units": abs(result["units"]),
         "risk_r": risk_per_unit,
         "risk_chf": risk_chf,
         "step": 0.1,
+        **build_exit_plan(STRATEGY_KEY, config.settings, instrument, result, direction, risk_per_unit, tp_price,
+                          default_plan="scaling_3", atr=bar_store.atr(sym, candle.e)),
     })
+    exit_scheduler.register(result.get("oanda_trade_id"), "oanda", instrument)
+
+    trace.mark("trade_written")
 
     log_trade_event(trade_ref, "OPENED", f"Trade {direction} ouvert sur {instrument}", {
         "entry": entry,
@@ -167,3 +174,4 @@ def process(candle: dict):
         f"[{STRATEGY_KEY}::{sym}] Trade {instrument} @ {entry} (SL: {sl_price}, TP: {tp_price})",
         level="TRADING"
     )
+    return trade_ref
@@ -2,9 +2,10 @@
 from datetime import datetime, timezone, timedelta
 from app.services.firebase import get_firestore
 from app.services.log_service import log_to_firestore, log_trade_event
+from app.services import config_service, exit_scheduler
 from app.services.news_analyzer import _is_inverse_event
 from app.services.shared_strategy_tools import (
-    get_entry_price, compute_position_size, execute_trade
+    get_entry_price, compute_position_size, execute_trade, build_exit_plan
 )
 from app.services.oanda_service import DECIMALS_BY_INSTRUMENT
 
@@ -77,8 +78,8 @@ def execute_news_trade(
     db = get_firestore()
 
     # Check strategy enabled
-    strat_cfg = db.collection("config").document("strategies").get().to_dict() or {}
-    if not strat_cfg.get(STRATEGY_KEY, False):
+    config = config_service.get_snapshot()
+    if not config.is_enabled(STRATEGY_KEY):
         log_to_firestore(f"[{STRATEGY_KEY}] Strategy disabled, skipping", level="INFO")
         return {"status": "SKIP", "reason": "Strategy disabled"}
 
@@ -134,7 +135,7 @@ def execute_news_trade(
     risk_per_unit = sl_distance
 
     # Risk config
-    settings = db.collection("config").document("settings").get().to_dict() or {}
+    settings = config.settings
     risk_chf = settings.get("risk_chf", DEFAULT_RISK_CHF)
 
     # Position sizing (step=1 for forex)
@@ -174,6 +175,8 @@ def execute_news_trade(
         "oanda_trade_id": result.get("oanda_trade_id"),
         "fill_price": result.get("fill_price"),
         "max_hold_until": max_hold_until,
+        **build_exit_plan(STRATEGY_KEY, settings, instrument, result, trade_direction, risk_per_unit, tp_price,
+                          step=1),
         "event_title": event.get("title"),
         "event_country": event.get("country"),
         "surprise_direction": surprise.get("direction"),
@@ -186,6 +189,7 @@ def execute_news_trade(
         "decision_reason": decision.get("reason"),
     }
     trade_ref.set(trade_data)
+    exit_scheduler.register(result.get("oanda_trade_id"), "oanda", instrument, max_hold_until)
 
     log_trade_event(trade_ref, "OPENED", f"News trade {trade_direction} on {instrument}", {
         "entry": entry,
@@ -2,10 +2,11 @@
 from datetime import datetime, timezone
 from app.services.firebase import get_firestore
 from app.services.log_service import log_to_firestore, log_trade_event
+from app.services import config_service, exit_scheduler
 from app.config.instrument_map import resolve_instrument
 from app.services.calendar_service import check_high_impact_nearby
 from app.services.shared_strategy_tools import (
-    get_entry_price, calculate_sl_tp, compute_position_size, execute_trade
+    get_entry_price, calculate_sl_tp, compute_position_size, execute_trade, build_exit_plan
 )
 
 STRATEGY_KEY = "supply_demand"
@@ -41,8 +42,8 @@ def process_webhook_signal(body: dict) -> dict:
     db = get_firestore()
 
     # 2. Verifier strategie active
-    strat_cfg = db.collection("config").document("strategies").get().to_dict() or {}
-    if not strat_cfg.get(STRATEGY_KEY, False):
+    config = config_service.get_snapshot()
+    if not config.is_enabled(STRATEGY_KEY):
         log_to_firestore(f"[{STRATEGY_KEY}] Strategie desactivee, signal ignore", level="WEBHOOK")
         return {"status": "SKIP", "reason": "Strategy disabled"}
 
@@ -118,7 +119,7 @@ def process_webhook_signal(body: dict) -> dict:
         return {"status": "ERROR", "reason": "Zero risk"}
 
     # Risk config
-    settings = db.collection("config").document("settings").get().to_dict() or {}
+    settings = config.settings
     if broker == "kraken":
         risk_amount = settings.get("risk_usd_crypto", DEFAULT_RISK_USD)
         account_currency = "USD"
@@ -174,11 +175,12 @@ def process_webhook_signal(body: dict) -> dict:
         "tp_txid": result.get("tp_txid"),
         "fill_price": result.get("fill_price"),
         "breakeven_applied": False,
-        "scaling_step": 0,
         "initial_units": abs(result["units"]),
         "risk_r": risk_per_unit,
         "risk_amount": risk_amount,
         "step": step,
+        **build_exit_plan(STRATEGY_KEY, settings, instrument, result, direction, risk_per_unit, tp_price,
+                          step=step, broker=broker, default_plan="scaling_3", atr=body.get("atr")),
         "zone_top": zone_top,
         "zone_bottom": zone_bottom,
     }
@@ -188,6 +190,7 @@ def process_webhook_signal(body: dict) -> dict:
         trade_data["news_check"] = news_check
 
     trade_ref.set(trade_data)
+    exit_scheduler.register(trade_id_value, broker, instrument)
 
     log_trade_event(trade_ref, "OPENED", f"Trade {direction} ouvert sur {instrument} [{broker}]", {
         "entry": entry,
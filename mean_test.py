@@ -1,48 +1,33 @@
 # tests/run_mean_revert_live_oanda.py
 from datetime import datetime, timedelta, timezone
-import pytzyxx
 
 from app.services.firebase import get_firestore
 import app.strategies.sp_mean_revert_multi as strat   # on n'altère rien
 from app.config.universe import UNIVERSE
-from app.services import oanda_service
+from app.services.session_calendar import calendar, ms_to_utc
+from app.services import oanda_service, bar_store
+from app.services.bar_store import Candle
 
 DAY = "1999-01-01"   # laissé volontairement (la stratégie se base sur la bougie, pas la date réelle)
 db = get_firestore()
 
 # ---------- helpers sessions ----------
-def _parse_hhmm(s: str):
-    h, m = s.split(":"); return int(h), int(m)
-
-def _session_for(sym: str):
-    s = UNIVERSE.get(sym, {}).get("session", {})
-    tz = pytz.timezone(s.get("tz", "America/New_York"))
-    oh, om = _parse_hhmm(s.get("open", "09:30"))
-    or_min = int(s.get("or_minutes", 15))
-    th, tm = _parse_hhmm(s.get("trade_end", "11:30"))
-    return tz, oh, om, or_min, th, tm
-
-def _local_dt(day: str, tzname: str, hh: int, mm: int):
-    tz = pytz.timezone(tzname)
-    local_naive = datetime.strptime(f"{day} {hh:02d}:{mm:02d}:00", "%Y-%m-%d %H:%M:%S")
-    return tz.localize(local_naive)
+def _open_end_utc(sym: str, day: str) -> datetime:
+    """Fin du range d'ouverture (UTC) via le calendrier de session partagé."""
+    return ms_to_utc(calendar.bounds_for_day(sym, day).or_end_ms)
 
 def utc_ms(dt_utc: datetime) -> int:
     return int(dt_utc.replace(tzinfo=timezone.utc).timestamp() * 1000)
 
 def make_bar(sym: str, dt_utc_end: datetime, o, c, h, l, op=None, in_opening_range=False):
     e = utc_ms(dt_utc_end); s = e - 60_000
-    return {
-        "ev": "AM", "sym": sym,
-        "op": float(op if op is not None else o),
-        "o": float(o), "c": float(c), "h": float(h), "l": float(l),
-        "s": s, "e": e,
-        "utc_time": dt_utc_end.strftime("%Y-%m-%d %H:%M:%S"),
-        "day": DAY, "in_opening_range": bool(in_opening_range),
-    }
-
-def write_bar(bar: dict):
-    db.collection("ohlc_1m").document(f"{bar['sym']}_{bar['e']}").set(bar)
+    return Candle(sym, s, e, float(o), float(h), float(l), float(c),
+                  float(op if op is not None else o), bool(in_opening_range), day=DAY)
+
+def write_bar(bar: Candle):
+    db.collection("ohlc_1m").document(bar.doc_id).set(bar.to_doc())
+    # même chemin que l'ingestion : la stratégie lit le bar store, pas Firestore
+    bar_store.append_candle(bar)
 
 # ---------- enable strat + seed ranges ----------
 def enable_everything():
@@ -122,9 +107,7 @@ def run():
         if not cfg.get("active"): 
             continue
 
-        tz, oh, om, or_min, th, tm = _session_for(sym)
-        open_end_local = _local_dt(DAY, tz.zone, oh, om) + timedelta(minutes=or_min)
-        open_end_utc = open_end_local.astimezone(timezone.utc)
+        open_end_utc = _open_end_utc(sym, DAY)
 
         lo, hi = RANGE_OVERRIDES.get(sym, (1000.0, 1010.0))
 
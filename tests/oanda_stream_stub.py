@@ -0,0 +1,155 @@
+# tests/oanda_stream_stub.py
+"""
+Serveur local imitant le flux de pricing OANDA (v20), pour tester price_stream hors ligne.
+
+    GET /v3/accounts/{id}/pricing/stream?instruments=EUR_USD,USD_CHF
+    GET /v3/accounts/{id}/transactions/stream
+
+Réponse en Transfer-Encoding: chunked, une ligne JSON par chunk :
+- pricing : snapshot PRICE de chaque instrument, puis PRICE (push_price ou
+  marche aléatoire) et HEARTBEAT toutes les `heartbeat_s` secondes
+- transactions : transactions poussées par push_transaction, et HEARTBEAT
+
+Utilisation manuelle (depuis server/) :
+    python -m tests.oanda_stream_stub --port 8765
+    OANDA_STREAM_URL=http://127.0.0.1:8765/v3 uvicorn app.main:app
+"""
+import argparse
+import json
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f000Z")
+
+
+class StreamStub:
+    def __init__(self, prices: dict = None, heartbeat_s: float = 5.0, random_walk: bool = False, port: int = 0):
+        self.prices = dict(prices or {})      # instrument -> mid
+        self.heartbeat_s = heartbeat_s
+        self.random_walk = random_walk
+        self.subscriptions = []               # listes d'instruments demandées, dans l'ordre
+        self.stalled = threading.Event()      # connexion ouverte mais muette
+        self._queues = []                     # connexions pricing
+        self._tx_queues = []                  # connexions transactions
+        self._last_txid = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.endswith("/transactions/stream"):
+                    stub._serve(self, [], stub._tx_queues)
+                elif url.path.endswith("/pricing/stream"):
+                    instruments = parse_qs(url.query).get("instruments", [""])[0].split(",")
+                    stub._serve(self, [i for i in instruments if i], stub._queues)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v3"
+
+    # ---------- pilotage ----------
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.drop_connections()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push_price(self, instrument: str, bid: float, ask: float):
+        self.prices[instrument] = (bid + ask) / 2
+        with self._lock:
+            for q in self._queues:
+                q.put(self._price_msg(instrument, bid, ask))
+
+    def push_transaction(self, tx: dict):
+        with self._lock:
+            self._last_txid += 1
+            tx = {"id": str(self._last_txid), "time": _now(), **tx}
+            for q in self._tx_queues:
+                q.put(tx)
+
+    def drop_connections(self):
+        with self._lock:
+            for q in self._queues + self._tx_queues:
+                q.put(None)
+
+    # ---------- flux ----------
+    @staticmethod
+    def _price_msg(instrument: str, bid: float, ask: float) -> dict:
+        return {
+            "type": "PRICE", "instrument": instrument, "time": _now(), "tradeable": True,
+            "bids": [{"price": f"{bid:.5f}", "liquidity": 1000000}],
+            "asks": [{"price": f"{ask:.5f}", "liquidity": 1000000}],
+        }
+
+    def _snapshot(self, instrument: str) -> dict:
+        mid = self.prices.setdefault(instrument, 1.0)
+        return self._price_msg(instrument, mid - 0.00005, mid + 0.00005)
+
+    def _serve(self, handler, instruments: list, queues: list):
+        q = queue.Queue()
+        with self._lock:
+            if queues is self._queues:
+                self.subscriptions.append(instruments)
+            queues.append(q)
+        try:
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/octet-stream")
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+            for inst in instruments:
+                self._send(handler, self._snapshot(inst))
+            while True:
+                try:
+                    msg = q.get(timeout=self.heartbeat_s)
+                except queue.Empty:
+                    msg = {"type": "HEARTBEAT", "time": _now()}
+                    if queues is self._tx_queues:
+                        msg["lastTransactionID"] = str(self._last_txid)
+                    if self.random_walk and instruments:
+                        inst = random.choice(instruments)
+                        self.prices[inst] *= 1 + random.gauss(0, 0.0001)
+                        self._send(handler, self._snapshot(inst))
+                if msg is None:
+                    handler.close_connection = True  # coupure brutale, sans chunk final
+                    return
+                self._send(handler, msg)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._lock:
+                queues.remove(q)
+
+    def _send(self, handler, msg: dict):
+        if self.stalled.is_set():
+            return
+        data = json.dumps(msg).encode() + b"\n"
+        handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        handler.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in du flux de pricing OANDA")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--heartbeat", type=float, default=5.0)
+    args = parser.parse_args()
+    stub = StreamStub({"EUR_USD": 1.085, "USD_CHF": 0.88, "SPX500_USD": 5000.0},
+                      heartbeat_s=args.heartbeat, random_walk=True, port=args.port)
+    print(f"OANDA pricing stream stub on {stub.url}")
+    stub.server.serve_forever()
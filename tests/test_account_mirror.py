@@ -0,0 +1,182 @@
+# tests/test_account_mirror.py
+"""
+Unit tests for the OANDA account mirror (snapshot, /changes, cursor persisted in Firestore).
+Run with: python -m tests.test_account_mirror (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock, patch
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import account_mirror
+
+
+def _snapshot():
+    return {
+        "lastTransactionID": "100",
+        "account": {
+            "balance": "10000.0",
+            "trades": [{"id": "90", "instrument": "EUR_USD", "currentUnits": "1000", "price": "1.1000"}],
+            "orders": [{"id": "91", "type": "STOP_LOSS", "tradeID": "90"},
+                       {"id": "92", "type": "TAKE_PROFIT", "tradeID": "90"}],
+            "positions": [
+                {"instrument": "EUR_USD", "long": {"units": "1000"}, "short": {"units": "0"}},
+                {"instrument": "USD_JPY", "long": {"units": "0"}, "short": {"units": "0"}},
+            ],
+        },
+    }
+
+
+def _changes():
+    return {
+        "lastTransactionID": "105",
+        "changes": {
+            "tradesOpened": [{"id": "103", "instrument": "USD_JPY", "currentUnits": "-500", "price": "150.000"}],
+            "tradesClosed": [{"id": "90", "instrument": "EUR_USD", "state": "CLOSED", "realizedPL": "-10.0",
+                              "averageClosePrice": "1.0990", "price": "1.1000"}],
+            "ordersCreated": [{"id": "104", "type": "STOP_LOSS", "tradeID": "103"}],
+            "ordersFilled": [{"id": "91", "type": "STOP_LOSS", "tradeID": "90"}],
+            "ordersCancelled": [{"id": "92", "type": "TAKE_PROFIT", "tradeID": "90"}],
+            "positions": [
+                {"instrument": "EUR_USD", "long": {"units": "0"}, "short": {"units": "0"}},
+                {"instrument": "USD_JPY", "long": {"units": "0"}, "short": {"units": "-500"}},
+            ],
+            "transactions": [{"id": "105", "type": "ORDER_FILL", "accountBalance": "9990.0"}],
+        },
+        "state": {
+            "NAV": "9988.0",
+            "trades": [{"id": "103", "unrealizedPL": "-2.0"}],
+            "positions": [{"instrument": "USD_JPY", "netUnrealizedPL": "-2.0", "shortUnrealizedPL": "-2.0"}],
+        },
+    }
+
+
+class _StateDoc:
+    """Document Firestore state/oanda_account_mirror en mémoire (survit au "redémarrage")."""
+
+    def __init__(self):
+        self.data = None
+
+    def set(self, data):
+        self.data = dict(data)
+
+    def get(self):
+        snap = MagicMock()
+        snap.to_dict.return_value = self.data
+        return snap
+
+
+def _reset(doc):
+    account_mirror._state_ref = lambda: doc
+    account_mirror._loaded = False
+    account_mirror._synced_at = 0.0
+    account_mirror._saved_at = 0.0
+    account_mirror._dirty = False
+    account_mirror._closed.clear()
+    account_mirror._done_orders.clear()
+    account_mirror._state.update({"account_id": None, "last_txid": None, "account": {}, "trades": {},
+                                  "orders": {}, "positions": {}})
+
+
+def _oanda():
+    oanda = MagicMock()
+    oanda.OANDA_ACCOUNT_ID = "001-TEST"
+    oanda.get_account.return_value = _snapshot()
+    oanda.get_account_changes.return_value = _changes()
+    return oanda
+
+
+def test_snapshot_then_incremental_changes():
+    with patch.object(account_mirror, "oanda_service", _oanda()) as oanda:
+        _reset(_StateDoc())
+        account_mirror.sync()
+        assert account_mirror.trade_ids() == {"90"}
+        assert [p["instrument"] for p in account_mirror.open_positions()] == ["EUR_USD"]
+        assert account_mirror.balance() == 10000.0
+
+        account_mirror.sync()
+        oanda.get_account.assert_called_once()
+        oanda.get_account_changes.assert_called_once_with("100")
+        assert account_mirror.trade_ids() == {"103"}
+        assert account_mirror.open_trades()[0]["unrealizedPL"] == "-2.0"
+        assert [p["instrument"] for p in account_mirror.open_positions()] == ["USD_JPY"]
+        assert account_mirror.open_positions()[0]["unrealizedPL"] == "-2.0"
+        assert account_mirror.balance() == 9990.0
+        assert set(account_mirror._state["orders"]) == {"104"}
+        assert account_mirror.order_state("104") == ("PENDING", None)
+        assert account_mirror.order_state("91") == ("FILLED", None)
+        assert account_mirror.order_state("92") == ("CANCELLED", None)
+
+        closed = account_mirror.closed_trade("90")
+        assert closed["state"] == "CLOSED" and closed["sl_filled"] and not closed["tp_filled"]
+        assert closed["realizedPL"] == "-10.0" and closed["averageClosePrice"] == "1.0990"
+
+
+def test_cursor_persisted_across_restart():
+    doc = _StateDoc()
+    with patch.object(account_mirror, "oanda_service", _oanda()):
+        _reset(doc)
+        account_mirror.sync()
+    assert doc.data["last_txid"] == "100" and doc.data["account_id"] == "001-TEST"
+
+    # "redémarrage" : état mémoire perdu, le curseur est relu depuis Firestore
+    with patch.object(account_mirror, "oanda_service", _oanda()) as oanda:
+        _reset(doc)
+        account_mirror.sync()
+        oanda.get_account.assert_not_called()
+        oanda.get_account_changes.assert_called_once_with("100")
+        assert account_mirror.get_stats()["last_txid"] == "105"
+        assert account_mirror.trade_ids() == {"103"}
+
+
+def test_rejected_cursor_falls_back_to_snapshot():
+    with patch.object(account_mirror, "oanda_service", _oanda()) as oanda:
+        _reset(_StateDoc())
+        account_mirror.sync()
+        response = MagicMock(status_code=416)
+        oanda.get_account_changes.side_effect = requests.exceptions.HTTPError(response=response)
+        with patch.object(account_mirror, "log_to_firestore"):
+            account_mirror.sync()
+        assert oanda.get_account.call_count == 2
+        assert account_mirror.trade_ids() == {"90"}
+
+
+def test_saves_coalesced_with_closes_and_orders():
+    doc = _StateDoc()
+    with patch.object(account_mirror, "oanda_service", _oanda()) as oanda:
+        _reset(doc)
+        account_mirror.sync()                       # snapshot : 1re écriture
+        account_mirror.sync()                       # /changes dans l'intervalle : pas d'écriture
+        assert doc.data["last_txid"] == "100"
+        account_mirror.flush()                      # arrêt
+        assert doc.data["last_txid"] == "105"
+
+        # "redémarrage" : clôtures et ordres déjà vus relus avec le curseur, rien n'est rejoué
+        _reset(doc)
+        oanda.get_account_changes.return_value = {"lastTransactionID": "105", "changes": {}, "state": {}}
+        account_mirror.sync()
+        oanda.get_account_changes.assert_called_with("105")
+        assert account_mirror.closed_trade("90")["sl_filled"]
+        assert account_mirror.order_state("91") == ("FILLED", None)
+        assert account_mirror.order_state("92") == ("CANCELLED", None)
+        assert not account_mirror._dirty
+
+
+if __name__ == "__main__":
+    tests = [
+        test_snapshot_then_incremental_changes,
+        test_cursor_persisted_across_restart,
+        test_rejected_cursor_falls_back_to_snapshot,
+        test_saves_coalesced_with_closes_and_orders,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
@@ -0,0 +1,136 @@
+# tests/test_archive_service.py
+"""
+Unit tests for the execution_logs / ohlc_1m compaction job.
+Run with: python -m tests.test_archive_service (from server/)
+"""
+import sys
+import os
+import tempfile
+from datetime import date
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+
+class _Doc:
+    def __init__(self, coll, doc_id, data):
+        self.id, self._data, self.reference = doc_id, data, (coll, doc_id)
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Query:
+    def __init__(self, db, name, filters=(), order=None, limit=None):
+        self.db, self.name, self.filters, self.order, self.n = db, name, filters, order, limit
+
+    def where(self, field, op, value):
+        return _Query(self.db, self.name, self.filters + ((field, op, value),), self.order, self.n)
+
+    def order_by(self, field, direction=None):
+        return _Query(self.db, self.name, self.filters, field, self.n)
+
+    def limit(self, n):
+        return _Query(self.db, self.name, self.filters, self.order, n)
+
+    def stream(self):
+        ops = {"==": lambda a, b: a == b, ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b}
+        docs = [_Doc(self.name, i, d) for i, d in self.db.data[self.name].items()
+                if all(ops[op](d.get(f), v) for f, op, v in self.filters)]
+        if self.order:
+            docs.sort(key=lambda d: d._data[self.order])
+        return docs[:self.n] if self.n else docs
+
+
+class _Batch:
+    def __init__(self, db):
+        self.db, self.refs = db, []
+
+    def delete(self, ref):
+        self.refs.append(ref)
+
+    def commit(self):
+        for coll, doc_id in self.refs:
+            del self.db.data[coll][doc_id]
+
+
+class _FakeDb:
+    def __init__(self):
+        self.data = {"execution_logs": {}, "ohlc_1m": {}}
+
+    def collection(self, name):
+        return _Query(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+
+def _setup():
+    from app.services import archive_service, candle_archive
+    db = _FakeDb()
+    archive_service.get_firestore = lambda: db
+    archive_service.ARCHIVE_DIR = candle_archive.ARCHIVE_DIR = tempfile.mkdtemp()
+    for i in range(3):
+        db.data["execution_logs"][f"old{i}"] = {"message": f"[X] old {i}", "level": "INFO",
+                                                "timestamp": f"2024-01-02T10:0{i}:00.000001", "tag": "X"}
+    db.data["execution_logs"]["hot"] = {"message": "hot", "level": "INFO", "timestamp": "2024-02-01T10:00:00"}
+    for sym in ("I:SPX", "I:NDX"):
+        for k in range(2):
+            e = 1704205860000 + k * 60_000  # 2024-01-02 14:31 UTC
+            doc = {"ev": "AM", "sym": sym, "op": None, "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5,
+                   "s": e - 60_000, "e": e, "day": "2024-01-02", "in_opening_range": k == 0,
+                   "utc_time": "x"}
+            if k == 1:
+                doc["strategy_decisions"] = {"mean_revert": "REJECT"}
+            db.data["ohlc_1m"][f"{sym}_{e}"] = doc
+    return archive_service, db
+
+
+def test_compaction_archives_then_deletes():
+    archive, db = _setup()
+    done = archive.run_compaction(today=date(2024, 2, 1))
+    assert done["execution_logs"] == {"2024-01-02": 3}
+    assert done["ohlc_1m"] == {"2024-01-02": 4}
+    assert list(db.data["execution_logs"]) == ["hot"] and not db.data["ohlc_1m"]
+
+    logs = archive.read_logs("2024-01-02")
+    assert [e["message"] for e in logs] == ["[X] old 2", "[X] old 1", "[X] old 0"]
+    candles = archive.read_candles("2024-01-02")
+    assert len(candles) == 4 and candles[0]["s"] <= candles[-1]["s"]
+    spx = [c for c in candles if c["sym"] == "I:SPX"]
+    assert spx[0]["in_opening_range"] is True and spx[1]["strategy_decisions"] == {"mean_revert": "REJECT"}
+    assert spx[1]["utc_time"] == "2024-01-02 14:32:00"
+
+
+def test_late_docs_merged_into_existing_archive():
+    archive, db = _setup()
+    archive.run_compaction(today=date(2024, 2, 1))
+    db.data["execution_logs"]["late"] = {"message": "late", "level": "ERROR", "timestamp": "2024-01-02T23:00:00"}
+    archive.run_compaction(today=date(2024, 2, 1))
+    assert [e["message"] for e in archive.read_logs("2024-01-02")][0] == "late"
+    assert len(archive.read_logs("2024-01-02")) == 4
+
+
+def test_jobs_registered_on_app_scheduler():
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from app.services import archive_service
+    scheduler = BackgroundScheduler(timezone="UTC")   # news_scheduler.get_scheduler() : déjà démarré
+    scheduler.start()
+    try:
+        archive_service.start(scheduler)
+        archive_service.start(scheduler)   # jobs remplacés, pas dupliqués
+        assert sorted(j.id for j in scheduler.get_jobs()) == ["archive_compaction", "archive_session"]
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    test_compaction_archives_then_deletes()
+    test_late_docs_merged_into_existing_archive()
+    test_jobs_registered_on_app_scheduler()
+    print("ALL TESTS PASSED")
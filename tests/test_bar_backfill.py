@@ -0,0 +1,106 @@
+# tests/test_bar_backfill.py
+"""
+Unit tests for minute-bar gap detection and REST backfill.
+The aggregates endpoint is replaced by a local HTTP stand-in.
+Run with: python -m tests.test_bar_backfill (from server/)
+"""
+import sys
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+MIN = 60_000
+SYM = "I:GAPTEST"
+OPEN_MS = int(datetime(2024, 7, 2, 13, 30, tzinfo=timezone.utc).timestamp() * 1000)  # 09:30 NY
+
+
+class _AggsHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        _AggsHandler.requests.append(self.path)
+        # /v2/aggs/ticker/{sym}/range/1/minute/{from}/{to}
+        parts = self.path.split("?")[0].split("/")
+        first_s, last_s = int(parts[-2]), int(parts[-1])
+        results = [
+            {"o": 10.0 + i, "h": 20.0 + i, "l": 5.0 - i, "c": 12.0, "v": 0, "t": t}
+            for i, t in enumerate(range(first_s, last_s + 1, MIN))
+        ]
+        body = json.dumps({"status": "OK", "ticker": parts[4], "results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _stand_in():
+    from massive import RESTClient
+    from app.services import bar_backfill
+    server = HTTPServer(("127.0.0.1", 0), _AggsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bar_backfill._client = RESTClient(api_key="test", base=f"http://127.0.0.1:{server.server_port}", retries=0)
+    return server
+
+
+def _session():
+    from app.services.session_calendar import calendar
+    return calendar.bounds(SYM, OPEN_MS)
+
+
+def test_check_gap_only_for_missing_minutes():
+    from app.services import bar_backfill
+    session = _session()
+    before = bar_backfill._queue.qsize()
+    assert not bar_backfill.check_gap(SYM, None, OPEN_MS, session)
+    assert not bar_backfill.check_gap(SYM, OPEN_MS, OPEN_MS + MIN, session)
+    assert not bar_backfill.check_gap(SYM, session.day_start_ms - MIN, OPEN_MS, session)  # veille
+    assert bar_backfill.check_gap(SYM, OPEN_MS, OPEN_MS + 4 * MIN, session)
+    assert bar_backfill._queue.get_nowait()[1:3] == (OPEN_MS + MIN, OPEN_MS + 3 * MIN)
+    bar_backfill._queue.task_done()
+    assert bar_backfill._queue.qsize() == before
+
+
+def test_fill_gap_one_request_and_ingest():
+    from app.services import bar_backfill, bar_store
+    server = _stand_in()
+    try:
+        session = _session()
+        bar_store.append(SYM, OPEN_MS + 2 * MIN, OPEN_MS + 3 * MIN, 1, 1, 1, 1)  # déjà reçue par le WS
+        ingested = []
+        bar_backfill._ingest = lambda c, s: ingested.append(c)
+        _AggsHandler.requests.clear()
+
+        with patch("app.services.range_manager.is_published", return_value=True), \
+             patch("app.services.range_manager.calculate_and_store_opening_range",
+                   return_value={"status": "ready"}) as recompute:
+            n = bar_backfill.fill_gap(SYM, OPEN_MS + MIN, OPEN_MS + 20 * MIN, session)
+
+        assert len(_AggsHandler.requests) == 1
+        assert n == 19 and len(ingested) == 19
+        assert OPEN_MS + 3 * MIN not in [c.e for c in ingested]
+        assert all(c.backfilled and c.to_doc()["backfilled"] for c in ingested)
+        # fenêtre du range = e <= 09:45 → 14 bougies rattrapées dedans (09:31..09:45 sauf 09:33)
+        assert sum(c.in_opening_range for c in ingested) == 14
+        recompute.assert_called_once_with(session.day, SYM)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_check_gap_only_for_missing_minutes()
+    test_fill_gap_one_request_and_ingest()
+    print("ALL TESTS PASSED")
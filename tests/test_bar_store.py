@@ -0,0 +1,125 @@
+# tests/test_bar_store.py
+"""
+Unit tests for the in-memory intraday bar store.
+Run with: python -m tests.test_bar_store (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+MIN = 60_000
+
+
+def _fill(ring, n, t0=1_000 * MIN):
+    for i in range(n):
+        e = t0 + i * MIN
+        ring.append(e - MIN, e, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, None, False)
+
+
+def test_latest_and_slice():
+    from app.services.bar_store import BarRing
+    ring = BarRing(capacity=10)
+    _fill(ring, 5)
+    assert ring.latest().e == 1_004 * MIN
+    bars = ring.slice(1_001 * MIN, 1_003 * MIN)
+    assert [b.e for b in bars] == [1_001 * MIN, 1_002 * MIN, 1_003 * MIN]
+    assert ring.slice(2_000 * MIN, 3_000 * MIN) == []
+
+
+def test_ring_eviction_keeps_order():
+    from app.services.bar_store import BarRing
+    ring = BarRing(capacity=4)
+    _fill(ring, 7)
+    assert len(ring) == 4
+    assert [b.e for b in ring.slice(0, 10_000 * MIN)] == [1_003 * MIN, 1_004 * MIN, 1_005 * MIN, 1_006 * MIN]
+    assert ring.evicted_until == 1_002 * MIN
+
+
+def test_out_of_order_insert_and_replace():
+    from app.services.bar_store import BarRing
+    ring = BarRing(capacity=10)
+    for e in (1_000, 1_001, 1_003):
+        ring.append((e - 1) * MIN, e * MIN, 1.0, 1.0, 1.0, 1.0, None, False)
+    ring.append(1_001 * MIN, 1_002 * MIN, 2.0, 2.0, 2.0, 2.0, None, False)   # bougie manquante (backfill)
+    ring.append(1_000 * MIN, 1_001 * MIN, 3.0, 3.0, 3.0, 3.0, 3.0, True)     # doublon → remplacement
+    bars = ring.slice(0, 10_000 * MIN)
+    assert [b.e // MIN for b in bars] == [1_000, 1_001, 1_002, 1_003]
+    assert bars[1].c == 3.0 and bars[1].op == 3.0 and bars[1].in_opening_range
+    assert bars[2].c == 2.0 and bars[2].op is None
+
+
+def test_has_day_and_to_doc():
+    from app.services import bar_store
+    day = "2100-01-04"
+    e = bar_store._day_bounds(day)[0] + 14 * 60 * MIN + 31 * MIN
+    bar_store.append("I:TEST", e - MIN, e, 1, 2, 0.5, 1.5, 1.0, False)
+    bar_store.annotate("I:TEST", e, "mean_revert", "REJECT")
+    assert bar_store.has_day(day)
+    assert not bar_store.has_day("2000-01-04")
+    doc = bar_store.to_doc("I:TEST", bar_store.latest("I:TEST"))
+    assert doc["day"] == day and doc["utc_time"] == "2100-01-04 14:31:00"
+    assert doc["strategy_decisions"] == {"mean_revert": "REJECT"}
+
+
+def test_candle_lazy_day_and_doc():
+    from app.services.bar_store import Candle
+    e = 4_102_497_060_000  # 2100-01-01 14:31 UTC
+    c = Candle("I:TEST", e - MIN, e, 1.0, 2.0, 0.5, 1.5, None, True)
+    assert c._day is None
+    assert c.day == "2100-01-01" and c._day == "2100-01-01"
+    assert c.doc_id == f"I:TEST_{e}"
+    doc = c.to_doc()
+    assert doc["utc_time"] == "2100-01-01 14:31:00"
+    assert doc["in_opening_range"] is True and doc["ev"] == "AM"
+    assert set(doc) == {"ev", "sym", "op", "o", "c", "h", "l", "s", "e", "utc_time", "day", "in_opening_range"}
+    assert not hasattr(c, "__dict__")
+
+
+def test_decisions_follow_ring_lock():
+    import threading
+    from app.services.bar_store import BarRing
+    ring, errors, t0, n = BarRing(capacity=50), [], 1_000 * MIN, 3_000
+
+    def run(fn):
+        try:
+            fn()
+        except Exception as e:
+            errors.append(e)
+
+    def writer():
+        for i in range(n):
+            e = t0 + i * MIN
+            ring.append(e - MIN, e, 1.0, 2.0, 0.5, 1.5, None, False)   # évince et purge les décisions
+            ring.annotate(e, "mean_revert", "REJECT")
+
+    def reader():
+        for _ in range(n):
+            ring.decisions_between(t0, t0 + n * MIN)
+            ring.decisions_at(t0)
+
+    threads = [threading.Thread(target=run, args=(fn,)) for fn in (writer, reader, reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    decisions = ring.decisions_between(t0, t0 + n * MIN)
+    assert sorted(decisions) == [b.e for b in ring.slice(t0, t0 + n * MIN)]
+    assert decisions[ring.latest().e] == {"mean_revert": "REJECT"}
+
+
+if __name__ == "__main__":
+    test_latest_and_slice()
+    test_ring_eviction_keeps_order()
+    test_out_of_order_insert_and_replace()
+    test_has_day_and_to_doc()
+    test_candle_lazy_day_and_doc()
+    test_decisions_follow_ring_lock()
+    print("ALL TESTS PASSED")
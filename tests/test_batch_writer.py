@@ -0,0 +1,101 @@
+# tests/test_batch_writer.py
+"""
+Unit tests for the background Firestore batch writer.
+Run with: python -m tests.test_batch_writer (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+
+class _FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.path, data, merge))
+
+    def commit(self):
+        self.db.commits.append(self.writes)
+
+
+class _FakeRef:
+    def __init__(self, path):
+        self.path = path
+
+
+class _FakeCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id=None):
+        return _FakeRef(f"{self.name}/{doc_id or 'auto'}")
+
+
+class _FakeDb:
+    def __init__(self):
+        self.commits = []
+
+    def batch(self):
+        return _FakeBatch(self)
+
+    def collection(self, name):
+        return _FakeCollection(name)
+
+
+def _make_writer(**kwargs):
+    from app.services import batch_writer
+    db = _FakeDb()
+    batch_writer.get_firestore = lambda: db
+    return batch_writer.BatchWriter("test", **kwargs), db
+
+
+def test_flush_commits_pending_writes():
+    writer, db = _make_writer(batch_size=50, flush_interval=5.0)
+    for i in range(3):
+        writer.enqueue("ohlc_1m", f"I:SPX_{i}", {"c": i})
+    assert writer.flush(timeout=2.0)
+    assert len(db.commits) == 1
+    assert [w[0] for w in db.commits[0]] == ["ohlc_1m/I:SPX_0", "ohlc_1m/I:SPX_1", "ohlc_1m/I:SPX_2"]
+    stats = writer.get_stats()
+    assert stats["docs_written"] == 3 and stats["queue_depth"] == 0
+    writer.stop()
+
+
+def test_batch_size_threshold_splits_commits():
+    writer, db = _make_writer(batch_size=2, flush_interval=5.0)
+    for i in range(5):
+        writer.enqueue("ohlc_1m", f"I:NDX_{i}", {"c": i})
+    writer.stop()
+    assert sum(len(c) for c in db.commits) == 5
+    assert all(len(c) <= 2 for c in db.commits)
+
+
+def test_merge_is_coalesced_into_pending_set():
+    writer, db = _make_writer(batch_size=50, flush_interval=5.0)
+    candle = {"sym": "I:SPX", "c": 1.0}
+    writer.enqueue("ohlc_1m", "I:SPX_1", candle)
+    writer.enqueue("ohlc_1m", "I:SPX_1", {"strategy_decisions": {"mean_revert": "ACCEPT: LONG"}}, merge=True)
+    writer.enqueue("ohlc_1m", "I:SPX_1", {"strategy_decisions": {"trend_follow": "REJECT"}}, merge=True)
+    writer.stop()
+    writes = [w for c in db.commits for w in c]
+    assert len(writes) == 1
+    path, data, merge = writes[0]
+    assert merge is False
+    assert data["strategy_decisions"] == {"mean_revert": "ACCEPT: LONG", "trend_follow": "REJECT"}
+    assert "strategy_decisions" not in candle  # le dict de l'appelant n'est pas muté
+
+
+if __name__ == "__main__":
+    test_flush_commits_pending_writes()
+    test_batch_size_threshold_splits_commits()
+    test_merge_is_coalesced_into_pending_set()
+    print("ALL TESTS PASSED")
@@ -0,0 +1,104 @@
+# tests/test_candle_archive.py
+"""
+Unit tests for the per-symbol/day columnar candle archive (mmap reader).
+Run with: python -m tests.test_candle_archive (from server/)
+"""
+import sys
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+MIN = 60_000
+DAY0 = 1704153600000  # 2024-01-02 00:00 UTC
+
+
+def _rows(day_start, n, first=870):
+    return [(day_start + (first + i - 1) * MIN, day_start + (first + i) * MIN,
+             100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, None if i else 100.0, i < 15, i == 3)
+            for i in range(n)]
+
+
+def test_roundtrip_and_zero_copy_columns():
+    from app.services import candle_archive as ca
+    ca.ARCHIVE_DIR = tempfile.mkdtemp()
+    rows = _rows(DAY0, 120)
+    assert ca.write_day("I:SPX", "2024-01-02", list(reversed(rows)), {rows[20][1]: {"mean_revert": "REJECT"}}) == 120
+    cols = ca.open_day("I:SPX", "2024-01-02")
+    assert isinstance(cols.e, memoryview) and cols.e.format == "q" and len(cols) == 120
+    assert list(cols.e) == [r[1] for r in rows]
+    b = cols.bar(0)
+    assert (b.o, b.op, b.in_opening_range) == (100.0, 100.0, True)
+    assert cols.bar(1).op is None and not cols.bar(15).in_opening_range
+
+    docs = ca.day_docs("2024-01-02")
+    assert docs[3]["backfilled"] is True and "backfilled" not in docs[4]
+    assert docs[20]["strategy_decisions"] == {"mean_revert": "REJECT"}
+    assert docs[0]["utc_time"] == "2024-01-02 14:30:00" and docs[0]["sym"] == "I:SPX"
+
+
+def test_range_query_spans_days():
+    from app.services import candle_archive as ca
+    ca.ARCHIVE_DIR = tempfile.mkdtemp()
+    for offset, day in ((0, "2024-01-02"), (1, "2024-01-03"), (3, "2024-01-05")):
+        ca.write_day("I:NDX", day, _rows(DAY0 + offset * 86_400_000, 10))
+    start = DAY0 + 875 * MIN                 # 2024-01-02 14:35
+    end = DAY0 + 86_400_000 * 3 + 872 * MIN  # 2024-01-05 14:32 (le 04 n'existe pas)
+    bars = ca.load_range("I:NDX", start, end)
+    assert [b.e for b in bars][:2] == [start, start + MIN]
+    assert len(bars) == 5 + 10 + 3
+    assert all(a.e < b.e for a, b in zip(bars, bars[1:]))
+    # réécriture d'un jour : le cache mmap est invalidé
+    ca.write_day("I:NDX", "2024-01-02", _rows(DAY0, 2))
+    assert len(ca.open_day("I:NDX", "2024-01-02")) == 2
+
+
+def test_archive_session_from_bar_store():
+    from app.services import candle_archive as ca, bar_store
+    ca.ARCHIVE_DIR = tempfile.mkdtemp()
+    day_start = 4102444800000  # 2100-01-01
+    for r in _rows(day_start, 30):
+        bar_store.append("I:ARCH", *r[:8])
+    bar_store.annotate("I:ARCH", day_start + 880 * MIN, "trend_follow", "ACCEPT: LONG")
+    written = ca.archive_session("2100-01-01")
+    assert written["I:ARCH"] == 30
+    assert ca.read_decisions("I:ARCH", "2100-01-01") == {day_start + 880 * MIN: {"trend_follow": "ACCEPT: LONG"}}
+
+
+def test_reader_survives_rewrite_and_eviction():
+    from unittest.mock import patch
+    from app.services import candle_archive as ca
+    ca.ARCHIVE_DIR = tempfile.mkdtemp()
+    ca.write_day("I:SPX", "2024-01-02", _rows(DAY0, 10))
+    start, end = DAY0, DAY0 + 86_400_000 - 1
+
+    # réécriture du jour pendant une lecture : le lecteur finit sur l'ancien fichier
+    reader = ca.iter_bars("I:SPX", start, end)
+    assert next(reader).o == 100.0
+    ca.write_day("I:SPX", "2024-01-02", _rows(DAY0, 3))
+    assert len(list(reader)) == 9
+    assert len(ca.load_range("I:SPX", start, end)) == 3
+
+    # éviction LRU pendant une lecture : idem
+    with patch.object(ca, "MAX_OPEN_FILES", 1):
+        reader = ca.iter_bars("I:SPX", start, end)
+        assert next(reader).o == 100.0
+        for offset, day in ((1, "2024-01-03"), (2, "2024-01-04")):
+            ca.write_day("I:SPX", day, _rows(DAY0 + offset * 86_400_000, 2))
+            ca.open_day("I:SPX", day)
+        assert ca.path_for("I:SPX", "2024-01-02") not in ca._open
+        assert [b.o for b in reader] == [101.0, 102.0]
+
+
+if __name__ == "__main__":
+    test_roundtrip_and_zero_copy_columns()
+    test_range_query_spans_days()
+    test_archive_session_from_bar_store()
+    test_reader_survives_rewrite_and_eviction()
+    print("ALL TESTS PASSED")
@@ -0,0 +1,93 @@
+# tests/test_config_service.py
+"""
+Unit tests for the in-memory config cache (versioned snapshots, local writes, listener updates).
+Run with: python -m tests.test_config_service (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import config_service
+
+
+class _ConfigDoc:
+    """Document Firestore en mémoire : update() fusionne les champs, le listener reçoit le document entier."""
+
+    def __init__(self, data):
+        self.data, self.exists = dict(data), True
+        self.listener = None
+
+    def to_dict(self):
+        return dict(self.data)
+
+    def get(self):
+        return self
+
+    def on_snapshot(self, callback):
+        self.listener = callback
+        return MagicMock()
+
+    def update(self, fields):
+        self.data.update(fields)
+        self.listener([self], [], None)
+
+
+def _start(strategies, settings):
+    docs = {"strategies": _ConfigDoc(strategies), "settings": _ConfigDoc(settings)}
+    db = MagicMock()
+    db.collection.return_value.document.side_effect = lambda name: docs[name]
+    config_service.stop()
+    with patch.object(config_service, "get_firestore", return_value=db), \
+         patch.object(config_service, "log_to_firestore"):
+        config_service.start()
+    return docs
+
+
+def test_snapshot_update_bumps_version():
+    docs = _start({"fake_breakout": True}, {"risk_chf": 50})
+    before = config_service.get_snapshot()
+    docs["strategies"].update({"fake_breakout": False})
+    after = config_service.get_snapshot()
+    assert after.version == before.version + 1
+    assert not after.is_enabled("fake_breakout")
+    assert before.is_enabled("fake_breakout")   # snapshot déjà pris : inchangé
+    config_service.stop()
+
+
+def test_apply_local_seen_by_get_snapshot():
+    _start({}, {"risk_chf": 50, "exit_plans": {"plans": {}}})
+    version = config_service.get_snapshot().version
+    plans = {"plans": {"scaling_3": {"rungs": [{"r": 1, "fraction": 0.5}]}}}
+    config_service.apply_local("settings", {"exit_plans": plans})
+    snap = config_service.get_snapshot()
+    assert snap.version == version + 1
+    assert snap.settings["exit_plans"] == plans and snap.settings["risk_chf"] == 50
+    config_service.stop()
+
+
+def test_partial_update_keeps_other_keys():
+    docs = _start({"fake_breakout": True, "ichimoku": True}, {"risk_chf": 50, "max_trades": 3})
+    docs["settings"].update({"risk_chf": 75})
+    snap = config_service.get_snapshot()
+    assert dict(snap.settings) == {"risk_chf": 75, "max_trades": 3}
+    assert dict(snap.strategies) == {"fake_breakout": True, "ichimoku": True}
+    config_service.stop()
+
+
+if __name__ == "__main__":
+    tests = [
+        test_snapshot_update_bumps_version,
+        test_apply_local_seen_by_get_snapshot,
+        test_partial_update_keeps_other_keys,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
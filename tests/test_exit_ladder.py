@@ -0,0 +1,139 @@
+# tests/test_exit_ladder.py
+"""
+Unit tests for broker-side laddered take-profits (placement at entry, fill reconciliation).
+Run with: python -m tests.test_exit_ladder (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import shared_strategy_tools, trade_tracker, transaction_stream, exit_plan
+
+BROKER_MODE = {"scaling_mode": "broker"}
+
+
+def _plan(fill, direction, risk, units, step, offset=0.0001):
+    spec = exit_plan.DEFAULT_PLANS["scaling_3"]
+    return exit_plan.compile_plan("scaling_3", spec, fill, direction, risk, units, step, offset)
+
+
+def _ladder_trade():
+    plan = _plan(1.1000, "LONG", 0.0010, 1000, 1)
+    plan["rungs"][0]["order_id"], plan["rungs"][1]["order_id"] = "301", "302"
+    return {
+        "instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "tp": 1.1060,
+        "outcome": "open", "initial_units": 1000.0, "risk_r": 0.0010, "step": 1, "exit_plan": plan,
+    }
+
+
+def test_ladder_placed_at_entry():
+    oanda = MagicMock()
+    oanda.create_reduce_only_limit.side_effect = ["301", "302"]
+    result = {"units": -1000.0, "oanda_trade_id": "201", "fill_price": 1.1000}
+    plan = _plan(1.1000, "SHORT", 0.0010, 1000, 1)
+    with patch.object(shared_strategy_tools, "oanda_service", oanda), \
+         patch.object(shared_strategy_tools, "log_to_firestore"):
+        assert shared_strategy_tools.place_exit_ladder("EUR_USD", result, "SHORT", plan, 1.0940) == {}
+        assert not oanda.create_reduce_only_limit.called
+        assert shared_strategy_tools.place_exit_ladder("EUR_USD", result, "SHORT", plan, 1.0940,
+                                                       settings=BROKER_MODE) == {}
+
+    calls = [c.args for c in oanda.create_reduce_only_limit.call_args_list]
+    assert [(inst, units) for inst, units, _ in calls] == [("EUR_USD", 500.0), ("EUR_USD", 250.0)]
+    assert [round(price, 4) for _, _, price in calls] == [1.0990, 1.0980]
+    assert [r["order_id"] for r in plan["rungs"]] == ["301", "302"]
+    assert exit_plan.next_trigger(plan) is None   # plus rien à surveiller au prix
+
+
+def test_failed_rung_cancels_ladder_and_keeps_kraken_tp():
+    kraken = MagicMock()
+    kraken.add_take_profit.side_effect = ["T1", RuntimeError("EOrder:Insufficient funds")]
+    result = {"units": 0.1, "trade_id": "OABC", "tp_txid": "TPFULL", "fill_price": 60000.0}
+    plan = _plan(60000.0, "LONG", 1000.0, 0.1, 0.0001)
+    with patch.object(shared_strategy_tools, "kraken_service", kraken), \
+         patch.object(shared_strategy_tools, "log_to_firestore"):
+        fields = shared_strategy_tools.place_exit_ladder(
+            "XBTUSD", result, "LONG", plan, 66000.0, broker="kraken", settings=BROKER_MODE)
+    assert fields == {}
+    kraken.cancel_order.assert_called_once_with("T1")   # le TP complet d'origine reste en place
+    assert not any(r.get("order_id") for r in plan["rungs"])   # paliers exécutés par le tracker
+
+
+def test_cycle_reconciles_filled_rung_from_mirror():
+    doc_ref, data = MagicMock(), _ladder_trade()
+    mirror, oanda = MagicMock(), MagicMock()
+    mirror.trade_ids.return_value = {"201"}
+    mirror.order_state.side_effect = lambda oid: {"301": ("FILLED", "1.10102"), "302": ("PENDING", None)}[oid]
+    trade_tracker._finalized.clear()
+    trade_tracker._ladder_applied.clear()
+    with patch.object(trade_tracker, "load_open_trades", return_value=[(doc_ref, "201", "oanda", data)]), \
+         patch.object(trade_tracker, "account_mirror", mirror), \
+         patch.object(trade_tracker, "oanda_service", oanda), \
+         patch.object(trade_tracker, "_auto_close_trade", return_value=False), \
+         patch.object(trade_tracker, "log_to_firestore"), \
+         patch.object(trade_tracker, "log_trade_event"):
+        trade_tracker._run_cycle()
+        trade_tracker._run_cycle()  # cycle suivant : déjà réconcilié
+
+    oanda.close_trade.assert_not_called()
+    oanda.get_latest_prices.assert_not_called()   # plus de prix à surveiller : paliers chez le broker
+    oanda.modify_trade_sl.assert_called_once_with("201", 1.1001, "EUR_USD")
+    update = doc_ref.update.call_args.args[0]
+    assert update["breakeven_applied"] and update["sl"] == 1.1001
+    rungs = update["exit_plan"]["rungs"]
+    assert update["exit_plan"]["done"] == 1 and [r["state"] for r in rungs] == ["filled", "pending"]
+    assert rungs[0]["fill_price"] == 1.10102 and rungs[0]["slippage"] == 0.00002
+
+
+def test_stream_fill_moves_stop_once():
+    doc_ref, data = MagicMock(), _ladder_trade()
+    data.update({"sl": 1.1001, "breakeven_applied": True})
+    data["exit_plan"]["rungs"][0]["state"] = "filled"
+    data["exit_plan"]["done"] = 1
+    fill = {"type": "ORDER_FILL", "reason": "LIMIT_ORDER", "orderID": "302", "price": "1.1020",
+            "tradeReduced": {"tradeID": "201", "units": "-250", "price": "1.1020", "realizedPL": "5.0"}}
+    oanda = MagicMock()
+    trade_tracker._ladder_applied.clear()
+    with patch.object(trade_tracker, "find_open_trade", return_value=(doc_ref, data)), \
+         patch.object(trade_tracker, "oanda_service", oanda), \
+         patch.object(trade_tracker, "log_to_firestore"), \
+         patch.object(trade_tracker, "log_trade_event"):
+        transaction_stream.handle_transaction(fill)
+        transaction_stream.handle_transaction(fill)   # rejouée : pas de 2e déplacement du SL
+
+    oanda.modify_trade_sl.assert_called_once()
+    assert round(oanda.modify_trade_sl.call_args.args[1], 4) == 1.1010   # SL -> +1R
+    update = doc_ref.update.call_args.args[0]
+    assert update["exit_plan"]["done"] == 2 and update["exit_plan"]["rungs"][1]["slippage"] == 0.0
+
+
+def test_reduce_only_limit_units_precision():
+    from app.services import oanda_service
+    http = MagicMock()
+    http.post.return_value.json.return_value = {"orderCreateTransaction": {"id": "301"}}
+    with patch.object(oanda_service, "_http", http):
+        oanda_service.create_reduce_only_limit("EUR_USD", -500.0, 1.0990)
+        oanda_service.create_reduce_only_limit("SPX500_USD", 1.25, 5000.0)
+    sent = [c.kwargs["json"]["order"]["units"] for c in http.post.call_args_list]
+    assert sent == ["-500", "1.2"]   # forex : units entières ; CFD : au dixième
+
+
+if __name__ == "__main__":
+    tests = [
+        test_ladder_placed_at_entry,
+        test_failed_rung_cancels_ladder_and_keeps_kraken_tp,
+        test_cycle_reconciles_filled_rung_from_mirror,
+        test_stream_fill_moves_stop_once,
+        test_reduce_only_limit_units_precision,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
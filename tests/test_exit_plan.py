@@ -0,0 +1,163 @@
+# tests/test_exit_plan.py
+"""
+Unit tests for data-driven exit plans (N rungs, trailing stop, legacy trades).
+Run with: python -m tests.test_exit_plan (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import exit_plan, trade_tracker
+
+SETTINGS = {
+    "exit_plans": {
+        "ladder_4": {
+            "rungs": [{"r": 0.5, "fraction": 0, "stop": "be"}, {"r": 1, "fraction": 0.3, "stop": "be"},
+                      {"r": 2, "fraction": 0.3, "stop": 1}, {"r": 3, "fraction": 0.3, "stop": 2}],
+            "trailing": {"type": "pct", "pct": 0.1, "after": 4},
+        },
+    },
+    "exit_plan_by_strategy": {"ichimoku": "ladder_4", "unknown_plan": "nope"},
+}
+
+
+def test_plan_from_config_compiles_to_price_levels():
+    name, spec = exit_plan.plan_for("ichimoku", SETTINGS, "scaling_3")
+    assert name == "ladder_4"
+    assert exit_plan.plan_for("supply_demand", SETTINGS, "scaling_3")[0] == "scaling_3"
+    assert exit_plan.plan_for("x", {"exit_plan_by_strategy": {"x": "nope"}})[0] == "breakeven"
+
+    plan = exit_plan.compile_plan(name, spec, 1.1000, "SHORT", 0.0010, 1000, 1, 0.0001)
+    assert [round(r["level"], 4) for r in plan["rungs"]] == [1.0995, 1.0990, 1.0980, 1.0970]
+    assert [r["units"] for r in plan["rungs"]] == [0.0, 300.0, 300.0, 300.0]
+    assert [round(r["stop_price"], 4) for r in plan["rungs"]] == [1.0999, 1.0999, 1.0990, 1.0980]
+    assert exit_plan.next_trigger(plan)[0] == "rung0"
+    plan["done"] = 4
+    rule, level = exit_plan.next_trigger(plan)
+    assert rule == "trail0" and round(level, 6) == round(1.0970 - 0.25 * 1.1000 * 0.001, 6)
+
+
+def test_rungs_and_trailing_applied_in_order():
+    name, spec = exit_plan.plan_for("ichimoku", SETTINGS)
+    plan = exit_plan.compile_plan(name, spec, 1.1000, "LONG", 0.0010, 1000, 1, 0.0001)
+    data = {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "tp": 1.1060,
+            "exit_plan": plan}
+    doc_ref, oanda = MagicMock(), MagicMock()
+    oanda.close_trade.side_effect = lambda tid, units: {"orderFillTransaction": {"price": "1.10101"}}
+
+    def tick(price):
+        trig = exit_plan.next_trigger(data["exit_plan"])
+        trade_tracker.apply_exit_rule(doc_ref, "201", "oanda", data, trig[0], price)
+
+    with patch.object(trade_tracker, "oanda_service", oanda), \
+         patch.object(trade_tracker, "log_to_firestore"), \
+         patch.object(trade_tracker, "log_trade_event"):
+        tick(1.1005)                       # 0.5R : stop au BE, rien de fermé
+        assert not oanda.close_trade.called and data["sl"] == 1.1001 and data["breakeven_applied"]
+        tick(1.1008)                       # sous 1R : règle non déclenchée
+        assert data["exit_plan"]["done"] == 1
+        tick(1.1010)                       # 1R : 30 %, stop déjà au BE
+        assert oanda.close_trade.call_args.kwargs["units"] == 300.0
+        assert oanda.modify_trade_sl.call_count == 1
+        for price in (1.1020, 1.1030):
+            tick(price)
+        assert data["sl"] == 1.1020 and data["exit_plan"]["done"] == 4
+        tick(1.1033)                       # trailing 0.1 % (~11 pips) : cran à +25 % de la distance
+        assert data["sl"] == round(1.1033 - 1.1000 * 0.001, 5)
+        assert data["exit_plan"]["trailing"]["moves"] == 1
+
+    rungs = data["exit_plan"]["rungs"]
+    assert [r["state"] for r in rungs] == ["filled"] * 4
+    assert rungs[1]["fill_price"] == 1.10101 and rungs[1]["slippage"] == 0.00001
+    assert "fill_price" not in rungs[0]   # palier stop seul : pas de fill
+    assert trade_tracker.partially_closed(data)
+
+
+def test_legacy_trade_resumes_at_its_scaling_step():
+    data = {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.1001,
+            "risk_r": 0.0010, "initial_units": 1000, "step": 1, "scaling_step": 1, "breakeven_applied": True}
+    plan = trade_tracker.plan_of(data)
+    rule, level = exit_plan.next_trigger(plan)
+    assert rule == "rung1" and round(level, 4) == 1.1020
+    assert plan["rungs"][1]["units"] == 250.0
+    assert exit_plan.next_trigger(trade_tracker.plan_of({**data, "scaling_step": 2})) is None
+
+    be_only = {"instrument": "EUR_USD", "direction": "SHORT", "fill_price": 1.1000, "sl": 1.1010}
+    rule, level = exit_plan.next_trigger(trade_tracker.plan_of(be_only))
+    assert rule == "rung0" and round(level, 4) == 1.0995
+    assert not trade_tracker.partially_closed(be_only)
+
+
+def test_close_after_rungs_outcome_and_labels():
+    def finalize(plan, done, sl, details):
+        for rung in plan["rungs"][:done]:
+            rung["state"] = "filled"
+        plan["done"] = done
+        data = {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": sl, "exit_plan": plan}
+        doc_ref = MagicMock()
+        with patch.object(trade_tracker, "_on_closed"), \
+             patch.object(trade_tracker, "log_to_firestore"), \
+             patch.object(trade_tracker, "log_trade_event"):
+            trade_tracker._finalize_closed(doc_ref, "201", data, {"realizedPL": details[0], **details[1]}, "oanda")
+        update = doc_ref.update.call_args.args[0]
+        return update["outcome"], update["close_reason"]
+
+    def scaling_3():
+        return exit_plan.compile_plan("scaling_3", exit_plan.DEFAULT_PLANS["scaling_3"],
+                                      1.1000, "LONG", 0.0010, 1000, 1, 0.0001)
+
+    sl_hit, tp_hit = {"sl_filled": True}, {"tp_filled": True}
+    # plan par défaut : libellés historiques
+    assert finalize(scaling_3(), 1, 1.1001, ("2.0", sl_hit)) == ("win", "BE SL (apres TP1)")
+    assert finalize(scaling_3(), 2, 1.1010, ("6.0", sl_hit)) == ("win", "SL +1R (apres TP2)")
+    assert finalize(scaling_3(), 2, 1.1010, ("9.0", tp_hit)) == ("win", "TP3")
+    # plan sans déplacement du stop : SL sous l'entrée après TP1 -> perte
+    spec = {"rungs": [{"r": 1, "fraction": 0.3, "stop": None}]}
+    plan = exit_plan.compile_plan("no_stop", spec, 1.1000, "LONG", 0.0010, 1000, 1, 0.0001)
+    assert finalize(plan, 1, 1.0990, ("-4.0", sl_hit)) == ("loss", "SL (apres TP1)")
+
+
+def test_exit_plans_endpoint_validates_and_replaces_field():
+    import asyncio
+    from app.routers import strategy
+
+    def put(body):
+        request = MagicMock()
+        request.json.side_effect = lambda: asyncio.sleep(0, result=body)
+        return asyncio.run(strategy.update_exit_plans(request))
+
+    db = MagicMock()
+    with patch.object(strategy, "get_firestore", return_value=db), \
+         patch.object(strategy.config_service, "apply_local") as apply_local:
+        for body in ({"plans": {"p": {"rungs": [1, 2]}}}, {"plans": {"p": {"rungs": [{"r": 1, "fraction": 1}]}}},
+                     {"by_strategy": {"ichimoku": "nope"}}, {}):
+            assert "error" in put(body), body
+        plans = {"p": {"rungs": [{"r": 1, "fraction": 0.5, "stop": "be"}]}}
+        assert put({"plans": plans}) == {"exit_plans": plans}
+
+    settings = db.collection.return_value.document.return_value
+    # document cree s'il manque, champ exit_plans remplace (pas fusionne)
+    settings.set.assert_called_once_with({"exit_plans": plans}, merge=["exit_plans"])
+    settings.update.assert_not_called()
+    apply_local.assert_called_once_with("settings", {"exit_plans": plans})
+
+
+if __name__ == "__main__":
+    tests = [
+        test_plan_from_config_compiles_to_price_levels,
+        test_rungs_and_trailing_applied_in_order,
+        test_legacy_trade_resumes_at_its_scaling_step,
+        test_close_after_rungs_outcome_and_labels,
+        test_exit_plans_endpoint_validates_and_replaces_field,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
@@ -0,0 +1,115 @@
+# tests/test_exit_scheduler.py
+"""
+Unit tests for exact-time closes (session end, weekend, max hold) scheduled per trade.
+Run with: python -m tests.test_exit_scheduler (from server/)
+"""
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from apscheduler.schedulers.background import BackgroundScheduler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import exit_scheduler, trade_tracker
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def _app_scheduler():
+    """Scheduler de l'app (news_scheduler) avec un job à lui."""
+    scheduler = BackgroundScheduler(timezone="UTC")
+    scheduler.add_job(print, "cron", hour=0, minute=5, id="daily_refresh")
+    scheduler.start()
+    return scheduler
+
+
+def test_close_times():
+    wed = _utc(2026, 10, 14, 14, 0)
+    times = exit_scheduler.close_times("SPX500_USD", "oanda", now=wed)
+    assert times["session_end"] == _utc(2026, 10, 14, 15, 25)   # trade_end 15:30 - 5 min
+    assert times["weekend"] == _utc(2026, 10, 16, 20, 55)        # vendredi suivant
+
+    times = exit_scheduler.close_times("EUR_USD", "oanda", "2026-10-14T14:30:00+00:00", now=wed)
+    assert set(times) == {"weekend", "max_hold"} and times["max_hold"] == _utc(2026, 10, 14, 14, 30)
+    assert exit_scheduler.close_times("XBTUSD", "kraken", now=wed) == {}
+
+
+def test_weekend_check_after_21h():
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return _utc(2026, 10, 16, 21, 30)   # vendredi 21:30 : minute < 55 mais après 20:55
+
+    with patch.object(trade_tracker, "datetime", FakeDatetime):
+        assert trade_tracker._should_close_before_weekend("EUR_USD", "oanda")
+        assert not trade_tracker._should_close_before_weekend("XBTUSD", "kraken")
+
+
+def test_max_hold_fires_at_exact_time():
+    exit_scheduler.stop()
+    doc_ref, data = MagicMock(), {"instrument": "EUR_USD", "outcome": "open"}
+    max_hold = (datetime.now(timezone.utc) + timedelta(milliseconds=300)).isoformat()
+    force = MagicMock(return_value=True)
+    with patch.object(trade_tracker, "load_open_trades", return_value=[]), \
+         patch.object(trade_tracker, "find_open_trade", return_value=(doc_ref, data)), \
+         patch.object(trade_tracker, "force_close_trade", force), \
+         patch.object(exit_scheduler, "log_to_firestore"):
+        scheduler = _app_scheduler()
+        exit_scheduler.start(scheduler)
+        try:
+            assert exit_scheduler.register("201", "oanda", "EUR_USD", max_hold) == ["weekend", "max_hold"]
+            assert exit_scheduler.register("201", "oanda", "EUR_USD", max_hold) == []   # déjà planifié
+            deadline = time.time() + 3
+            while not force.called and time.time() < deadline:
+                time.sleep(0.02)
+            force.assert_called_once_with(doc_ref, "201", data, "max_hold_expired", "oanda")
+            assert exit_scheduler.get_stats()["jobs"] == 1   # reste le job du week-end
+
+            exit_scheduler.cancel("201", "oanda")            # clôture finalisée
+            assert exit_scheduler.get_stats()["jobs"] == 0
+        finally:
+            exit_scheduler.stop()
+            scheduler.shutdown(wait=False)
+
+
+def test_restore_open_trades_on_start():
+    exit_scheduler.stop()
+    trades = [(MagicMock(), "201", "oanda", {"instrument": "SPX500_USD"}),
+              (MagicMock(), "OABC", "kraken", {"instrument": "XBTUSD"})]
+    with patch.object(trade_tracker, "load_open_trades", return_value=trades), \
+         patch.object(exit_scheduler, "log_to_firestore"):
+        scheduler = _app_scheduler()
+        exit_scheduler.start(scheduler)
+        try:
+            stats = exit_scheduler.get_stats()
+            assert stats["restored"] >= 1 and stats["trades"] == 1   # crypto : pas de clôture à heure fixe
+            assert stats["jobs"] == 2
+            assert {j.id for j in scheduler.get_jobs()} == {
+                "daily_refresh", "close_oanda_201_session_end", "close_oanda_201_weekend"}
+            exit_scheduler.stop()                        # retire ses jobs, le scheduler de l'app continue
+            assert [j.id for j in scheduler.get_jobs()] == ["daily_refresh"] and scheduler.running
+        finally:
+            exit_scheduler.stop()
+            scheduler.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    tests = [
+        test_close_times,
+        test_weekend_check_after_21h,
+        test_max_hold_fires_at_exact_time,
+        test_restore_open_trades_on_start,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
@@ -0,0 +1,115 @@
+# tests/test_http_session.py
+"""
+Unit tests for the pooled broker HTTP session (timeouts, idempotent-only retries, rate cap).
+Run with: python -m tests.test_http_session (from server/)
+"""
+import sys
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hits = {}
+    fail_first = 1
+
+    def _reply(self):
+        n = _Handler.hits[self.path] = _Handler.hits.get(self.path, 0) + 1
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status = 503 if self.path.startswith("/flaky") and n <= _Handler.fail_first else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def _server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Handler.hits.clear()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def test_idempotent_retry_and_stats():
+    from app.services.http_session import BrokerSession
+    server, base = _server()
+    try:
+        http = BrokerSession("test")
+        with patch("app.services.http_session.time.sleep"):
+            r = http.get(base + "/flaky-get", endpoint="pricing")
+            assert r.status_code == 200 and _Handler.hits["/flaky-get"] == 2
+            # POST (ordre) : pas de retry sur 503
+            r = http.post(base + "/flaky-post", endpoint="create_order")
+            assert r.status_code == 503 and _Handler.hits["/flaky-post"] == 1
+            # PUT déclaré idempotent : rejoué
+            r = http.put(base + "/flaky-put", endpoint="trade_orders", idempotent=True)
+            assert r.status_code == 200 and _Handler.hits["/flaky-put"] == 2
+        stats = http.get_stats()
+        assert stats["pricing"]["calls"] == 2 and stats["pricing"]["retries"] == 1
+        assert stats["pricing"]["errors"] == 1 and stats["pricing"]["last_status"] == 200
+        assert stats["create_order"]["retries"] == 0
+    finally:
+        server.shutdown()
+
+
+def test_read_timeout_not_replayed_for_orders():
+    import requests
+    from app.services.http_session import BrokerSession
+    server, base = _server()
+    try:
+        http = BrokerSession("test-timeout", read_timeout=0.1)
+        try:
+            http.post(base + "/slow", endpoint="create_order")
+            assert False, "timeout attendu"
+        except requests.exceptions.ReadTimeout:
+            pass
+        assert _Handler.hits["/slow"] == 1
+        assert http.get_stats()["create_order"]["errors"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_rate_limit_caps_requests_per_broker():
+    from app.services.http_session import BrokerSession
+    server, base = _server()
+    try:
+        http = BrokerSession("test-rate", rate_limit=(4.0, 2))
+        t0 = time.monotonic()
+        for _ in range(4):
+            assert http.get(base + "/ok", endpoint="pricing").status_code == 200
+        # rafale de 2, puis 4 req/s : les 2 suivantes attendent ~250 ms chacune
+        assert time.monotonic() - t0 >= 0.45
+        stats = http.limiter.get_stats()
+        assert stats["waits"] == 2 and stats["tokens"] < 1
+        assert http.limiter.available() < 1   # pas de jeton pour un relevé optionnel
+
+        # ordre : jamais en attente derrière le polling, ni compté dans le seau
+        t0 = time.monotonic()
+        assert http.post(base + "/ok", endpoint="create_order").status_code == 200
+        assert time.monotonic() - t0 < 0.2 and http.limiter.get_stats()["waits"] == 2
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_idempotent_retry_and_stats()
+    test_read_timeout_not_replayed_for_orders()
+    test_rate_limit_caps_requests_per_broker()
+    print("ALL TESTS PASSED")
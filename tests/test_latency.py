@@ -0,0 +1,91 @@
+# tests/test_latency.py
+"""
+Unit tests for signal latency traces and percentile aggregation.
+Run with: python -m tests.test_latency (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+
+def test_trace_stored_on_trade_and_aggregated():
+    from app.services import latency
+    from app.services.bar_store import Candle
+    candle = Candle("I:SPX", 0, 1_000_000, 1.0, 2.0, 0.5, 1.5, recv_ms=1_000_400)
+    trade_ref = MagicMock()
+    trade_ref.path = "trading_days/2024-07-02/symbols/I:SPX/trades/abc"
+
+    with patch.object(latency, "_now_ms", side_effect=[1_000_500, 1_000_520, 1_000_700, 1_000_710, 1_001_900, 1_002_000]), \
+         patch.object(latency.candle_writer, "enqueue") as enqueue:
+        trace = latency.start_trace("test_strat", candle)
+        for stage in ("decision", "price_fetched", "order_sent", "order_filled"):
+            trace.mark(stage)
+        trace.finish(trade_ref)
+
+    collection, doc_id, data = enqueue.call_args[0]
+    assert collection == "trading_days/2024-07-02/symbols/I:SPX/trades" and doc_id == "abc"
+    assert enqueue.call_args[1] == {"merge": True}
+    since = data["latency"]["since_bar_close_ms"]
+    assert since["ws_recv"] == 400 and since["order_filled"] == 1900 and since["trade_written"] == 2000
+
+    stats = latency.get_stats()["test_strat"]
+    assert stats["traces"] == 1
+    assert stats["stages"]["trade_written"]["p99"] == 2000
+
+
+def test_percentiles_nearest_rank():
+    from app.services import latency
+    values = list(range(1, 101))
+    assert latency._percentile(values, 50) == 50
+    assert latency._percentile(values, 95) == 95
+    assert latency._percentile(values, 99) == 99
+    assert latency._percentile([7], 99) == 7
+    assert latency._percentile([], 50) is None
+
+
+def test_failed_order_trace_recorded_once():
+    from app.services import latency
+    from app.services.bar_store import Candle
+    from app.services.session_calendar import calendar
+    from app.strategies import sp_mean_revert_multi as strat
+    b = calendar.bounds_for_day("I:SPX", "2024-07-02")
+    # ouverture au-dessus du range, clôture dedans : signal SHORT
+    candle = Candle("I:SPX", b.or_end_ms, b.or_end_ms + 60_000, 5010.0, 5012.0, 4998.0, 5000.0)
+    config = MagicMock()
+    config.settings = {}
+    db = MagicMock()
+    db.collection.return_value.document.return_value.collection.return_value.document.return_value \
+        .collection.return_value.where.return_value.where.return_value.stream.return_value = []
+    oanda = MagicMock()
+    oanda.get_candles.return_value = [{"h": 5015.0, "l": 4990.0}]
+
+    with patch.object(strat, "get_firestore", return_value=db), \
+         patch.object(strat.range_manager, "get_opening_range",
+                      return_value={"status": "ready", "high": 5005.0, "low": 4995.0}), \
+         patch.object(strat, "get_entry_price", return_value=5000.0), \
+         patch.object(strat, "oanda_service", oanda), \
+         patch.object(strat, "execute_trade", side_effect=RuntimeError("rejected")), \
+         patch.object(strat, "record_decision"), \
+         patch.object(strat, "log_to_firestore"), \
+         patch.object(latency, "_record") as record:
+        strat.process(candle, config)
+
+    record.assert_called_once()
+    strategy, marks = record.call_args.args
+    assert strategy == strat.STRATEGY_KEY and "order_sent" in marks and "trade_written" not in marks
+    db.collection.return_value.document.return_value.collection.return_value.document.return_value \
+        .collection.return_value.add.assert_not_called()
+
+
+if __name__ == "__main__":
+    test_trace_stored_on_trade_and_aggregated()
+    test_percentiles_nearest_rank()
+    test_failed_order_trace_recorded_once()
+    print("ALL TESTS PASSED")
@@ -0,0 +1,65 @@
+# tests/test_log_index.py
+"""
+Unit tests for the local SQLite/FTS execution log index.
+Run with: python -m tests.test_log_index (from server/)
+"""
+import sys
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+
+def _fresh_index():
+    from app.services import log_index
+    log_index._conn = None
+    log_index._connect(os.path.join(tempfile.mkdtemp(), "logs.db"))
+    entries = []
+    for i in range(10):
+        entries.append({"message": f"[mean_revert::I:SPX] Conditions non remplies {i}", "level": "NO_TRADING",
+                        "timestamp": f"2024-07-02T14:{i:02d}:00", "tag": "mean_revert"})
+    entries.append({"message": "[TradeTracker] Trade 48213 breakeven applique", "level": "TRADING",
+                    "timestamp": "2024-07-02T15:00:00", "tag": "TradeTracker"})
+    entries.append({"message": "[Webhook] ordre rejete", "level": "ERROR",
+                    "timestamp": "2024-07-03T09:00:00", "tag": "Webhook", "trade_id": "777"})
+    log_index.index_writes([("execution_logs", None, e, False) for e in entries])
+    return log_index
+
+
+def test_filters_and_tag_registry():
+    idx = _fresh_index()
+    assert idx.get_tags() == ["mean_revert", "TradeTracker", "Webhook"]
+    assert [e["timestamp"] for e in idx.query(level="error")[0]] == ["2024-07-03T09:00:00"]
+    assert len(idx.query(tag="MEAN_REVERT", limit=100)[0]) == 10
+    assert len(idx.query(date="2024-07-02", limit=100)[0]) == 11
+    assert idx.query(trade_id="48213")[0][0]["tag"] == "TradeTracker"
+    assert idx.query(trade_id="777")[0][0]["tag"] == "Webhook"
+    hits = idx.query(contains="conditions rempl 14:03")[0]
+    assert [e["timestamp"] for e in hits] == ["2024-07-02T14:03:00"]
+    # doublon (writer + warm) ignoré
+    idx.add_entries([{"message": "[Webhook] ordre rejete", "level": "ERROR",
+                      "timestamp": "2024-07-03T09:00:00", "tag": "Webhook"}])
+    assert len(idx.query(tag="webhook")[0]) == 1
+
+
+def test_cursor_pagination():
+    idx = _fresh_index()
+    seen, cursor = [], None
+    while True:
+        page, cursor = idx.query(limit=5, tag="mean_revert", cursor=cursor)
+        seen += [e["timestamp"] for e in page]
+        if not cursor:
+            break
+    assert seen == [f"2024-07-02T14:{i:02d}:00" for i in range(9, -1, -1)]
+
+
+if __name__ == "__main__":
+    test_filters_and_tag_registry()
+    test_cursor_pagination()
+    print("ALL TESTS PASSED")
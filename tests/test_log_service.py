@@ -0,0 +1,82 @@
+# tests/test_log_service.py
+"""
+Unit tests for the asynchronous execution logger (sampling, repeat suppression).
+Run with: python -m tests.test_log_service (from server/)
+"""
+import sys
+import os
+import importlib.util
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+
+def _log_service():
+    """Module réel, chargé à part (d'autres tests remplacent app.services.log_service par un mock)."""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "services", "log_service.py")
+    spec = importlib.util.spec_from_file_location("_log_service_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_repeated_messages_suppressed_per_tag():
+    ls = _log_service()
+    with patch.object(ls.log_writer, "enqueue") as enqueue, \
+         patch.object(ls.time, "monotonic", side_effect=[0, 30, 60, 90, 301]):
+        for _ in range(4):
+            ls.log_to_firestore("[TradeTracker] Tracking 2 open trade(s)")
+        ls.log_to_firestore("[TradeTracker] Tracking 2 open trade(s)")
+    entries = [c.args[2] for c in enqueue.call_args_list]
+    assert len(entries) == 2
+    assert entries[0]["tag"] == "TradeTracker" and "repeated" not in entries[0]
+    assert entries[1]["repeated"] == 3
+
+
+def test_level_rate_limit_spares_trading_and_errors():
+    ls = _log_service()
+    with patch.object(ls.log_writer, "enqueue") as enqueue, \
+         patch.dict(ls.LEVEL_RATE_LIMITS, {"NO_TRADING": 2}):
+        for i in range(5):
+            ls.log_to_firestore(f"bougie {i} rejetee", level="NO_TRADING")
+        for i in range(3):
+            ls.log_to_firestore(f"ordre {i}", level="TRADING")
+            ls.log_to_firestore(f"erreur {i}", level="ERROR")
+    levels = [c.args[2]["level"] for c in enqueue.call_args_list]
+    assert levels.count("NO_TRADING") == 2
+    assert levels.count("TRADING") == 3 and levels.count("ERROR") == 3
+    assert all(c.args[:2] == ("execution_logs", None) for c in enqueue.call_args_list)
+
+
+def test_repeated_errors_kept_and_stopped_burst_reported():
+    ls = _log_service()
+    with patch.object(ls.log_writer, "enqueue") as enqueue, \
+         patch.object(ls.log_writer, "stop"), \
+         patch.object(ls.time, "monotonic", side_effect=[0, 1, 2, 10, 11, 12, 400, 401, 402, 403]):
+        for _ in range(3):
+            ls.log_to_firestore("[Oanda] HTTP 503", level="ERROR")     # jamais filtrées
+        for _ in range(3):
+            ls.log_to_firestore("[PriceStream] reconnexion")          # rafale qui s'arrête
+        ls.log_to_firestore("[Archive] run")                          # fenêtre close : rafale reportée
+        ls.log_to_firestore("[PriceStream] reconnexion")
+        ls.log_to_firestore("[PriceStream] reconnexion")
+        ls.flush_logs()                                               # arrêt : répétition en attente reportée
+    entries = [(c.args[2]["message"], c.args[2].get("repeated")) for c in enqueue.call_args_list]
+    assert entries == [("[Oanda] HTTP 503", None)] * 3 + [
+        ("[PriceStream] reconnexion", None),
+        ("[Archive] run", None), ("[PriceStream] reconnexion", 2),
+        ("[PriceStream] reconnexion", None),
+        ("[PriceStream] reconnexion", 1),
+    ]
+
+
+if __name__ == "__main__":
+    test_repeated_messages_suppressed_per_tag()
+    test_level_rate_limit_spares_trading_and_errors()
+    test_repeated_errors_kept_and_stopped_burst_reported()
+    print("ALL TESTS PASSED")
@@ -0,0 +1,88 @@
+# tests/test_poll_pacer.py
+"""
+Unit tests for adaptive per-trade price checks (distance to levels in volatility units).
+Run with: python -m tests.test_poll_pacer (from server/)
+"""
+import sys
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import poll_pacer, trade_tracker
+
+
+def _trade(**kw):
+    return {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "tp": 1.1060, **kw}
+
+
+def _observe_pip_per_second():
+    poll_pacer._vol.clear()
+    for i in range(5):
+        poll_pacer.observe("oanda", "EUR_USD", 1.1000 + (i % 2) * 0.0001, now=100.0 + i)  # 1 pip / s
+
+
+def test_delay_scales_with_distance_in_volatility():
+    _observe_pip_per_second()
+    assert round(poll_pacer.variance_rate("oanda", "EUR_USD") / 1e-8, 6) == 1.0
+
+    # BE à 1.1005 : 0.2 pip -> sous la seconde (borné à MIN_DELAY_S)
+    assert poll_pacer.delay(_trade(), "oanda", 1.10048, 30) == poll_pacer.MIN_DELAY_S
+    # 3 pips du seuil le plus proche : (3 / 3)^2 = 1 s
+    assert round(poll_pacer.delay(_trade(), "oanda", 1.1002, 30), 6) == 1.0
+    # BE fait, SL/TP à 100 pips : plusieurs minutes, bornées à MAX_DELAY_S
+    far = _trade(sl=1.1001, breakeven_applied=True, tp=1.1200)
+    assert poll_pacer.delay(far, "oanda", 1.1100, 30) == poll_pacer.MAX_DELAY_S
+    # volatilité inconnue : intervalle par défaut du worker
+    assert poll_pacer.delay(_trade(instrument="USD_CAD"), "oanda", 1.3500, 30) == 30
+
+    assert poll_pacer.crossed(_trade(), 1.0989) and poll_pacer.crossed(_trade(), 1.1061)
+    assert not poll_pacer.crossed(_trade(), 1.1004)
+
+
+def test_tracker_schedules_checks_per_trade():
+    _observe_pip_per_second()
+    near, far = _trade(), _trade(fill_price=1.0950, sl=1.0951, breakeven_applied=True, tp=1.1300)
+    trades = [(MagicMock(), "501", "oanda", near), (MagicMock(), "502", "oanda", far)]
+    oanda = MagicMock()
+    oanda.get_latest_prices.return_value = {"EUR_USD": 1.10048}
+    trade_tracker._next_check.clear()
+    stats = trade_tracker._stats["oanda"]
+    deferred = stats["deferred"]
+    with patch.object(trade_tracker, "oanda_service", oanda), \
+         patch.object(trade_tracker.tick_manager, "on_price"), \
+         patch.object(trade_tracker.http_session, "has_headroom", return_value=True), \
+         patch.object(trade_tracker, "log_to_firestore"):
+        assert trade_tracker._due("oanda", trades) == trades   # jamais relevés
+        t0 = time.monotonic()
+        trade_tracker._check_prices("oanda", trades)
+        # 501 à 0.2 pip de son BE : sous la seconde ; 502 au BE, SL à 54 pips : minutes
+        wait = {tid: trade_tracker._next_check[("oanda", tid)] - t0 for tid in ("501", "502")}
+        assert poll_pacer.MIN_DELAY_S <= wait["501"] < poll_pacer.MIN_DELAY_S + 0.1
+        assert poll_pacer.MAX_DELAY_S <= wait["502"] < poll_pacer.MAX_DELAY_S + 0.1
+        assert trade_tracker._due("oanda", trades, now=t0 + 1) == trades[:1]
+        oanda.get_latest_prices.reset_mock()
+
+        # plafond de débit atteint : relevé différé, aucun appel broker
+        with patch.object(trade_tracker.http_session, "has_headroom", return_value=False):
+            trade_tracker._check_prices("oanda", trades)
+        oanda.get_latest_prices.assert_not_called()
+        assert stats["deferred"] == deferred + 1
+        assert trade_tracker._due("oanda", trades, now=time.monotonic()) == []
+
+
+if __name__ == "__main__":
+    tests = [
+        test_delay_scales_with_distance_in_volatility,
+        test_tracker_schedules_checks_per_trade,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
@@ -0,0 +1,132 @@
+# tests/test_price_stream.py
+"""
+Unit tests for the OANDA pricing stream book, against the local stand-in stream server.
+Run with: python -m tests.test_price_stream (from server/)
+"""
+import sys
+import os
+import time
+import importlib.util
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from tests.oanda_stream_stub import StreamStub
+
+
+def _oanda_service():
+    """Module réel, chargé à part (test_news_trading remplace app.services.oanda_service par un mock)."""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "services", "oanda_service.py")
+    spec = importlib.util.spec_from_file_location("_oanda_service_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _wait(cond, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _fresh(stub):
+    from app.services import price_stream
+    price_stream.stop()
+    if price_stream._thread is not None:
+        price_stream._thread.join(2)
+    price_stream._book.clear()
+    price_stream._wanted.clear()
+    price_stream._last_msg = 0.0
+    price_stream.OANDA_STREAM_URL = stub.url
+    price_stream.STALE_AFTER_S = 0.3
+    price_stream.READ_TIMEOUT_S = 0.5
+    return price_stream
+
+
+def test_book_serves_latest_price_without_rest():
+    oanda_service = _oanda_service()
+    stub = StreamStub({"EUR_USD": 1.08500}, heartbeat_s=0.1).start()
+    ps = _fresh(stub)
+    try:
+        ps.start(["EUR_USD"])
+        assert _wait(lambda: ps.get_quote("EUR_USD") is not None)
+        with patch.object(oanda_service, "_get_latest_price_rest", side_effect=AssertionError("REST")):
+            assert oanda_service.get_latest_price("EUR_USD") == 1.085
+
+            stub.push_price("EUR_USD", 1.08610, 1.08630)
+            assert _wait(lambda: ps.get_quote("EUR_USD") == (1.0861, 1.0863))
+            assert oanda_service.get_latest_price("EUR_USD") == 1.0862
+    finally:
+        ps.stop()
+        stub.stop()
+
+
+def test_new_instrument_triggers_resubscription():
+    oanda_service = _oanda_service()
+    stub = StreamStub({"EUR_USD": 1.085, "USD_CHF": 0.88}, heartbeat_s=0.1).start()
+    ps = _fresh(stub)
+    try:
+        ps.start(["EUR_USD"])
+        assert _wait(lambda: ps.is_live())
+        # 1er appel : pas encore dans le carnet -> REST, et souscription
+        with patch.object(oanda_service, "_get_latest_price_rest", return_value=0.8801) as rest:
+            assert oanda_service.get_latest_price("USD_CHF") == 0.8801
+            assert rest.call_count == 1
+        assert _wait(lambda: ps.get_quote("USD_CHF") is not None)
+        assert stub.subscriptions[-1] == ["EUR_USD", "USD_CHF"]
+        assert ps.get_quote("EUR_USD") is not None
+    finally:
+        ps.stop()
+        stub.stop()
+
+
+def test_stale_stream_falls_back_to_rest_then_recovers():
+    oanda_service = _oanda_service()
+    stub = StreamStub({"EUR_USD": 1.085}, heartbeat_s=0.1).start()
+    ps = _fresh(stub)
+    try:
+        with patch.object(ps, "backoff_delay", return_value=0.05):
+            ps.start(["EUR_USD"])
+            assert _wait(lambda: ps.get_quote("EUR_USD") is not None)
+
+            # connexion ouverte mais muette : plus de heartbeat -> carnet périmé
+            connects = ps.get_stats()["connects"]
+            stub.stalled.set()
+            assert _wait(lambda: not ps.is_live())
+            with patch.object(oanda_service, "_get_latest_price_rest", return_value=1.0855) as rest:
+                assert oanda_service.get_latest_price("EUR_USD") == 1.0855
+                assert rest.call_count == 1
+
+            # timeout de lecture -> reconnexion, puis le flux repart
+            assert _wait(lambda: ps.get_stats()["connects"] > connects)
+            stub.stalled.clear()
+            assert _wait(lambda: ps.is_live())
+
+            # coupure brutale côté serveur -> reconnexion
+            connects = ps.get_stats()["connects"]
+            stub.drop_connections()
+            assert _wait(lambda: ps.get_stats()["connects"] > connects and ps.is_live())
+            assert ps.get_stats()["disconnects"] >= 2
+    finally:
+        ps.stop()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    tests = [
+        test_book_serves_latest_price_without_rest,
+        test_new_instrument_triggers_resubscription,
+        test_stale_stream_falls_back_to_rest_then_recovers,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
@@ -0,0 +1,50 @@
+# tests/test_range_manager.py
+"""
+Unit tests for the incremental opening-range registry.
+Run with: python -m tests.test_range_manager (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+
+def _fresh():
+    from app.services import range_manager
+    range_manager._building.clear()
+    range_manager._registry.clear()
+    range_manager.candle_writer = MagicMock()
+    return range_manager
+
+
+def test_running_range_published_on_close():
+    rm = _fresh()
+    for h, l in [(101.0, 99.0), (103.0, 100.0), (102.0, 98.5)]:
+        rm.update_opening_range("2030-01-08", "I:SPX", h, l)
+    assert not rm.is_published("2030-01-08", "I:SPX")
+    doc = rm.close_opening_range("2030-01-08", "I:SPX")
+    assert doc["status"] == "ready" and doc["high"] == 103.0 and doc["low"] == 98.5 and doc["count"] == 3
+    assert rm.get_opening_range("2030-01-08", "I:SPX") is doc
+    rm.candle_writer.enqueue.assert_called_once_with("opening_range", "2030-01-08_I:SPX", doc)
+
+
+def test_late_bar_updates_published_range():
+    rm = _fresh()
+    rm.update_opening_range("2030-01-08", "I:NDX", 10.0, 9.0)
+    rm.close_opening_range("2030-01-08", "I:NDX")
+    rm.update_opening_range("2030-01-08", "I:NDX", 12.0, 9.5)  # bougie 09:45 arrivée en retard
+    doc = rm.get_opening_range("2030-01-08", "I:NDX")
+    assert doc["high"] == 12.0 and doc["low"] == 9.0 and doc["count"] == 2
+    assert rm.candle_writer.enqueue.call_count == 2
+
+
+if __name__ == "__main__":
+    test_running_range_published_on_close()
+    test_late_bar_updates_published_range()
+    print("ALL TESTS PASSED")
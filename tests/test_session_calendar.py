@@ -0,0 +1,79 @@
+# tests/test_session_calendar.py
+"""
+Unit tests for the precomputed session calendar.
+Run with: python -m tests.test_session_calendar (from server/)
+"""
+import sys
+import os
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _ms(y, mo, d, h, mi):
+    return int(datetime(y, mo, d, h, mi, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _calendar():
+    from app.services.session_calendar import SessionCalendar
+    return SessionCalendar({
+        "I:SPX": {"instrument": "SPX500_USD",
+                  "session": {"tz": "America/New_York", "open": "09:30", "or_minutes": 15, "trade_end": "11:30"}},
+    })
+
+
+def test_bounds_follow_us_dst():
+    cal = _calendar()
+    # vendredi 2024-03-08 : EST (UTC-5)
+    b = cal.bounds_for_day("I:SPX", "2024-03-08")
+    assert b.open_ms == _ms(2024, 3, 8, 14, 30)
+    assert b.or_end_ms == _ms(2024, 3, 8, 14, 45)
+    assert b.trade_end_ms == _ms(2024, 3, 8, 16, 30)
+    # lundi 2024-03-11 : EDT (UTC-4)
+    b = cal.bounds_for_day("I:SPX", "2024-03-11")
+    assert b.open_ms == _ms(2024, 3, 11, 13, 30)
+    assert b.trade_end_ms == _ms(2024, 3, 11, 15, 30)
+
+
+def test_phase_classification():
+    from app.config.universe import PHASE_PRE_OPEN, PHASE_OPENING_RANGE, PHASE_TRADING, PHASE_CLOSED
+    cal = _calendar()
+    cases = [
+        (_ms(2024, 7, 2, 13, 29), PHASE_PRE_OPEN),
+        (_ms(2024, 7, 2, 13, 30), PHASE_OPENING_RANGE),
+        (_ms(2024, 7, 2, 13, 45), PHASE_OPENING_RANGE),   # bougie 09:45 incluse dans le range
+        (_ms(2024, 7, 2, 13, 46), PHASE_TRADING),
+        (_ms(2024, 7, 2, 15, 30), PHASE_TRADING),
+        (_ms(2024, 7, 2, 15, 31), PHASE_CLOSED),
+    ]
+    for ts, expected in cases:
+        assert cal.phase("I:SPX", ts) == expected, (ts, expected)
+
+
+def test_local_day_and_instrument_lookup():
+    cal = _calendar()
+    # 2024-07-02 23:30 NY = 2024-07-03 03:30 UTC → jour local 2024-07-02
+    assert cal.bounds("I:SPX", _ms(2024, 7, 3, 3, 30)).day == "2024-07-02"
+    assert cal.symbol_for_instrument("SPX500_USD") == "I:SPX"
+    assert cal.symbol_for_instrument("EUR_USD") is None
+
+
+def test_day_cache_bounded():
+    from unittest.mock import patch
+    from app.services import session_calendar
+    cal = _calendar()
+    with patch.object(session_calendar, "MAX_CACHED_DAYS", 4):
+        for d in range(1, 31):   # un mois de bougies dans un process qui tourne
+            cal.bounds("I:SPX", _ms(2024, 7, d, 15, 0))
+        cal.bounds_for_day("I:SPX", "2024-07-29")   # veille relue : gardée en tête du LRU
+        cal.bounds_for_day("I:SPX", "2024-07-01")   # jour ancien : recalculé
+    assert [day.day for _, day in cal._cache.keys()] == [28, 30, 29, 1]
+    assert cal.bounds_for_day("I:SPX", "2024-07-01").open_ms == _ms(2024, 7, 1, 13, 30)
+
+
+if __name__ == "__main__":
+    test_bounds_follow_us_dst()
+    test_phase_classification()
+    test_local_day_and_instrument_lookup()
+    test_day_cache_bounded()
+    print("ALL TESTS PASSED")
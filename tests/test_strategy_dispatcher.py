@@ -0,0 +1,94 @@
+# tests/test_strategy_dispatcher.py
+"""
+Unit tests for the per-symbol strategy workers (bounded queue, order, stale bars, deadline).
+Run with: python -m tests.test_strategy_dispatcher (from server/)
+"""
+import sys
+import os
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import strategy_dispatcher, shared_strategy_tools
+
+
+def _candle(e_ms=None):
+    return SimpleNamespace(e=int(time.time() * 1000) if e_ms is None else e_ms)
+
+
+def _wait(cond, timeout=2.0):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_full_queue_drops_oldest_and_keeps_order():
+    seen, gate = [], threading.Event()
+
+    def strat(candle, config):
+        if config == 0:
+            gate.wait(2)   # worker occupé : les bougies suivantes s'accumulent
+        seen.append(config)
+    strat.__name__ = "strat"
+
+    with patch.object(strategy_dispatcher, "log_to_firestore"):
+        strategy_dispatcher.dispatch("T:DROP", _candle(), 0, [strat])
+        assert _wait(lambda: strategy_dispatcher._workers["T:DROP"].depth() == 0)
+        for i in range(1, 9):
+            strategy_dispatcher.dispatch("T:DROP", _candle(), i, [strat])
+        stats = strategy_dispatcher.get_stats()["T:DROP"]
+        assert stats["queue_depth"] == strategy_dispatcher.MAX_QUEUE_PER_SYMBOL and stats["dropped"] == 3
+        gate.set()
+        assert _wait(lambda: len(seen) == 6)
+    assert seen == [0, 4, 5, 6, 7, 8]   # 1-3 abandonnées, le reste dans l'ordre
+
+
+def test_stale_bar_skipped():
+    calls = []
+    old = _candle(int(time.time() * 1000) - (strategy_dispatcher.MAX_BAR_AGE_S + 5) * 1000)
+    with patch.object(strategy_dispatcher, "log_to_firestore"):
+        strategy_dispatcher.dispatch("T:STALE", old, None, [lambda c, cfg: calls.append("old")])
+        strategy_dispatcher.dispatch("T:STALE", _candle(), None, [lambda c, cfg: calls.append("fresh")])
+        assert _wait(lambda: calls == ["fresh"])
+    assert strategy_dispatcher.get_stats()["T:STALE"]["stale"] == 1
+
+
+def test_expired_deadline_blocks_order():
+    oanda, errors = MagicMock(), []
+
+    def slow_strategy(candle, config):
+        time.sleep(0.1)   # au-delà de l'échéance de 50 ms
+        try:
+            shared_strategy_tools.execute_trade("SPX500_USD", 5000.0, 4990.0, 5030.0, 1.0, "LONG")
+        except strategy_dispatcher.DeadlineExpired as e:
+            errors.append(e)
+
+    with patch.object(strategy_dispatcher, "STRATEGY_DEADLINE_S", 0.05), \
+         patch.object(strategy_dispatcher, "log_to_firestore"), \
+         patch.object(shared_strategy_tools, "oanda_service", oanda):
+        strategy_dispatcher.dispatch("T:LATE", _candle(), None, [slow_strategy])
+        assert _wait(lambda: strategy_dispatcher.get_stats()["T:LATE"]["processed"] == 1)
+    assert len(errors) == 1 and strategy_dispatcher.get_stats()["T:LATE"]["expired"] == 1
+    oanda.create_order.assert_not_called()
+    strategy_dispatcher.check_deadline()   # hors worker (webhook) : pas d'échéance
+
+
+if __name__ == "__main__":
+    tests = [
+        test_full_queue_drops_oldest_and_keeps_order,
+        test_stale_bar_skipped,
+        test_expired_deadline_blocks_order,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
@@ -0,0 +1,86 @@
+# tests/test_strategy_routing.py
+"""
+Unit tests for the symbol -> phase -> strategies routing table and its rebuild on UNIVERSE changes.
+Run with: python -m tests.test_strategy_routing (from server/)
+"""
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+import app.strategies as strategies
+from app.config.universe import UNIVERSE, PHASE_OPENING_RANGE, PHASE_TRADING
+from app.services import polygon_ws, poll_pacer
+from app.services.session_calendar import calendar
+
+
+def _fn(name):
+    def fn(candle, config):
+        pass
+    fn.__name__ = name
+    return fn
+
+
+def test_inactive_symbols_not_routed():
+    universe = {"I:SPX": {"active": True}, "I:NDX": {"active": False}, "I:DJI": {"active": True}}
+    table = strategies.build_routing_table(universe)
+    # I:NDX inactif ; I:DJI actif mais sans stratégie abonnée
+    assert table == {"I:SPX": {PHASE_TRADING: (strategies.mean_revert_multi,)}}
+
+
+def test_multi_phase_strategies():
+    breakout, trend, slow = _fn("breakout"), _fn("trend"), _fn("slow")
+    registry = [
+        strategies.StrategySpec("breakout", breakout, ("I:SPX", "I:NDX"), (PHASE_OPENING_RANGE, PHASE_TRADING)),
+        strategies.StrategySpec("trend", trend, ("I:SPX",)),
+        strategies.StrategySpec("slow", slow, ("I:SPX",), timeframes=("5m",)),
+    ]
+    universe = {"I:SPX": {"active": True}, "I:NDX": {"active": True}}
+    with patch.object(strategies, "STRATEGY_REGISTRY", registry):
+        table = strategies.build_routing_table(universe)
+        assert table == {
+            "I:SPX": {PHASE_OPENING_RANGE: (breakout,), PHASE_TRADING: (breakout, trend)},
+            "I:NDX": {PHASE_OPENING_RANGE: (breakout,), PHASE_TRADING: (breakout,)},
+        }
+        assert strategies.build_routing_table(universe, "5m") == {"I:SPX": {PHASE_TRADING: (slow,)}}
+
+
+def test_routes_and_calendar_rebuilt_when_universe_changes():
+    polygon_ws._routes_key = None
+    try:
+        with patch.dict(UNIVERSE):
+            routes = polygon_ws._refresh_routes()
+            assert set(routes) == {"I:SPX", "I:NDX"}
+            assert polygon_ws._refresh_routes() is routes   # inchangé : pas de reconstruction
+
+            UNIVERSE["I:NDX"] = {**UNIVERSE["I:NDX"], "active": False}
+            UNIVERSE["I:DJI"] = {"instrument": "US30_USD", "active": True,
+                                 "session": {"tz": "America/New_York", "open": "09:30", "trade_end": "12:00"}}
+            routes = polygon_ws._refresh_routes()
+            assert set(routes) == {"I:SPX"}
+            # calendrier reconstruit en place : vu par les modules qui l'ont importé
+            assert poll_pacer.calendar is calendar
+            assert calendar.symbol_for_instrument("US30_USD") == "I:DJI"
+            b = calendar.bounds_for_day("I:DJI", "2026-10-14")
+            assert b.trade_end_ms - b.open_ms == 150 * 60_000
+    finally:
+        polygon_ws._refresh_routes()   # UNIVERSE restauré
+    assert calendar.symbol_for_instrument("US30_USD") is None
+
+
+if __name__ == "__main__":
+    tests = [
+        test_inactive_symbols_not_routed,
+        test_multi_phase_strategies,
+        test_routes_and_calendar_rebuilt_when_universe_changes,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
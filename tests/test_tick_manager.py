@@ -0,0 +1,100 @@
+# tests/test_tick_manager.py
+"""
+Unit tests for the tick-driven breakeven / scaling-out manager.
+Run with: python -m tests.test_tick_manager (from server/)
+"""
+import sys
+import os
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import tick_manager
+
+
+def _trade(tid, data):
+    return (MagicMock(name=tid), tid, "oanda", {"instrument": "EUR_USD", **data})
+
+
+def _reset():
+    tick_manager._done.clear()
+    tick_manager._inflight.clear()
+    tick_manager.sync([])
+
+
+def test_tick_only_fires_crossed_thresholds():
+    _reset()
+    trades = [
+        _trade("A", {"direction": "LONG", "fill_price": 1.1000, "sl": 1.0990}),                    # BE @ 1.1005
+        _trade("B", {"direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "risk_r": 0.0010,
+                     "scaling_step": 0}),                                                            # TP1 @ 1.1010
+        _trade("C", {"direction": "SHORT", "fill_price": 1.1000, "sl": 1.1010}),                   # BE @ 1.0995
+    ]
+    with patch.object(tick_manager.trade_tracker, "apply_exit_rule") as rule:
+        tick_manager.sync(trades)
+        assert tick_manager.get_stats()["armed"] == 3
+        tick_manager.on_price("oanda", "EUR_USD", 1.1003, inline=True)
+        assert not rule.called
+
+        tick_manager.on_price("oanda", "EUR_USD", 1.1006, inline=True)
+        assert [(c.args[1], c.args[4]) for c in rule.call_args_list] == [("A", "rung0")]
+        tick_manager.on_price("oanda", "EUR_USD", 1.0990, inline=True)
+        assert [c.args[1] for c in rule.call_args_list] == ["A", "C"]
+        tick_manager.on_price("oanda", "GBP_USD", 2.0, inline=True)
+        assert "B" not in [c.args[1] for c in rule.call_args_list]
+
+
+def test_tick_burst_closes_once_and_arms_next_rung():
+    _reset()
+    calls = []
+
+    def slow_scaling(doc_ref, tid, broker, data, rule, price):
+        calls.append((data["scaling_step"], price))
+        time.sleep(0.05)
+        data["scaling_step"] += 1
+
+    trade = _trade("S", {"direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "risk_r": 0.0010,
+                         "scaling_step": 0})
+    with patch.object(tick_manager.trade_tracker, "apply_exit_rule", side_effect=slow_scaling):
+        tick_manager.sync([trade])
+        burst = [threading.Thread(target=tick_manager.on_price, args=("oanda", "EUR_USD", 1.1012))
+                 for _ in range(20)]
+        for t in burst:
+            t.start()
+        for t in burst:
+            t.join()
+        deadline = time.monotonic() + 2
+        while tick_manager._inflight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert calls == [(0, 1.1012)]
+
+        # cycle suivant avec un document pas encore à jour : TP1 n'est pas réarmé
+        stale = _trade("S", {"direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "risk_r": 0.0010,
+                             "scaling_step": 0})
+        tick_manager.sync([stale])
+        tick_manager.on_price("oanda", "EUR_USD", 1.1013, inline=True)
+        assert len(calls) == 1
+
+        # document à jour : TP2 armé à 1.1020
+        tick_manager.sync([trade])
+        tick_manager.on_price("oanda", "EUR_USD", 1.1015, inline=True)
+        tick_manager.on_price("oanda", "EUR_USD", 1.1021, inline=True)
+        assert calls == [(0, 1.1012), (1, 1.1021)]
+
+
+if __name__ == "__main__":
+    tests = [
+        test_tick_only_fires_crossed_thresholds,
+        test_tick_burst_closes_once_and_arms_next_rung,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
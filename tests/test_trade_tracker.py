@@ -0,0 +1,223 @@
+# tests/test_trade_tracker.py
+"""
+Unit tests for the trade tracker cycle (batched broker state and prices, per-broker workers).
+Run with: python -m tests.test_trade_tracker (from server/)
+"""
+import sys
+import os
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import trade_tracker
+
+
+def _trades():
+    return {
+        "101": {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "tp": 1.1060},
+        "102": {"instrument": "USD_JPY", "direction": "SHORT", "fill_price": 150.000, "sl": 150.100, "tp": 149.400},
+        "103": {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.1001,
+                "breakeven_applied": True},
+        "OABC": {"instrument": "XBTUSD", "direction": "LONG", "fill_price": 60000.0, "sl": 59000.0,
+                 "broker": "kraken"},
+    }
+
+
+def _loaded(trades):
+    return [(MagicMock(name=tid), tid, data.get("broker", "oanda"), data) for tid, data in trades.items()]
+
+
+def _brokers():
+    oanda, kraken, mirror = MagicMock(), MagicMock(), MagicMock()
+    mirror.trade_ids.return_value = {"101", "103"}
+    mirror.closed_trade.return_value = None  # clôture pas encore vue par le miroir
+    oanda.get_trade_details.return_value = {
+        "id": "102", "state": "CLOSED", "realizedPL": "-5.0", "averageClosePrice": "150.102",
+        "sl_filled": True, "tp_filled": False,
+    }
+    oanda.get_latest_prices.return_value = {"EUR_USD": 1.1006}
+    kraken.get_trades_details.return_value = {"OABC": {"id": "OABC", "state": "OPEN"}}
+    kraken.get_latest_prices.return_value = {"XBTUSD": 60200.0}
+    return oanda, kraken, mirror
+
+
+def _cycle(loaded, oanda, kraken, mirror, broker=None):
+    trade_tracker._finalized.clear()
+    trade_tracker._next_check.clear()
+    trade_tracker.tick_manager._done.clear()
+    with patch.object(trade_tracker, "load_open_trades", return_value=loaded), \
+         patch.object(trade_tracker, "oanda_service", oanda), \
+         patch.object(trade_tracker, "account_mirror", mirror), \
+         patch.object(trade_tracker, "kraken_service", kraken), \
+         patch.object(trade_tracker, "_auto_close_trade", return_value=False), \
+         patch.object(trade_tracker, "log_to_firestore"), \
+         patch.object(trade_tracker, "log_trade_event"):
+        trade_tracker._run_cycle(broker)
+
+
+def test_cycle_batches_broker_calls():
+    loaded = _loaded(_trades())
+    refs = {tid: ref for ref, tid, _, _ in loaded}
+    oanda, kraken, mirror = _brokers()
+    _cycle(loaded, oanda, kraken, mirror)
+
+    # un appel par broker pour l'état, détails seulement pour le trade disparu
+    mirror.sync.assert_called_once()
+    oanda.get_trade_details.assert_called_once_with("102")
+    kraken.get_trades_details.assert_called_once_with(["OABC"])
+    # prix : un appel par broker, seulement pour les trades à gérer (103 déjà au BE)
+    oanda.get_latest_prices.assert_called_once_with(["EUR_USD"])
+    kraken.get_latest_prices.assert_called_once_with(["XBTUSD"])
+
+    update = refs["102"].update.call_args.args[0]
+    assert update["outcome"] == "loss" and update["close_reason"] == "SL"
+    assert update["close_slippage"] == 0.002
+
+    # 101 : +0.6 pip pour 1 pip de risque -> breakeven ; OABC : +0.2R -> rien
+    oanda.modify_trade_sl.assert_called_once()
+    assert oanda.modify_trade_sl.call_args.args[0] == "101"
+    assert refs["101"].update.call_args.args[0]["breakeven_applied"] is True
+    kraken.modify_trade_sl.assert_not_called()
+    assert sorted(t[1] for t in trade_tracker._open_trades) == ["101", "103", "OABC"]
+
+
+def test_closure_details_from_mirror():
+    loaded = _loaded(_trades())
+    refs = {tid: ref for ref, tid, _, _ in loaded}
+    oanda, kraken, mirror = _brokers()
+    mirror.closed_trade.side_effect = lambda tid: {
+        "id": tid, "state": "CLOSED", "realizedPL": "12.5", "averageClosePrice": "149.400",
+        "sl_filled": False, "tp_filled": True,
+    }
+    _cycle(loaded, oanda, kraken, mirror)
+
+    oanda.get_trade_details.assert_not_called()
+    update = refs["102"].update.call_args.args[0]
+    assert update["outcome"] == "win" and update["close_reason"] == "TP"
+
+
+def test_account_sync_failure_keeps_trades_untouched():
+    loaded = _loaded(_trades())
+    refs = {tid: ref for ref, tid, _, _ in loaded}
+    oanda, kraken, mirror = _brokers()
+    mirror.sync.side_effect = Exception("timeout")
+    _cycle(loaded, oanda, kraken, mirror)
+
+    oanda.get_trade_details.assert_not_called()
+    oanda.get_latest_prices.assert_not_called()
+    refs["102"].update.assert_not_called()
+    kraken.get_latest_prices.assert_called_once_with(["XBTUSD"])
+    assert len(trade_tracker._open_trades) == 4
+
+
+def test_kraken_prices_map_internal_pair_names():
+    from app.services import kraken_service
+    responses = {
+        "AssetPairs": {"XXBTZUSD": {"altname": "XBTUSD"}, "SOLUSD": {"altname": "SOLUSD"}},
+        "Ticker": {"XXBTZUSD": {"a": ["60010.0"], "b": ["60000.0"]}, "SOLUSD": {"a": ["150.10"], "b": ["150.00"]}},
+    }
+    with patch.object(kraken_service, "_public_request", side_effect=lambda ep, params=None: responses[ep]) as req:
+        kraken_service._ticker_keys.clear()
+        assert kraken_service.get_latest_prices(["XBTUSD", "SOLUSD"]) == {"XBTUSD": 60005.0, "SOLUSD": 150.05}
+        # correspondance mise en cache : un seul appel Ticker ensuite
+        kraken_service.get_latest_prices(["SOLUSD", "XBTUSD"])
+    assert [c.args[0] for c in req.call_args_list] == ["AssetPairs", "Ticker", "Ticker"]
+
+
+def test_broker_workers_are_independent():
+    loaded = _loaded(_trades())
+    oanda, kraken, mirror = _brokers()
+    kraken.get_latest_prices.return_value = {"XBTUSD": 60000.0}
+    _cycle(loaded, oanda, kraken, mirror)
+    assert ("kraken", "XBTUSD") in trade_tracker.tick_manager._up
+
+    # cycle OANDA seul : Kraken ni interrogé ni désarmé
+    oanda, kraken, mirror = _brokers()
+    kraken.get_trades_details.side_effect = AssertionError("kraken polled by the oanda worker")
+    _cycle(loaded, oanda, kraken, mirror, broker="oanda")
+    kraken.get_trades_details.assert_not_called()
+    assert ("kraken", "XBTUSD") in trade_tracker.tick_manager._up
+    assert sorted(t[1] for t in trade_tracker._open_trades) == ["101", "103", "OABC"]
+
+
+def test_dozens_of_trades_within_budget():
+    trades = {str(300 + i): {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.0990}
+              for i in range(40)}
+    loaded = _loaded(trades)
+    oanda, kraken, mirror = _brokers()
+    mirror.trade_ids.return_value = set(trades)
+    oanda.get_latest_prices.return_value = {"EUR_USD": 1.1010}
+    # décision par trade lente (~20 ms) : le pool du broker les traite en parallèle
+    slow = lambda data: time.sleep(0.02) or True
+    stats = trade_tracker._stats["oanda"]
+    overruns = stats["overruns"]
+    with patch.object(trade_tracker, "_needs_price", side_effect=slow), \
+         patch.dict(trade_tracker.BROKER_WORKERS["oanda"], {"budget_s": 0.5}):
+        _cycle(loaded, oanda, kraken, mirror, broker="oanda")
+    assert stats["trades"] == 40 and stats["last_ms"] < 500 and stats["overruns"] == overruns
+    assert oanda.modify_trade_sl.call_count == 40   # breakeven de chaque trade, une seule fois
+
+    with patch.object(trade_tracker, "_needs_price", side_effect=slow), \
+         patch.dict(trade_tracker.BROKER_WORKERS["oanda"], {"budget_s": 0.01}):
+        _cycle(loaded, oanda, kraken, mirror, broker="oanda")
+    assert stats["overruns"] == overruns + 1
+
+
+def test_trade_updates_are_serialized():
+    doc_ref, data = MagicMock(), {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000,
+                                  "sl": 1.0990, "outcome": "open"}
+    details = {"state": "CLOSED", "realizedPL": "3.0", "tp_filled": True}
+    trade_tracker._finalized.clear()
+    done = threading.Event()
+
+    def stream_close():
+        trade_tracker.finalize_closed(doc_ref, "401", data, details, "oanda")
+        done.set()
+
+    with patch.object(trade_tracker, "log_to_firestore"), \
+         patch.object(trade_tracker, "log_trade_event"):
+        with trade_tracker.trade_lock("401", "oanda"):   # action du tick manager en cours sur ce trade
+            threading.Thread(target=stream_close).start()
+            assert not done.wait(0.1)
+            doc_ref.update.assert_not_called()
+        assert done.wait(2)
+    assert doc_ref.update.call_args.args[0]["outcome"] == "win"
+
+
+def test_marks_pruned_when_trade_leaves_open_set():
+    trade_tracker._finalized.clear()
+    trade_tracker._ladder_applied.clear()
+    assert trade_tracker._claim("102", "oanda") and trade_tracker._claim("OABC", "kraken")
+    trade_tracker._ladder_applied.update({("oanda", "101", 0), ("oanda", "102", 0), ("kraken", "OABC", 0)})
+    assert trade_tracker.is_finalized("102", "oanda")
+
+    # cycle OANDA suivant : 102 n'est plus ouvert dans Firestore
+    loaded = _loaded({"101": _trades()["101"]})
+    trade_tracker._set_open_trades("oanda", loaded, loaded)
+    assert not trade_tracker.is_finalized("102", "oanda")
+    assert trade_tracker.is_finalized("OABC", "kraken")   # autre broker : intact
+    assert trade_tracker._ladder_applied == {("oanda", "101", 0), ("kraken", "OABC", 0)}
+
+
+if __name__ == "__main__":
+    tests = [
+        test_cycle_batches_broker_calls,
+        test_closure_details_from_mirror,
+        test_account_sync_failure_keeps_trades_untouched,
+        test_kraken_prices_map_internal_pair_names,
+        test_broker_workers_are_independent,
+        test_dozens_of_trades_within_budget,
+        test_trade_updates_are_serialized,
+        test_marks_pruned_when_trade_leaves_open_set,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")
@@ -0,0 +1,98 @@
+# tests/test_transaction_stream.py
+"""
+Unit tests for transaction-stream closure finalization (shared with the poll loop).
+Run with: python -m tests.test_transaction_stream (from server/)
+"""
+import sys
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.modules["firebase_admin"] = MagicMock()
+sys.modules["firebase_admin.credentials"] = MagicMock()
+sys.modules["firebase_admin.firestore"] = MagicMock()
+sys.modules["app.services.firebase"] = MagicMock()
+
+from app.services import trade_tracker, transaction_stream, price_stream
+from tests.oanda_stream_stub import StreamStub
+
+TRADE = {"instrument": "EUR_USD", "direction": "LONG", "fill_price": 1.1000, "sl": 1.0990, "tp": 1.1060,
+         "outcome": "open"}
+
+SL_FILL = {
+    "type": "ORDER_FILL", "reason": "STOP_LOSS_ORDER", "instrument": "EUR_USD", "price": "1.09895",
+    "tradesClosed": [{"tradeID": "201", "units": "-1000", "price": "1.09895", "realizedPL": "-9.5"}],
+}
+
+
+def _patched(doc_ref):
+    trade_tracker._finalized.clear()
+    return (
+        patch.object(trade_tracker, "find_open_trade", return_value=(doc_ref, dict(TRADE))),
+        patch.object(trade_tracker, "log_to_firestore"),
+        patch.object(trade_tracker, "log_trade_event"),
+    )
+
+
+def test_stop_loss_fill_finalizes_once():
+    doc_ref = MagicMock()
+    p1, p2, p3 = _patched(doc_ref)
+    with p1, p2, p3:
+        transaction_stream.handle_transaction(SL_FILL)
+        update = doc_ref.update.call_args.args[0]
+        assert update["outcome"] == "loss" and update["close_reason"] == "SL"
+        assert update["realized_pnl"] == -9.5 and update["close_price"] == 1.09895
+        assert update["close_slippage"] == -0.00005
+
+        # même clôture vue ensuite par le polling (ou transaction rejouée) : pas de 2e écriture
+        details = {"state": "CLOSED", "realizedPL": "-9.5", "averageClosePrice": "1.09895", "sl_filled": True}
+        assert trade_tracker.finalize_closed(doc_ref, "201", dict(TRADE), details, "oanda") is False
+        transaction_stream.handle_transaction(SL_FILL)
+    assert doc_ref.update.call_count == 1
+
+
+def test_partial_close_is_ignored():
+    doc_ref = MagicMock()
+    p1, p2, p3 = _patched(doc_ref)
+    with p1, p2, p3:
+        transaction_stream.handle_transaction({
+            "type": "ORDER_FILL", "reason": "MARKET_ORDER_TRADE_CLOSE",
+            "tradeReduced": {"tradeID": "201", "units": "-500", "realizedPL": "3.0"},
+        })
+    doc_ref.update.assert_not_called()
+
+
+def test_stream_end_to_end():
+    stub = StreamStub(heartbeat_s=0.1).start()
+    doc_ref = MagicMock()
+    p1, p2, p3 = _patched(doc_ref)
+    price_stream.OANDA_STREAM_URL = stub.url
+    try:
+        with p1, p2, p3:
+            transaction_stream.start()
+            deadline = time.monotonic() + 3
+            while not stub._tx_queues and time.monotonic() < deadline:
+                time.sleep(0.01)
+            closures = transaction_stream.get_stats()["closures"]
+            stub.push_transaction(dict(SL_FILL, tradesClosed=[dict(SL_FILL["tradesClosed"][0], tradeID="202")]))
+            while transaction_stream.get_stats()["closures"] == closures and time.monotonic() < deadline:
+                time.sleep(0.01)
+        assert transaction_stream.get_stats()["closures"] == closures + 1
+        assert doc_ref.update.call_args.args[0]["close_reason"] == "SL"
+    finally:
+        transaction_stream.stop()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    tests = [
+        test_stop_loss_fill_finalizes_once,
+        test_partial_close_is_ignored,
+        test_stream_end_to_end,
+    ]
+    for t in tests:
+        t()
+        print(f"  OK  {t.__name__}")
+    print(f"\n{len(tests)} tests passed")